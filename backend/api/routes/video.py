@@ -1,99 +1,162 @@
 from fastapi import APIRouter, Request, Response
-from fastapi.responses import StreamingResponse
-import subprocess
-import requests
-from typing import AsyncGenerator
+from fastapi.responses import FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import AsyncGenerator, List, Optional
+from collections import deque
+import aiohttp
 import asyncio
 import logging
 import json
+import time
 from urllib.parse import urlparse
 import datetime
 
+from api.services.transcode_cache import get_transcode_cache
+
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-async def stream_video(url: str) -> AsyncGenerator[bytes, None]:
-    """Stream video with AAC audio transcoding on-the-fly."""
+# FFmpeg command to transcode audio to AAC while copying video stream
+TRANSCODE_CMD = [
+    'ffmpeg',
+    '-i', 'pipe:0',          # Input from pipe
+    '-c:v', 'copy',          # Copy video stream (no re-encoding)
+    '-c:a', 'aac',           # Transcode audio to AAC
+    '-b:a', '128k',          # Audio bitrate
+    '-ac', '2',              # Force 2 audio channels (stereo)
+    '-ar', '44100',          # Set audio sample rate to 44.1kHz (iOS compatible)
+    '-f', 'mp4',             # Output format
+    '-movflags', 'frag_keyframe+empty_moov+default_base_moof',  # Enable streaming
+    'pipe:1'                 # Output to pipe
+]
+CHUNK_SIZE = 64 * 1024  # 64KB chunks
+QUEUE_CHUNKS = 32  # Transcoded chunks buffered ahead of a slow client (2MB)
+SOURCE_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60)
+VERSION_TIMEOUT = aiohttp.ClientTimeout(total=5)
+# Cached transcodes match the source version they were made from; clients revalidate hourly
+CACHED_HEADERS = {
+    "Cache-Control": "public, max-age=3600",
+    "Access-Control-Allow-Origin": "*",
+}
+STREAM_HEADERS = {
+    "Accept-Ranges": "bytes",
+    "Content-Type": "video/mp4",
+    "Cache-Control": "no-cache",
+    "Access-Control-Allow-Origin": "*",  # Allow CORS
+}
+
+async def source_version(url: str, session: Optional[aiohttp.ClientSession] = None) -> Optional[str]:
+    """The source's ETag (or Last-Modified) from one HEAD request; None when it has neither"""
+    own_session = session is None
+    session = session or aiohttp.ClientSession(timeout=VERSION_TIMEOUT)
     try:
-        logger.info(f"Starting video transcoding for URL: {url}")
-        
-        # FFmpeg command to transcode audio to AAC while copying video stream
-        ffmpeg_cmd = [
-            'ffmpeg',
-            '-i', 'pipe:0',          # Input from pipe
-            '-c:v', 'copy',          # Copy video stream (no re-encoding)
-            '-c:a', 'aac',           # Transcode audio to AAC
-            '-b:a', '128k',          # Audio bitrate
-            '-ac', '2',              # Force 2 audio channels (stereo)
-            '-ar', '44100',          # Set audio sample rate to 44.1kHz (iOS compatible)
-            '-f', 'mp4',             # Output format
-            '-movflags', 'frag_keyframe+empty_moov+default_base_moof',  # Enable streaming
-            'pipe:1'                 # Output to pipe
-        ]
-        
-        logger.info(f"FFmpeg command: {' '.join(ffmpeg_cmd)}")
-
-        # Start FFmpeg process
-        process = await asyncio.create_subprocess_exec(
-            *ffmpeg_cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-        
-        logger.info("FFmpeg process started")
-
-        # Start a task to read and log FFmpeg's stderr
-        async def log_ffmpeg_output():
-            while True:
-                line = await process.stderr.readline()
-                if not line:
-                    break
-                stderr_line = line.decode('utf-8', errors='replace').strip()
-                if stderr_line:
-                    logger.debug(f"FFmpeg: {stderr_line}")
-        
-        # Start the stderr reading task
-        asyncio.create_task(log_ffmpeg_output())
-
-        # Start downloading the video
-        async with requests.Session() as session:
-            try:
-                async with session.get(url, stream=True) as response:
-                    logger.info(f"Source video request status: {response.status_code}")
-                    
-                    if response.status_code >= 400:
-                        logger.error(f"Failed to fetch source video: HTTP {response.status_code}")
-                        raise Exception(f"Failed to fetch source video: HTTP {response.status_code}")
-                    
-                    # Stream chunks through FFmpeg
-                    chunk_size = 64 * 1024  # 64KB chunks
-                    chunks_processed = 0
-                    async for chunk in response.iter_content(chunk_size=chunk_size):
-                        if not chunk:
-                            break
-                        # Write chunk to FFmpeg's stdin
-                        process.stdin.write(chunk)
-                        # Read processed chunk from FFmpeg's stdout
-                        processed_chunk = await process.stdout.read(chunk_size)
-                        if processed_chunk:
-                            chunks_processed += 1
-                            if chunks_processed % 100 == 0:  # Log every 100 chunks
-                                logger.info(f"Processed {chunks_processed} chunks ({chunks_processed * chunk_size / 1024 / 1024:.2f} MB)")
-                            yield processed_chunk
-            except Exception as e:
-                logger.error(f"Error downloading source video: {str(e)}", exc_info=True)
-                raise
-
-        # Clean up
-        if process.stdin:
+        async with session.head(url, allow_redirects=True) as response:
+            if response.status >= 400:
+                logger.warning(f"HEAD {url} returned HTTP {response.status}")
+                return None
+            return response.headers.get("ETag") or response.headers.get("Last-Modified")
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logger.warning(f"HEAD {url} failed: {e}")
+        return None
+    finally:
+        if own_session:
+            await session.close()
+
+async def stream_video(
+    url: str,
+    command: Optional[List[str]] = None,
+    chunk_size: int = CHUNK_SIZE,
+    queue_chunks: int = QUEUE_CHUNKS,
+    session: Optional[aiohttp.ClientSession] = None
+) -> AsyncGenerator[bytes, None]:
+    """Stream video with AAC audio transcoding on-the-fly.
+
+    The source download feeds ffmpeg's stdin in one task while another drains its
+    stdout into a bounded queue, so neither side waits on the other chunk by chunk.
+    A slow client fills the queue, which stalls ffmpeg's stdout, then its stdin and
+    finally the download. Closing the generator (client disconnect) kills ffmpeg.
+    """
+    command = command or TRANSCODE_CMD
+    logger.info(f"Starting video transcoding for URL: {url}")
+    logger.info(f"FFmpeg command: {' '.join(command)}")
+
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    output: asyncio.Queue = asyncio.Queue(maxsize=queue_chunks)
+    stderr_tail: deque = deque(maxlen=20)
+    own_session = session is None
+    session = session or aiohttp.ClientSession(timeout=SOURCE_TIMEOUT)
+
+    async def feed():
+        try:
+            async with session.get(url) as response:
+                logger.info(f"Source video request status: {response.status}")
+                if response.status >= 400:
+                    raise RuntimeError(f"Failed to fetch source video: HTTP {response.status}")
+                async for chunk in response.content.iter_chunked(chunk_size):
+                    process.stdin.write(chunk)
+                    await process.stdin.drain()
+        finally:
+            # EOF lets ffmpeg flush the rest of its output
             process.stdin.close()
-        await process.wait()
-        logger.info("Transcoding completed successfully")
 
-    except Exception as e:
-        logger.error(f"Error streaming video: {str(e)}", exc_info=True)
-        raise
+    async def drain():
+        while True:
+            chunk = await process.stdout.read(chunk_size)
+            await output.put(chunk)  # b'' marks the end of the output
+            if not chunk:
+                return
+
+    async def log_ffmpeg_output():
+        async for line in process.stderr:
+            stderr_line = line.decode('utf-8', errors='replace').strip()
+            if stderr_line:
+                stderr_tail.append(stderr_line)
+                logger.debug(f"FFmpeg: {stderr_line}")
+
+    feeder = asyncio.create_task(feed())
+    tasks = [feeder, asyncio.create_task(drain()), asyncio.create_task(log_ffmpeg_output())]
+    started = time.perf_counter()
+    sent = 0
+    try:
+        while True:
+            chunk = await output.get()
+            if not chunk:
+                break
+            sent += len(chunk)
+            yield chunk
+
+        returncode = await process.wait()
+        if returncode != 0:
+            # A failed download closes stdin early; report that rather than FFmpeg's complaint
+            await asyncio.wait([feeder], timeout=1)
+            if feeder.done() and feeder.exception():
+                raise feeder.exception()
+            raise RuntimeError(f"FFmpeg exited with code {returncode}: {' | '.join(stderr_tail)}")
+        # FFmpeg read all of its input, so the download is done; surface its errors
+        await feeder
+        seconds = time.perf_counter() - started
+        logger.info(f"Transcoding completed: {sent / 1024 / 1024:.2f} MB in {seconds:.1f}s")
+    finally:
+        if process.returncode is None:
+            logger.info("Stream closed before transcoding finished, killing FFmpeg")
+            process.kill()
+        for task in tasks:
+            task.cancel()
+
+        async def clean_up():
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Read the pipes to EOF: a paused stdout reader keeps wait() from ever returning
+            await process.communicate()
+            if own_session:
+                await session.close()
+
+        # A disconnect cancels every await in here; the shielded task still reaps FFmpeg
+        await asyncio.shield(clean_up())
 
 @router.get("/transcode")
 async def transcode_video(request: Request, url: str, force: bool = False):
@@ -168,17 +231,28 @@ async def transcode_video(request: Request, url: str, force: bool = False):
 
         logger.info("iOS device detected, starting transcoding")
         
-        # For iOS, stream with transcoded audio
+        # Repeat plays of the same source version are served from the transcode cache
+        version = await source_version(url)
+        if version is None:
+            # Without a validator a replaced source could not be told apart, so nothing is cached
+            logger.info("Source has no ETag or Last-Modified, transcoding without the cache")
+            return StreamingResponse(stream_video(url), media_type="video/mp4", headers=STREAM_HEADERS)
+        cache = get_transcode_cache()
+        cached = cache.lookup(url, TRANSCODE_CMD, version)
+        if cached is not None:
+            logger.info(f"Serving cached transcode {cached.name}")
+            return FileResponse(cached, media_type="video/mp4", headers=CACHED_HEADERS)
+
+        # For iOS, stream with transcoded audio, sharing a transcode already in flight
         try:
+            body = await cache.stream(url, TRANSCODE_CMD, lambda: stream_video(url), version)
             response = StreamingResponse(
-                stream_video(url),
+                body,
                 media_type="video/mp4",
-                headers={
-                    "Accept-Ranges": "bytes",
-                    "Content-Type": "video/mp4",
-                    "Cache-Control": "no-cache",
-                    "Access-Control-Allow-Origin": "*",  # Allow CORS
-                }
+                headers=STREAM_HEADERS,
+                # Runs after the response ends or the client disconnects; the last reader
+                # leaving cancels an unfinished transcode
+                background=BackgroundTask(body.aclose)
             )
             
             logger.info("Streaming response initialized")
@@ -3,6 +3,7 @@ from redis.asyncio import Redis
 from typing import Dict, Any, Optional
 import os
 import json
+import asyncio
 import uuid
 import logging
 from datetime import datetime
@@ -134,7 +135,8 @@ class ChatService:
                 self.llm.conversation_history = []
 
             # Generate responses and get matches
-            response_text, matches = self.llm.generate_and_match(message)
+            # Run in a worker thread so concurrent turns overlap (and share embedding batches)
+            response_text, matches = await asyncio.to_thread(self.llm.generate_and_match, message)
             
             if not matches:
                 logger.warning("No matching dialog found")
@@ -0,0 +1,272 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Any, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+STALE_PART_SECONDS = 3600
+
+def make_transcode_key(url: str, params: Sequence[str], version: str = "") -> str:
+    """Fixed-length key: a 128-bit BLAKE2b digest of the source URL, its version (ETag or
+    Last-Modified, so a replaced source is transcoded again) and the transcode parameters"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(url.encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update(version.encode('utf-8'))
+    digest.update(b'\x00')
+    digest.update(json.dumps(list(params)).encode('utf-8'))
+    return digest.hexdigest()
+
+class _InFlight:
+    """One running transcode, written to a part file that every reader tails"""
+
+    def __init__(self, key: str, part: Path, writer):
+        self.key = key
+        self.part = part
+        self.writer = writer  # Closed by _produce, or by _release if _produce never runs
+        self.size = 0
+        self.started = False
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.readers = 0
+        self.changed = asyncio.Condition()
+        self.task: Optional[asyncio.Task] = None
+
+    async def notify(self) -> None:
+        async with self.changed:
+            self.changed.notify_all()
+
+class _Reader:
+    """One request's read of a transcode; closing it releases the transcode, even before the first read"""
+
+    def __init__(self, cache: "TranscodeCache", transcode: _InFlight, part):
+        self.cache = cache
+        self.transcode = transcode
+        self.part = part
+        self.offset = 0
+        self.released = False
+
+    def __aiter__(self) -> "_Reader":
+        return self
+
+    async def __anext__(self) -> bytes:
+        transcode = self.transcode
+        try:
+            while self.offset >= transcode.size:
+                if transcode.done:
+                    if transcode.error is not None:
+                        raise transcode.error
+                    raise StopAsyncIteration
+                async with transcode.changed:
+                    await transcode.changed.wait_for(lambda: transcode.size > self.offset or transcode.done)
+            chunk = self.part.read(min(READ_CHUNK_SIZE, transcode.size - self.offset))
+            self.offset += len(chunk)
+            return chunk
+        except BaseException:
+            self.close()
+            raise
+
+    async def aclose(self) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if not self.released:
+            self.released = True
+            self.part.close()
+            self.cache._release(self.transcode)
+
+class TranscodeCache:
+    """Transcoded clips on local disk, LRU-evicted by total bytes.
+
+    Concurrent requests for a clip share one transcode: the first starts it, every
+    request (the first included) tails its part file, and the finished file is renamed
+    into the cache. When the last reader leaves early the transcode is cancelled. The
+    index is per process; files written by other workers are adopted on first lookup.
+    """
+
+    def __init__(self, root, max_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.in_flight: Dict[str, _InFlight] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+        self._load()
+
+    def _load(self) -> None:
+        """Index existing files, least recently used first, and drop abandoned part files"""
+        now = time.time()
+        for part in self.root.glob('*.part'):
+            if now - part.stat().st_mtime > STALE_PART_SECONDS:
+                part.unlink(missing_ok=True)
+        files = sorted(self.root.glob('*.mp4'), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            self._add(path.stem, path.stat().st_size)
+        self._evict()
+        logger.info(f"Transcode cache at {self.root}: {len(self.entries)} clips, {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def path_for(self, key: str) -> Path:
+        return self.root / f"{key}.mp4"
+
+    def _add(self, key: str, size: int) -> None:
+        self.total_bytes += size - self.entries.get(key, 0)
+        self.entries[key] = size
+        self.entries.move_to_end(key)
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            # Responses already serving the file keep their open handle
+            self.path_for(key).unlink(missing_ok=True)
+            logger.debug(f"Evicted transcoded clip {key} ({size} bytes)")
+
+    def lookup(self, url: str, params: Sequence[str], version: str = "") -> Optional[Path]:
+        """Path of the finished transcode of this version of url, marked most recently used, or None"""
+        key = make_transcode_key(url, params, version)
+        path = self.path_for(key)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            if key in self.entries:
+                # Evicted by another worker
+                self.total_bytes -= self.entries.pop(key)
+            self.misses += 1
+            return None
+        self._add(key, size)
+        # The mtime carries recency across restarts
+        os.utime(path)
+        self._evict()
+        self.hits += 1
+        return path
+
+    async def stream(
+        self,
+        url: str,
+        params: Sequence[str],
+        open_stream: Callable[[], AsyncIterator[bytes]],
+        version: str = ""
+    ) -> _Reader:
+        """Join or start the transcode of this version of url; returns once its first bytes are on disk.
+
+        Raises the transcode's error when it fails before producing any output.
+        """
+        key = make_transcode_key(url, params, version)
+        transcode = self.in_flight.get(key)
+        if transcode is None:
+            transcode = self._start(key, open_stream)
+        else:
+            self.shared += 1
+            logger.info(f"Sharing in-flight transcode {key} ({transcode.readers} readers)")
+        transcode.readers += 1
+        # Opened before any await, so the part file cannot be renamed or removed first
+        part = open(transcode.part, 'rb')
+        try:
+            async with transcode.changed:
+                await transcode.changed.wait_for(lambda: transcode.size > 0 or transcode.done)
+            if transcode.size == 0 and transcode.error is not None:
+                raise transcode.error
+        except BaseException:
+            part.close()
+            self._release(transcode)
+            raise
+        return _Reader(self, transcode, part)
+
+    def _start(self, key: str, open_stream: Callable[[], AsyncIterator[bytes]]) -> _InFlight:
+        fd, part = tempfile.mkstemp(dir=self.root, prefix=f"{key}.", suffix='.part')
+        transcode = _InFlight(key, Path(part), os.fdopen(fd, 'wb'))
+        self.in_flight[key] = transcode
+        transcode.task = asyncio.create_task(self._produce(transcode, open_stream))
+        return transcode
+
+    def _release(self, transcode: _InFlight) -> None:
+        transcode.readers -= 1
+        if transcode.readers == 0 and not transcode.done:
+            logger.info(f"Last reader left, cancelling transcode {transcode.key}")
+            # Later requests start afresh rather than joining a cancelled transcode
+            if self.in_flight.get(transcode.key) is transcode:
+                del self.in_flight[transcode.key]
+            transcode.task.cancel()
+            if not transcode.started:
+                # A task cancelled before its first step never runs, so its cleanup is done here
+                transcode.writer.close()
+                transcode.part.unlink(missing_ok=True)
+                transcode.error = RuntimeError("Transcode cancelled")
+                transcode.done = True
+
+    async def _produce(self, transcode: _InFlight, open_stream: Callable[[], AsyncIterator[bytes]]) -> None:
+        transcode.started = True
+        stream = None
+        try:
+            stream = open_stream()
+            with transcode.writer as part:
+                async for chunk in stream:
+                    part.write(chunk)
+                    # Readers tail the file, so every chunk must reach it before they are woken
+                    part.flush()
+                    transcode.size += len(chunk)
+                    await transcode.notify()
+            if transcode.size == 0:
+                raise RuntimeError("Transcoding produced no output")
+            os.replace(transcode.part, self.path_for(transcode.key))
+            self._add(transcode.key, transcode.size)
+            self._evict()
+            logger.info(f"Cached transcode {transcode.key} ({transcode.size / 1024 / 1024:.1f} MB)")
+        except asyncio.CancelledError:
+            transcode.error = RuntimeError("Transcode cancelled")
+            transcode.part.unlink(missing_ok=True)
+        except Exception as e:
+            logger.error(f"Transcode {transcode.key} failed: {e}")
+            transcode.error = e
+            transcode.part.unlink(missing_ok=True)
+        finally:
+            # Already closed unless open_stream failed
+            transcode.writer.close()
+            if self.in_flight.get(transcode.key) is transcode:
+                del self.in_flight[transcode.key]
+            transcode.done = True
+            await transcode.notify()
+            if stream is not None:
+                await stream.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clips": len(self.entries),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "in_flight": len(self.in_flight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared
+        }
+
+_cache: Optional[TranscodeCache] = None
+_cache_lock = threading.Lock()
+
+def get_transcode_cache() -> TranscodeCache:
+    """Process-wide cache, configured by TRANSCODE_CACHE_DIR and TRANSCODE_CACHE_MAX_BYTES"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TranscodeCache(
+                os.getenv("TRANSCODE_CACHE_DIR", "data/cache/transcodes"),
+                int(os.getenv("TRANSCODE_CACHE_MAX_BYTES", str(5 * 1024 ** 3)))
+            )
+        return _cache
+
+def transcode_cache_stats() -> Optional[Dict[str, Any]]:
+    """Metrics for the cache when it has been created"""
+    with _cache_lock:
+        return _cache.stats() if _cache is not None else None
@@ -45,6 +45,7 @@ class Settings(BaseSettings):
     pinecone_api_key: Optional[str] = None
     pinecone_environment: str = "gcp-starter"
     pinecone_index: str = "chattng-dialogs"
+    pinecone_index_registry: Optional[str] = None  # JSON alias -> versioned index registry
 
     # OpenAI Settings
     openai_api_key: Optional[str] = None
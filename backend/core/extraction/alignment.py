@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple, Optional, Callable, Sequence
+from rapidfuzz import fuzz, process
+import numpy as np
+from .group_scoring import (
+    CleanedSubtitle, MATCH_THRESHOLD, MAX_GROUP_SIZE, MAX_GAP_MS, build_subtitle_groups
+)
+
+@dataclass
+class GroupCandidate:
+    """A run of consecutive cleaned subtitles that a piece of script text may match"""
+    start: int  # Index into the cleaned subtitles
+    end: int  # Inclusive
+    ratio: float
+
+class BandedAligner:
+    """Aligns script segments to subtitle groups in one monotonic dynamic-programming pass.
+
+    Script order and subtitle order agree, so segment i can only match subtitles near
+    the diagonal i * len(subtitles) / len(segments). Each segment is scored against the
+    groups starting inside that band only, and the DP picks the set of non-overlapping,
+    in-order matches with the largest total margin over the match threshold (segments
+    and subtitles may both go unmatched). That replaces an all-pairs search per segment
+    with roughly band_width * max_group_size comparisons, and stops a short line like
+    "Yes, sir." from matching the same subtitle as an identical line elsewhere.
+    """
+
+    def __init__(
+        self,
+        cleaned_subtitles: Sequence[CleanedSubtitle],
+        clean_text: Callable[[str], str],
+        band_width: Optional[int] = None,
+        threshold: float = MATCH_THRESHOLD,
+        max_group_size: int = MAX_GROUP_SIZE,
+        max_gap_ms: int = MAX_GAP_MS
+    ):
+        self.cleaned_subtitles = cleaned_subtitles
+        self.clean_text = clean_text
+        self.band_width = band_width
+        self.threshold = threshold
+        self.groups = build_subtitle_groups(cleaned_subtitles, clean_text, max_group_size, max_gap_ms)
+
+    @property
+    def width(self) -> int:
+        """Band half-width in subtitles: an eighth of the episode, at least 40"""
+        return self.band_width or max(40, len(self.cleaned_subtitles) // 8)
+
+    def _band(self, i: int, num_segments: int) -> Tuple[int, int]:
+        """Subtitle start indices [lo, hi) considered for segment i"""
+        num_subs = len(self.cleaned_subtitles)
+        center = int(i * num_subs / max(num_segments, 1))
+        return max(0, center - self.width), min(num_subs, center + self.width + 1)
+
+    def candidates(self, text: str, lo: int, hi: int) -> List[GroupCandidate]:
+        """Groups starting in [lo, hi) whose ratio against text clears the threshold"""
+        cleaned = self.clean_text(text)
+        if not cleaned:
+            return []
+        cutoff = self.threshold * 100
+        first, last = self.groups.span(lo, hi)
+        if first == last:
+            return []
+        scores = process.cdist(
+            [cleaned], self.groups.texts[first:last],
+            scorer=fuzz.ratio, score_cutoff=cutoff, dtype=np.float64
+        )[0]
+        return [
+            GroupCandidate(int(self.groups.starts[first + k]), int(self.groups.ends[first + k]), float(scores[k]) / 100.0)
+            for k in np.flatnonzero(scores > cutoff)
+        ]
+
+    def align(self, texts: Sequence[str]) -> List[Optional[GroupCandidate]]:
+        """Best monotonic assignment of texts (in script order) to subtitle groups"""
+        num_subs = len(self.cleaned_subtitles)
+        # best[j]: largest total gain using only subtitles before j, for the segments so far
+        best = np.zeros(num_subs + 1)
+        # choice[i][j]: candidate that set best[j] at segment i, -1 = segment i skipped, -2 = carried from j - 1
+        choices = np.full((len(texts), num_subs + 1), -1, dtype=np.int32)
+        row_candidates: List[List[GroupCandidate]] = []
+
+        for i, text in enumerate(texts):
+            lo, hi = self._band(i, len(texts))
+            candidates = self.candidates(text, lo, hi)
+            row_candidates.append(candidates)
+            row = best.copy()
+            for c, candidate in enumerate(candidates):
+                value = best[candidate.start] + candidate.ratio - self.threshold
+                if value > row[candidate.end + 1]:
+                    row[candidate.end + 1] = value
+                    choices[i, candidate.end + 1] = c
+            carried = np.maximum.accumulate(row)
+            choices[i, carried > row] = -2
+            best = carried
+
+        matches: List[Optional[GroupCandidate]] = [None] * len(texts)
+        j = num_subs
+        for i in range(len(texts) - 1, -1, -1):
+            while choices[i, j] == -2:
+                j -= 1
+            c = choices[i, j]
+            if c >= 0:
+                matches[i] = row_candidates[i][c]
+                j = matches[i].start
+        return matches
+
+    def best_in_window(self, text: str, lo: int, hi: int) -> Optional[GroupCandidate]:
+        """Highest-ratio group starting in [lo, hi), for sentences inside an aligned segment"""
+        candidates = self.candidates(text, max(0, lo), min(len(self.cleaned_subtitles), hi))
+        return max(candidates, key=lambda c: c.ratio, default=None)
+
+    def to_match(self, text: str, candidate: GroupCandidate) -> Dict[str, Any]:
+        """Match dict in the format DialogMatcher has always returned"""
+        group = [self.cleaned_subtitles[k][0] for k in range(candidate.start, candidate.end + 1)]
+        return {
+            'text': text,
+            'subtitle_text': ' '.join(sub.text for sub in group),
+            'start_time': group[0].start,
+            'end_time': group[-1].end,
+            'match_ratio': candidate.ratio,
+            'subtitle_group': group,
+            'position': candidate.start
+        }
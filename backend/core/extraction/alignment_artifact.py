@@ -0,0 +1,136 @@
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
+import json
+import os
+import pysrt
+
+# Bump when matcher changes should invalidate every stored alignment
+ALIGNMENT_VERSION = 1
+
+def file_sha256(path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def alignment_key(script_sha256: str, srt_sha256: str, engine: str) -> str:
+    """Identity of a matcher run: script and subtitle content, engine and matcher version"""
+    return hashlib.sha256(
+        f"{ALIGNMENT_VERSION}:{engine}:{script_sha256}:{srt_sha256}".encode()
+    ).hexdigest()
+
+def _encode_match(match: Optional[Dict], position_of: Dict[int, int]) -> Optional[Dict]:
+    if not match:
+        return None
+    return {
+        'text': match['text'],
+        'subtitle_text': match['subtitle_text'],
+        'start_ms': match['start_time'].ordinal,
+        'end_ms': match['end_time'].ordinal,
+        'match_ratio': match['match_ratio'],
+        'subtitles': [position_of[id(sub)] for sub in match['subtitle_group']]
+    }
+
+def _decode_match(match: Optional[Dict], subtitles: Optional[pysrt.SubRipFile]) -> Optional[Dict]:
+    if not match:
+        return None
+    return {
+        'text': match['text'],
+        'subtitle_text': match['subtitle_text'],
+        'start_time': pysrt.SubRipTime.from_ordinal(match['start_ms']),
+        'end_time': pysrt.SubRipTime.from_ordinal(match['end_ms']),
+        'match_ratio': match['match_ratio'],
+        'subtitle_group': [subtitles[i] for i in match['subtitles']] if subtitles is not None else []
+    }
+
+def write_alignment(
+    path,
+    matched_segments: List[Dict],
+    subtitles: pysrt.SubRipFile,
+    header: Dict[str, Any]
+) -> None:
+    """Write matcher output as JSONL: a header line, then one line per matched segment.
+
+    Subtitle groups are stored as positions in the subtitle file, with their times, so
+    readers need the subtitle file only for the subtitle items themselves.
+    """
+    position_of = {id(sub): i for i, sub in enumerate(subtitles)}
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".tmp.{os.getpid()}")
+    with open(tmp, 'w') as f:
+        f.write(json.dumps({**header, 'version': ALIGNMENT_VERSION, 'segments': len(matched_segments)}) + '\n')
+        for segment in matched_segments:
+            f.write(json.dumps({
+                'speaker': segment['speaker'],
+                'text': segment['text'],
+                'scene_info': segment['scene_info'],
+                'complete': _encode_match(segment['complete'], position_of),
+                'sentences': [_encode_match(match, position_of) for match in segment['sentences']]
+            }) + '\n')
+    os.replace(tmp, path)
+
+def read_alignment(path, subtitles: Optional[pysrt.SubRipFile] = None) -> Tuple[Dict[str, Any], List[Dict]]:
+    """Header and matched segments in match_dialog's format.
+
+    Without the subtitle file the matches carry times and texts but empty subtitle groups,
+    which is all re-embedding needs; cutting clips needs the subtitles for the clip .srt.
+    """
+    with open(path) as f:
+        header = json.loads(f.readline())
+        segments = []
+        for line in f:
+            segment = json.loads(line)
+            segment['complete'] = _decode_match(segment['complete'], subtitles)
+            segment['sentences'] = [_decode_match(match, subtitles) for match in segment['sentences']]
+            segments.append(segment)
+    if len(segments) != header['segments']:
+        raise ValueError(f"Truncated alignment {path}: {len(segments)} of {header['segments']} segments")
+    return header, segments
+
+class AlignmentStore:
+    """Per-episode matcher output under <root>/<episode>/<key>.jsonl.
+
+    The key covers the script and subtitle content and the matcher engine, so clip
+    re-cutting and re-embedding reuse an alignment until one of those changes.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def path_for(self, episode_code: str, key: str) -> Path:
+        return self.root / episode_code / f"{key[:24]}.jsonl"
+
+    def key_for(self, script_file, subtitles_file, engine: str) -> str:
+        return alignment_key(file_sha256(script_file), file_sha256(subtitles_file), engine)
+
+    def load(
+        self,
+        episode_code: str,
+        key: str,
+        subtitles: Optional[pysrt.SubRipFile] = None
+    ) -> Optional[List[Dict]]:
+        path = self.path_for(episode_code, key)
+        if not path.exists():
+            return None
+        try:
+            header, segments = read_alignment(path, subtitles)
+        except (ValueError, KeyError, IndexError):
+            return None
+        if header.get('key') != key:
+            return None
+        return segments
+
+    def save(
+        self,
+        episode_code: str,
+        key: str,
+        matched_segments: List[Dict],
+        subtitles: pysrt.SubRipFile,
+        **header: Any
+    ) -> Path:
+        path = self.path_for(episode_code, key)
+        write_alignment(path, matched_segments, subtitles, {**header, 'episode': episode_code, 'key': key})
+        return path
@@ -0,0 +1,268 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Dict, Any, Sequence, Tuple
+import bisect
+import json
+import os
+import subprocess
+import time
+import logging
+import pysrt
+
+from backend.core.extraction.subtitle_processor import SubtitleExtractor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Web playback profile, written at extraction so clips play everywhere (iOS included)
+# without serving-time transcoding: H.264 High 8-bit 4:2:0 video, AAC-LC stereo 44.1 kHz
+# audio normalized to -16 LUFS, and the moov atom up front for instant start
+VIDEO_ENCODE_ARGS = ['-c:v', 'libx264', '-preset', 'veryfast', '-crf', '20', '-profile:v', 'high', '-pix_fmt', 'yuv420p']
+AUDIO_ENCODE_ARGS = [
+    '-af', 'loudnorm=I=-16:TP=-1.5:LRA=11',
+    '-c:a', 'aac', '-b:a', '128k', '-ac', '2', '-ar', '44100'
+]
+CONTAINER_ARGS = ['-movflags', '+faststart']
+# Source video that can be stream-copied into the web profile as is
+COPYABLE_VIDEO = {"codec_name": "h264", "pix_fmt": "yuv420p"}
+COPY_SEEK_EPSILON = 0.005
+
+@dataclass
+class ClipSpec:
+    """One clip to cut from an episode, times in seconds of the source video"""
+    output_path: str
+    start: float
+    end: float
+    subtitle_group: List[pysrt.SubRipItem] = field(default_factory=list)
+    group_id: str = ""
+    copy: bool = False  # Start sits on a keyframe, so video can be stream-copied
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+@dataclass
+class ClipChunk:
+    """Clips produced by one ffmpeg invocation from a single demux/decode of [start, end)"""
+    start: float
+    end: float
+    clips: List[ClipSpec] = field(default_factory=list)
+
+@dataclass
+class ExtractionReport:
+    clips: int = 0
+    copied: int = 0
+    encoded: int = 0
+    invocations: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0  # User + system time of the ffmpeg processes
+
+    @property
+    def extracted(self) -> int:
+        return self.clips - len(self.failed_ids)
+
+    @property
+    def clips_per_second(self) -> float:
+        return self.extracted / self.wall_seconds if self.wall_seconds else 0.0
+
+    @property
+    def cpu_seconds_per_clip(self) -> float:
+        return self.cpu_seconds / self.extracted if self.extracted else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Extracted {self.extracted}/{self.clips} clips ({self.copied} stream-copied, "
+            f"{self.encoded} encoded) in {self.invocations} ffmpeg runs: "
+            f"{self.wall_seconds:.1f}s wall, {self.cpu_seconds:.1f} CPU-s, "
+            f"{self.clips_per_second:.1f} clips/s, {self.cpu_seconds_per_clip:.2f} CPU-s/clip"
+        )
+
+def probe_keyframes(video_file: str, ffprobe: str = 'ffprobe') -> List[float]:
+    """Sorted keyframe timestamps of the first video stream, read from packets without decoding"""
+    cmd = [
+        ffprobe, '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        str(video_file)
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.warning(f"Could not read keyframes of {video_file}: {result.stderr.strip()}")
+        return []
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+def probe_video_stream(video_file: str, ffprobe: str = 'ffprobe') -> Dict[str, Any]:
+    """Codec details of the first video stream; empty when probing fails"""
+    cmd = [
+        ffprobe, '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_name,pix_fmt,profile',
+        '-of', 'json',
+        str(video_file)
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return {}
+    streams = json.loads(result.stdout or '{}').get('streams', [])
+    return streams[0] if streams else {}
+
+def is_web_copyable(stream: Dict[str, Any]) -> bool:
+    """Whether source video already fits the web profile, so clips may stream-copy it"""
+    return all(stream.get(key) == value for key, value in COPYABLE_VIDEO.items())
+
+def snap_to_keyframes(
+    clips: Sequence[ClipSpec],
+    keyframes: Sequence[float],
+    max_lead: float = 0.25
+) -> None:
+    """Mark clips that can be stream-copied, moving their start back onto the keyframe.
+
+    A clip qualifies when a keyframe lies at most max_lead seconds before its start, so
+    copying only adds a little lead-in; every other clip is re-encoded from its exact start.
+    """
+    for clip in clips:
+        i = bisect.bisect_right(keyframes, clip.start) - 1
+        if i >= 0 and clip.start - keyframes[i] <= max_lead:
+            clip.start = keyframes[i]
+            clip.copy = True
+
+def plan_chunks(
+    clips: Sequence[ClipSpec],
+    keyframes: Sequence[float] = (),
+    max_chunk_seconds: float = 300.0,
+    max_outputs: int = 24
+) -> List[ClipChunk]:
+    """Group clips (in start order) into windows cut by one ffmpeg run each.
+
+    A chunk starts on the keyframe at or before its first clip, so the input seek lands
+    on a keyframe, and is closed when the next clip would end more than
+    max_chunk_seconds after the chunk start or the chunk already has max_outputs clips.
+    """
+    chunks: List[ClipChunk] = []
+    for clip in sorted(clips, key=lambda c: (c.start, c.end)):
+        current = chunks[-1] if chunks else None
+        if (
+            current is None
+            or len(current.clips) >= max_outputs
+            or clip.end - current.start > max_chunk_seconds
+        ):
+            i = bisect.bisect_right(keyframes, clip.start) - 1
+            current = ClipChunk(start=keyframes[i] if i >= 0 else clip.start, end=clip.end)
+            chunks.append(current)
+        current.clips.append(clip)
+        current.end = max(current.end, clip.end)
+    return chunks
+
+def run_with_cpu_time(cmd: List[str]) -> Tuple[int, str, float]:
+    """Run a command to completion; returns its exit code, stderr and CPU seconds.
+
+    The CPU time is read from wait4 for this child alone, so ffmpeg runs going on at the
+    same time in other threads (other chunks, other episodes) are not counted.
+    """
+    process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    with process.stderr:
+        stderr = process.stderr.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    return process.returncode, stderr, usage.ru_utime + usage.ru_stime
+
+def build_chunk_command(video_file: str, chunk: ClipChunk, ffmpeg: str = 'ffmpeg') -> List[str]:
+    """One ffmpeg command that demuxes and decodes the chunk once and writes every clip in it"""
+    cmd = [
+        ffmpeg, '-hide_banner', '-loglevel', 'error', '-y',
+        '-ss', f"{chunk.start:.3f}",
+        '-t', f"{chunk.end - chunk.start:.3f}",
+        '-i', str(video_file)
+    ]
+    for clip in chunk.clips:
+        # Output seeking is relative to the chunk start; decoding is shared by all outputs.
+        # A copied clip is nudged just before its keyframe: stream copy starts at the
+        # first keyframe at or after the seek point, so rounding past it would lose it.
+        offset = clip.start - chunk.start
+        if clip.copy:
+            offset = max(0.0, offset - COPY_SEEK_EPSILON)
+        cmd += [
+            '-map', '0:v:0', '-map', '0:a:0?',
+            '-ss', f"{offset:.3f}",
+            '-t', f"{clip.duration:.3f}"
+        ]
+        cmd += ['-c:v', 'copy'] if clip.copy else VIDEO_ENCODE_ARGS
+        cmd += AUDIO_ENCODE_ARGS + CONTAINER_ARGS
+        cmd += [str(clip.output_path)]
+    return cmd
+
+class ClipExtractor:
+    """Cuts all clips of an episode with a few multi-output ffmpeg runs.
+
+    Instead of opening and decoding the episode once per clip, clips are grouped into
+    time-ordered chunks; each chunk is one ffmpeg process that seeks once, decodes the
+    window once and encodes (or stream-copies) every clip inside it. A few chunks run
+    concurrently. CPU time of the ffmpeg children is measured per process with wait4.
+    """
+
+    def __init__(
+        self,
+        ffmpeg: str = 'ffmpeg',
+        ffprobe: str = 'ffprobe',
+        max_chunk_seconds: float = 300.0,
+        max_outputs: int = 24,
+        workers: int = 2,
+        stream_copy: bool = True
+    ):
+        self.ffmpeg = ffmpeg
+        self.ffprobe = ffprobe
+        self.max_chunk_seconds = max_chunk_seconds
+        self.max_outputs = max_outputs
+        self.workers = workers
+        self.stream_copy = stream_copy
+
+    def _run_chunk(self, video_file: str, chunk: ClipChunk) -> Tuple[List[str], float]:
+        """Run one chunk; returns the group ids of clips that were not produced and ffmpeg's CPU seconds"""
+        # Clear leftovers so a failed run is never mistaken for a produced clip
+        for clip in chunk.clips:
+            Path(clip.output_path).unlink(missing_ok=True)
+        returncode, stderr, cpu_seconds = run_with_cpu_time(build_chunk_command(video_file, chunk, self.ffmpeg))
+        if returncode != 0:
+            logger.error(f"ffmpeg failed for chunk at {chunk.start:.1f}s: {stderr.strip()[-500:]}")
+        failed = []
+        for clip in chunk.clips:
+            output = Path(clip.output_path)
+            if not output.exists() or output.stat().st_size == 0:
+                failed.append(clip.group_id)
+                continue
+            # Subtitles for the clip, timed relative to its start
+            subtitle_segments = SubtitleExtractor.extract_subtitle_segments(clip.subtitle_group, clip.start)
+            SubtitleExtractor.save_subtitles(subtitle_segments, output.with_suffix('.srt'))
+        return failed, cpu_seconds
+
+    def extract(self, video_file: str, clips: List[ClipSpec]) -> ExtractionReport:
+        report = ExtractionReport(clips=len(clips))
+        if not clips:
+            return report
+        started = time.perf_counter()
+
+        # Video is only copied when the source is already web-profile H.264
+        copyable = self.stream_copy and is_web_copyable(probe_video_stream(video_file, self.ffprobe))
+        keyframes = probe_keyframes(video_file, self.ffprobe) if copyable else []
+        snap_to_keyframes(clips, keyframes)
+        chunks = plan_chunks(clips, keyframes, self.max_chunk_seconds, self.max_outputs)
+        report.copied = sum(1 for clip in clips if clip.copy)
+        report.encoded = len(clips) - report.copied
+        report.invocations = len(chunks)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for failed, cpu_seconds in executor.map(lambda chunk: self._run_chunk(video_file, chunk), chunks):
+                report.failed_ids.extend(failed)
+                report.cpu_seconds += cpu_seconds
+
+        report.wall_seconds = time.perf_counter() - started
+        logger.info(report.summary())
+        return report
@@ -4,16 +4,51 @@ import pysrt
 import re
 from tqdm import tqdm
 from .script_parser import DialogSegment
+from .alignment import BandedAligner
+from .group_scoring import build_subtitle_groups, score_groups, best_group
+from .subtitle_index import SubtitleNgramIndex
+from .subtitle_store import SubtitleStore
 from backend.core.utils.text_utils import clean_dialog_text, split_into_sentences
 from multiprocessing import Pool
-import functools
 import nltk
 from difflib import SequenceMatcher
 
+# 'banded' aligns the whole episode in one DP pass; 'exhaustive' searches every subtitle per
+# segment; 'indexed' runs the same search over n-gram index candidates only; 'vectorized'
+# scores every text against every precomputed subtitle group in one batched cdist call
+ENGINES = ('banded', 'indexed', 'vectorized', 'exhaustive')
+
+# Per-worker matcher over the shared subtitle store, set by _init_worker
+_worker_matcher = None
+_worker_shm = None
+
+def _init_worker(descriptor: Dict[str, Any], engine: str):
+    """Attach the shared subtitle store once per worker process"""
+    global _worker_matcher, _worker_shm
+    try:
+        nltk.data.find('tokenizers/punkt')
+    except LookupError:
+        nltk.download('punkt', quiet=True)
+    store, _worker_shm = SubtitleStore.attach(descriptor)
+    _worker_matcher = DialogMatcher.from_store(store, engine)
+
+def _match_in_worker(segment: DialogSegment) -> Dict:
+    return _worker_matcher._match_single_segment(segment)
+
 class DialogMatcher:
-    def __init__(self, script_segments: List[DialogSegment], subtitles: pysrt.SubRipFile):
+    def __init__(
+        self,
+        script_segments: List[DialogSegment],
+        subtitles: pysrt.SubRipFile,
+        engine: str = 'banded',
+        band_width: Optional[int] = None
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown matching engine {engine!r}, expected one of {ENGINES}")
         self.script_segments = script_segments
         self.subtitles = subtitles
+        self.engine = engine
+        self.band_width = band_width
         self.cleaned_subtitles = []
         self.original_to_cleaned_map = {}
         
@@ -38,6 +73,39 @@ class DialogMatcher:
                 if cleaned:
                     self.cleaned_subtitles.append((sub, cleaned, False))
                     self.original_to_cleaned_map[idx] = cleaned
+        
+        self.store = SubtitleStore.from_cleaned(self.cleaned_subtitles, subtitles)
+        self._setup_engine()
+    
+    @classmethod
+    def from_store(cls, store: SubtitleStore, engine: str = 'exhaustive') -> "DialogMatcher":
+        """Matcher over an array-backed store only, as used in worker processes.
+        
+        It has no pysrt objects, so it can run find_subtitle_group and
+        _match_single_segment but not the methods that return subtitle groups.
+        """
+        matcher = cls.__new__(cls)
+        matcher.script_segments = []
+        matcher.subtitles = None
+        matcher.engine = engine
+        matcher.band_width = None
+        matcher.cleaned_subtitles = None
+        matcher.original_to_cleaned_map = {}
+        matcher.store = store
+        matcher._setup_engine()
+        return matcher
+    
+    def _setup_engine(self):
+        # Plain lists of the store's columns for the per-subtitle loops in find_subtitle_group
+        self._start_ms = self.store.start_ms.tolist()
+        self._end_ms = self.store.end_ms.tolist()
+        self._is_multi = self.store.is_multi.tolist()
+        
+        # Subtitle groups for the vectorized engine, built on first use
+        self.groups = None
+        self.index = None
+        if self.engine == 'indexed':
+            self.index = SubtitleNgramIndex(self.store.cleaned, self.clean_text)
     
     def normalize_speaker(self, speaker: str) -> str:
         """Normalize speaker names to handle variations"""
@@ -67,8 +135,12 @@ class DialogMatcher:
         
         return ' '.join(text.split())
     
-    def find_subtitle_group(self, script_text: str, start_idx: int, script_position: int = 0) -> Tuple[List[pysrt.SubRipItem], float, bool, int]:
-        """Find a group of consecutive subtitles that match the script text"""
+    def find_subtitle_group(self, script_text: str, start_idx: int, script_position: int = 0, max_starts: int = 100) -> Tuple[List[int], float, bool, int]:
+        """Find a group of consecutive subtitles starting within max_starts of start_idx that match the script text.
+        
+        Returns the group as indices into the subtitle store.
+        """
+        cleaned_texts, start_ms, end_ms, multi = self.store.cleaned, self._start_ms, self._end_ms, self._is_multi
         best_ratio = 0
         best_group = []
         best_position = start_idx  # Track position of best match
@@ -81,25 +153,13 @@ class DialogMatcher:
         # For very short phrases, we want to consider position more carefully
         is_short_phrase = len(words) <= 2
         
-        for i in range(start_idx, min(start_idx + 100, len(self.cleaned_subtitles))):
-            current_group = []
-            combined_text = ""
-            last_end_time = None
-            current_has_multi = False
-            
-            # Get initial subtitle
-            sub, cleaned_sub_text, is_multi = self.cleaned_subtitles[i]
-            
+        for i in range(start_idx, min(start_idx + max_starts, len(cleaned_texts))):
             # Include multi-speaker lines but track their presence
-            current_has_multi = is_multi
-            
-            # Check timing gap
-            if last_end_time and (sub.start.ordinal - last_end_time.ordinal) > 2500:
-                continue
+            current_has_multi = multi[i]
             
-            current_group.append(sub)
-            combined_text = cleaned_sub_text
-            last_end_time = sub.end
+            current_group = [i]
+            combined_text = cleaned_texts[i]
+            last_end_time = end_ms[i]
             
             # Modified ratio comparison for short phrases
             if is_short_phrase:
@@ -124,15 +184,15 @@ class DialogMatcher:
                     has_multi_speaker = current_has_multi
             
             # Try combining with subsequent subtitles
-            for j in range(i + 1, min(i + max_group_size, len(self.cleaned_subtitles))):
-                next_sub, next_cleaned_text, next_is_multi = self.cleaned_subtitles[j]
+            for j in range(i + 1, min(i + max_group_size, len(cleaned_texts))):
+                next_cleaned_text = cleaned_texts[j]
                 
                 # Check timing gap
-                if (next_sub.start.ordinal - last_end_time.ordinal) > 2500:
+                if (start_ms[j] - last_end_time) > 2500:
                     break
                 
-                current_group.append(next_sub)
-                current_has_multi = current_has_multi or next_is_multi
+                current_group.append(j)
+                current_has_multi = current_has_multi or multi[j]
                 
                 # Handle ellipses when combining text
                 if combined_text.endswith('...') and not next_cleaned_text.startswith('...'):
@@ -140,7 +200,7 @@ class DialogMatcher:
                 else:
                     combined_text += ' ' + next_cleaned_text
                 
-                last_end_time = next_sub.end
+                last_end_time = end_ms[j]
                 
                 ratio = fuzz.ratio(cleaned_script, combined_text) / 100.0
                 if ratio > best_ratio:
@@ -154,7 +214,10 @@ class DialogMatcher:
         return best_group, best_ratio, has_multi_speaker, best_position
     
     def _match_single_segment(self, segment) -> Dict:
-        """Process a single script segment - helper for parallel processing"""
+        """Process a single script segment - helper for parallel processing.
+        
+        Matches refer to subtitles by store index; _materialize turns them into output matches.
+        """
         # Normalize the speaker name before processing
         normalized_speaker = self.normalize_speaker(segment.speaker)
         
@@ -165,7 +228,7 @@ class DialogMatcher:
         debug_output.append(f"Complete text: {segment.text}")
         
         # First try to match the complete dialog
-        complete_match = self._find_best_match(segment.text, segment.position)
+        complete_match = self._find_best_group(segment.text, segment.position)
         if complete_match:
             debug_output.append(f"\nComplete match found:")
             debug_output.append(f"Match ratio: {complete_match['match_ratio']:.2%}")
@@ -184,7 +247,7 @@ class DialogMatcher:
             
             for i, sentence in enumerate(sentences):
                 debug_output.append(f"\nSentence {i+1}: {sentence}")
-                sentence_match = self._find_best_match(sentence, segment.position)
+                sentence_match = self._find_best_group(sentence, segment.position)
                 if sentence_match:
                     # Check if the matched subtitle contains multiple sentences
                     subtitle_sentences = split_into_sentences(sentence_match['subtitle_text'])
@@ -214,14 +277,39 @@ class DialogMatcher:
 
     def _find_best_match(self, text: str, script_position: int) -> Optional[Dict]:
         """Find the best matching subtitle group for a piece of text"""
+        return self._materialize(self._find_best_group(text, script_position))
+
+    def _materialize(self, match: Optional[Dict]) -> Optional[Dict]:
+        """Output match with pysrt subtitles and times for a store-index match"""
+        if match is None:
+            return None
+        group = [self.cleaned_subtitles[k][0] for k in match['subtitle_indices']]
+        return {
+            'text': match['text'],
+            'subtitle_text': match['subtitle_text'],
+            'start_time': group[0].start,
+            'end_time': group[-1].end,
+            'match_ratio': match['match_ratio'],
+            'subtitle_group': group,
+            'position': match['position']
+        }
+
+    def _find_best_group(self, text: str, script_position: int) -> Optional[Dict]:
+        """Best matching subtitle group for a piece of text, as store indices"""
         best_match_ratio = 0
         best_match_group = None
         has_multi_speaker = False
         best_position = 0
         
-        # Search through ALL subtitles
-        for i in range(len(self.cleaned_subtitles)):
-            subtitle_group, match_ratio, is_multi, position = self.find_subtitle_group(text, i, script_position)
+        if self.index is not None:
+            # Only groups starting at subtitles that share rare n-grams with the text
+            starts, max_starts = self.index.candidates(text, near=script_position), 1
+        else:
+            # Search through ALL subtitles
+            starts, max_starts = range(len(self.store)), 100
+        
+        for i in starts:
+            subtitle_group, match_ratio, is_multi, position = self.find_subtitle_group(text, i, script_position, max_starts)
             
             # Skip multi-speaker subtitles
             if is_multi:
@@ -229,7 +317,7 @@ class DialogMatcher:
                 
             if match_ratio > best_match_ratio:
                 # Check for " - " in the combined text before accepting
-                subtitle_text = ' '.join(sub.text for sub in subtitle_group)
+                subtitle_text = self.store.group_text(subtitle_group)
                 if ' - ' in subtitle_text:
                     continue
                     
@@ -244,50 +332,168 @@ class DialogMatcher:
             # For very short phrases, if we have an equal match ratio, prefer the closer position
             elif match_ratio == best_match_ratio and len(text.split()) <= 2:
                 if abs(position - script_position) < abs(best_position - script_position):
-                    subtitle_text = ' '.join(sub.text for sub in subtitle_group)
+                    subtitle_text = self.store.group_text(subtitle_group)
                     if ' - ' not in subtitle_text or match_ratio > 0.85:
                         best_match_group = subtitle_group
                         has_multi_speaker = is_multi
                         best_position = position
         
         if best_match_group and best_match_ratio > 0.61:
-            subtitle_text = ' '.join(sub.text for sub in best_match_group)
             return {
                 'text': text,
-                'subtitle_text': subtitle_text,
-                'start_time': best_match_group[0].start,
-                'end_time': best_match_group[-1].end,
+                'subtitle_text': self.store.group_text(best_match_group),
                 'match_ratio': best_match_ratio,
-                'subtitle_group': best_match_group,
+                'subtitle_indices': best_match_group,
                 'position': best_position
             }
         return None
 
+    def _sentence_window(self, complete: List, i: int, band: int) -> Tuple[int, int]:
+        """Subtitle start indices [lo, hi) where the sentences of segment i can match"""
+        if complete[i]:
+            return complete[i].start, complete[i].end + 1
+        # Unmatched segment: between its aligned neighbours, no wider than the band
+        previous = next((c for c in reversed(complete[:i]) if c), None)
+        following = next((c for c in complete[i + 1:] if c), None)
+        lo = previous.end + 1 if previous else 0
+        hi = following.start + 1 if following else len(self.cleaned_subtitles)
+        return lo, min(hi, lo + 2 * band)
+
+    def _match_banded(self) -> List[Dict]:
+        """All complete matches from one banded DP pass, then sentences near their segment"""
+        aligner = BandedAligner(self.cleaned_subtitles, self.clean_text, band_width=self.band_width)
+        complete = aligner.align([segment.text for segment in self.script_segments])
+        
+        results = []
+        for i, segment in enumerate(tqdm(self.script_segments, desc="Matching dialog")):
+            sentence_matches = []
+            sentences = split_into_sentences(segment.text)
+            if len(sentences) > 1:
+                lo, hi = self._sentence_window(complete, i, aligner.width)
+                for sentence in sentences:
+                    candidate = aligner.best_in_window(sentence, lo, hi)
+                    if not candidate:
+                        continue
+                    match = aligner.to_match(sentence, candidate)
+                    # Only keep sentence matches whose subtitles hold a single sentence
+                    if len(split_into_sentences(match['subtitle_text'])) == 1:
+                        sentence_matches.append(match)
+            
+            results.append({
+                'complete': aligner.to_match(segment.text, complete[i]) if complete[i] else None,
+                'sentences': sentence_matches,
+                'speaker': self.normalize_speaker(segment.speaker),
+                'text': segment.text,
+                'scene_info': segment.scene_info
+            })
+        return [r for r in results if r['complete'] or r['sentences']]
+
+    def best_matches(self, texts: List[str], positions: List[int]) -> List[Optional[Dict]]:
+        """Best match for each text against every subtitle group, scored in batched cdist calls"""
+        if self.groups is None:
+            self.groups = build_subtitle_groups(self.cleaned_subtitles)
+        groups = self.groups
+        
+        matches: List[Optional[Dict]] = []
+        cleaned_texts = [self.clean_text(text) for text in texts]
+        for first, scores in score_groups(cleaned_texts, groups):
+            for row, text in enumerate(texts[first:first + len(scores)]):
+                # Short phrases tie a lot; prefer the group nearest the script position
+                near = positions[first + row] if len(text.split()) <= 2 else None
+                g = best_group(scores[row], groups, near=near)
+                if g is None:
+                    matches.append(None)
+                    continue
+                group = [self.cleaned_subtitles[k][0] for k in range(groups.starts[g], groups.ends[g] + 1)]
+                matches.append({
+                    'text': text,
+                    'subtitle_text': ' '.join(sub.text for sub in group),
+                    'start_time': group[0].start,
+                    'end_time': group[-1].end,
+                    'match_ratio': float(scores[row, g]) / 100.0,
+                    'subtitle_group': group,
+                    'position': int(groups.starts[g])
+                })
+        return matches
+
+    def _match_vectorized(self) -> List[Dict]:
+        """Complete and sentence matches for the whole episode from one batched scoring pass"""
+        # One query per complete segment, plus one per sentence of multi-sentence segments
+        queries = []  # (segment index, text, is sentence)
+        for i, segment in enumerate(self.script_segments):
+            queries.append((i, segment.text, False))
+            sentences = split_into_sentences(segment.text)
+            if len(sentences) > 1:
+                queries.extend((i, sentence, True) for sentence in sentences)
+        
+        results = [{
+            'complete': None,
+            'sentences': [],
+            'speaker': self.normalize_speaker(segment.speaker),
+            'text': segment.text,
+            'scene_info': segment.scene_info
+        } for segment in self.script_segments]
+        
+        matches = self.best_matches(
+            [text for _, text, _ in queries],
+            [self.script_segments[i].position for i, _, _ in queries]
+        )
+        for (i, _, is_sentence), match in zip(queries, matches):
+            if match is None:
+                continue
+            if not is_sentence:
+                results[i]['complete'] = match
+            # Only keep sentence matches whose subtitles hold a single sentence
+            elif len(split_into_sentences(match['subtitle_text'])) == 1:
+                results[i]['sentences'].append(match)
+        
+        return [r for r in results if r['complete'] or r['sentences']]
+
+    def match_complete(self) -> List[Optional[Dict]]:
+        """Complete-dialog match of every script segment, in order (None when unmatched).
+
+        The engine's own first pass without sentence matching, so it needs no sentence tokenizer.
+        """
+        texts = [segment.text for segment in self.script_segments]
+        if self.engine == 'banded':
+            aligner = BandedAligner(self.cleaned_subtitles, self.clean_text, band_width=self.band_width)
+            return [
+                aligner.to_match(text, candidate) if candidate else None
+                for text, candidate in zip(texts, aligner.align(texts))
+            ]
+        positions = [segment.position for segment in self.script_segments]
+        if self.engine == 'vectorized':
+            return self.best_matches(texts, positions)
+        return [self._find_best_match(text, position) for text, position in zip(texts, positions)]
+
     def match_dialog(self) -> List[Dict]:
+        if self.engine == 'banded':
+            return self._match_banded()
+        if self.engine == 'vectorized':
+            return self._match_vectorized()
+        
         # Initialize NLTK data in main process
         try:
             nltk.data.find('tokenizers/punkt')
         except LookupError:
             nltk.download('punkt', quiet=True)
         
-        # Create a helper function that ensures NLTK data is available in worker process
-        def init_worker():
-            try:
-                nltk.data.find('tokenizers/punkt')
-            except LookupError:
-                nltk.download('punkt', quiet=True)
-        
-        # Initialize pool with the worker initialization function
-        with Pool(initializer=init_worker) as pool:
-            results = list(tqdm(
-                pool.imap_unordered(
-                    functools.partial(self._match_single_segment),
-                    self.script_segments,
-                    chunksize=10
-                ),
-                total=len(self.script_segments),
-                desc="Matching dialog"
-            ))
+        # Workers attach the subtitle arrays once instead of unpickling the matcher per task
+        shm, descriptor = self.store.to_shared()
+        try:
+            with Pool(initializer=_init_worker, initargs=(descriptor, self.engine)) as pool:
+                results = list(tqdm(
+                    pool.imap(_match_in_worker, self.script_segments, chunksize=10),
+                    total=len(self.script_segments),
+                    desc="Matching dialog"
+                ))
+        finally:
+            shm.close()
+            shm.unlink()
+        
+        for result in results:
+            result['complete'] = self._materialize(result['complete'])
+            result['sentences'] = [self._materialize(match) for match in result['sentences']]
         
         # Filter out results with no matches
         return [r for r in results if r['complete'] or r['sentences']]
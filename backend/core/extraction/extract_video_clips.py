@@ -2,76 +2,83 @@ import argparse
 import os
 import pysrt
 import re
-from moviepy.editor import VideoFileClip
-from multiprocessing import Pool, cpu_count
 import sys
 from pathlib import Path
-import tempfile
-from moviepy.config import change_settings
 import yaml
 from tqdm import tqdm
-import moviepy.editor as mpy
 import json
 from typing import List, Dict, Any
 from backend.core.extraction.script_parser import ScriptParser
-from backend.core.extraction.dialog_matcher import DialogMatcher
+from backend.core.extraction.dialog_matcher import ENGINES, DialogMatcher
 from backend.core.utils.text_utils import clean_dialog_text
-from backend.core.utils.time_utils import time_to_seconds, seconds_to_time
-from backend.core.storage.dialog_storage import DialogStorage
-from backend.core.extraction.subtitle_processor import SubtitleExtractor
+from backend.core.utils.time_utils import time_to_seconds
+from backend.config.settings import get_settings
+from backend.core.storage.dialog_storage import DialogStorage, check_ingest_config
+from backend.core.extraction.clip_extractor import ClipExtractor, ClipSpec
+from backend.core.extraction.alignment_artifact import AlignmentStore
 
 # Add the project root to the Python path
 project_root = str(Path(__file__).resolve().parents[2])
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-# Configure MoviePy to use system temp directory
-change_settings({"TEMP_DIR": tempfile.gettempdir()})
+DEFAULT_ALIGNMENTS_DIR = 'data/processed/alignments'
 
-def extract_clip(args):
-    input_video, output_video, start_time, end_time, subtitle_group, group_index, total_groups = args
-    
-    # Convert group_index to string if it's not already
-    group_index = str(group_index)
-    total_groups = str(total_groups)
-    
-    print(f"\nProcessing group {group_index}/{total_groups}:")
-    print(f"Extracting clip from {start_time} to {end_time}")
+def build_clip_specs(matched_segments, episode_dir, episode_code, padding_before, padding_after):
+    """Clip ranges for complete and sentence matches; group ids map back to the match"""
+    clips = []
+    for i, segment in enumerate(matched_segments):
+        matches = [(f"{i}_complete", f'{episode_code}_clip_{i:04d}.mp4', segment['complete'])]
+        matches += [
+            (f"{i}_s{j}", f'{episode_code}_clip_{i:04d}_s{j:02d}.mp4', sentence_match)
+            for j, sentence_match in enumerate(segment['sentences'])
+        ]
+        for group_id, filename, match in matches:
+            if not match:
+                continue
+            clips.append(ClipSpec(
+                output_path=str(Path(episode_dir) / filename),
+                start=max(0, time_to_seconds(match['start_time']) - padding_before),
+                end=time_to_seconds(match['end_time']) + padding_after,
+                subtitle_group=match['subtitle_group'],
+                group_id=group_id
+            ))
+    return clips
 
-    try:
-        with VideoFileClip(input_video) as video:
-            # Convert string times to seconds
-            if isinstance(start_time, str):
-                # Parse time string in format HH:MM:SS,mmm
-                h, m, s = map(float, start_time.replace(',', '.').split(':'))
-                start_seconds = h * 3600 + m * 60 + s
-            else:
-                start_seconds = time_to_seconds(start_time)
-                
-            if isinstance(end_time, str):
-                h, m, s = map(float, end_time.replace(',', '.').split(':'))
-                end_seconds = h * 3600 + m * 60 + s
-            else:
-                end_seconds = time_to_seconds(end_time)
-            
-            new_clip = video.subclip(start_seconds, end_seconds)
-            new_clip.write_videofile(output_video, codec="libx264", verbose=False, logger=None)
-            
-            # Extract and save subtitles
-            subtitle_extractor = SubtitleExtractor()
-            subtitle_segments = subtitle_extractor.extract_subtitle_segments(subtitle_group, start_seconds)
-            
-            # Save subtitles with same name as video but .srt extension
-            subtitle_path = Path(output_video).with_suffix('.srt')
-            subtitle_extractor.save_subtitles(subtitle_segments, subtitle_path)
+def collect_dialogs(matched_segments, clips, failed_ids, season, episode):
+    """(clip_id, text, metadata) of every extracted clip, for a single bulk insert"""
+    failed_ids = set(failed_ids)
+    dialogs = []
+    for clip in clips:
+        if clip.group_id in failed_ids:
+            continue
+        # Parse the group_id to get original segment index and type
+        if '_s' in clip.group_id:
+            segment_idx, sentence_idx = (int(part) for part in clip.group_id.split('_s'))
+            segment = matched_segments[segment_idx]
+            match_data = segment['sentences'][sentence_idx]
+        else:
+            segment_idx = int(clip.group_id.split('_')[0])
+            segment = matched_segments[segment_idx]
+            match_data = segment['complete']
         
-        print(f"Clip and subtitles extracted successfully: {output_video}")
-        return True, group_index
-    except Exception as e:
-        print(f"Error extracting clip: {e}")
-        return False, group_index
+        # Create clip ID and metadata
+        clip_id = Path(clip.output_path).stem
+        metadata = {
+            "clip_path": clip.output_path,
+            "start_time": str(match_data['start_time']),
+            "end_time": str(match_data['end_time']),
+            "season": season,
+            "episode": episode,
+            "speaker": segment['speaker'],
+            "scene_info": segment['scene_info'],
+            "match_ratio": match_data['match_ratio']
+        }
+        dialogs.append((clip_id, match_data['subtitle_text'], metadata))
+    return dialogs
 
-def process_episode(video_file, subtitles_file, script_file, output_dir, padding_before, padding_after, force=False):
+def process_episode(video_file, subtitles_file, script_file, output_dir, padding_before, padding_after, force=False,
+                    alignments_dir=DEFAULT_ALIGNMENTS_DIR, engine='banded', rematch=False, reembed=False):
     # Extract season and episode from video filename
     video_filename = Path(video_file).stem
     match = re.match(r'S(\d+)E(\d+)', video_filename)
@@ -111,96 +118,46 @@ def process_episode(video_file, subtitles_file, script_file, output_dir, padding
     episode_dir = Path(output_dir) / f"S{season:02d}E{episode:02d}"
     episode_dir.mkdir(parents=True, exist_ok=True)
     
-    # Parse script file and match dialog
-    parser = ScriptParser()
-    script_segments = parser.parse_script(script_file)
+    # Matching is the expensive step: reuse the stored alignment unless the script,
+    # subtitles or matcher engine changed
+    episode_code = f"S{season:02d}E{episode:02d}"
     subs = pysrt.open(subtitles_file)
-    matcher = DialogMatcher(script_segments, subs)
-    matched_segments = matcher.match_dialog()
-    
-    # Calculate total number of potential clips
-    total_clips = sum(1 for segment in matched_segments if segment['complete']) + \
-                 sum(len(segment['sentences']) for segment in matched_segments)
-    
-    # Extract clips for matched segments
-    extraction_args = []
-    for i, segment in enumerate(matched_segments):
-        # Handle complete match
-        if segment['complete']:
-            output_video = str(Path(episode_dir) / f'S{season:02d}E{episode:02d}_clip_{i:04d}.mp4')
-            start_time = seconds_to_time(max(0, time_to_seconds(segment['complete']['start_time']) - padding_before))
-            end_time = seconds_to_time(time_to_seconds(segment['complete']['end_time']) + padding_after)
-            
-            extraction_args.append((
-                str(video_file), 
-                output_video, 
-                start_time, 
-                end_time, 
-                segment['complete']['subtitle_group'],
-                f"{i}_complete", 
-                str(total_clips)
-            ))
-        
-        # Handle sentence matches
-        for j, sentence_match in enumerate(segment['sentences']):
-            output_video = str(Path(episode_dir) / f'S{season:02d}E{episode:02d}_clip_{i:04d}_s{j:02d}.mp4')
-            start_time = seconds_to_time(max(0, time_to_seconds(sentence_match['start_time']) - padding_before))
-            end_time = seconds_to_time(time_to_seconds(sentence_match['end_time']) + padding_after)
-            
-            extraction_args.append((
-                str(video_file), 
-                output_video, 
-                start_time, 
-                end_time, 
-                sentence_match['subtitle_group'],
-                f"{i}_s{j}", 
-                str(total_clips)
-            ))
+    alignments = AlignmentStore(alignments_dir)
+    alignment_key = alignments.key_for(script_file, subtitles_file, engine)
+    matched_segments = None if rematch else alignments.load(episode_code, alignment_key, subs)
+    if matched_segments is None:
+        parser = ScriptParser()
+        script_segments = parser.parse_script(script_file)
+        matcher = DialogMatcher(script_segments, subs, engine=engine)
+        matched_segments = matcher.match_dialog()
+        alignments.save(
+            episode_code, alignment_key, matched_segments, subs,
+            script=str(script_file), subtitles=str(subtitles_file), engine=engine
+        )
+    else:
+        print(f"Using stored alignment for {episode_code} ({len(matched_segments)} segments)")
     
-    # Extract clips in parallel
-    with Pool(processes=cpu_count()) as pool:
-        results = pool.map(extract_clip, extraction_args)
+    clips = build_clip_specs(matched_segments, episode_dir, episode_code, padding_before, padding_after)
+    if reembed:
+        # Re-embedding only: keep the clips already on disk
+        failed_ids = [clip.group_id for clip in clips if not Path(clip.output_path).exists()]
+    else:
+        # Cut every clip from a few multi-output ffmpeg runs over the episode
+        extraction = ClipExtractor().extract(str(video_file), clips)
+        print(extraction.summary())
+        failed_ids = extraction.failed_ids
+    for group_id in failed_ids:
+        print(f"Failed to extract clip for group {group_id}")
+    dialogs = collect_dialogs(matched_segments, clips, failed_ids, season, episode)
     
-    # Add clips to storage
-    for success, group_id in results:
-        if success:
-            # Parse the group_id to get original segment index and type
-            if '_s' in group_id:
-                segment_idx, sentence_idx = group_id.split('_s')
-                segment_idx = int(segment_idx)
-                sentence_idx = int(sentence_idx)
-                segment = matched_segments[segment_idx]
-                match_data = segment['sentences'][sentence_idx]
-                clip_path = str(Path(episode_dir) / f'S{season:02d}E{episode:02d}_clip_{segment_idx:04d}_s{sentence_idx:02d}.mp4')
-            else:
-                segment_idx = int(group_id.split('_')[0])
-                segment = matched_segments[segment_idx]
-                match_data = segment['complete']
-                clip_path = str(Path(episode_dir) / f'S{season:02d}E{episode:02d}_clip_{segment_idx:04d}.mp4')
-            
-            # Create clip ID and metadata
-            clip_id = Path(clip_path).stem
-            metadata = {
-                "clip_path": clip_path,
-                "start_time": str(match_data['start_time']),
-                "end_time": str(match_data['end_time']),
-                "season": season,
-                "episode": episode,
-                "speaker": segment['speaker'],
-                "scene_info": segment['scene_info'],
-                "match_ratio": match_data['match_ratio']
-            }
-            
-            # Add to storage
-            if storage.add_dialog(match_data['subtitle_text'], metadata, clip_id):
-                if storage.get_dialog(clip_id):
-                    print(f"Successfully verified storage of {clip_id}")
-                else:
-                    print(f"Warning: Failed to verify storage of {clip_id}")
-            
-            print(f"Processed clip {clip_id}")
-        else:
-            print(f"Failed to extract clip for group {group_id}")
+    # Add clips to storage: batched embeddings and upserts, sampled verification
+    if dialogs:
+        report = storage.add_dialogs(dialogs)
+        print(report.summary())
+        for clip_id in report.failed_ids:
+            print(f"Warning: Failed to store {clip_id}")
+        for clip_id in report.verify_missing:
+            print(f"Warning: Failed to verify storage of {clip_id}")
 
 def process_matches(matches, output_dir, season, episode, base_idx):
     """Process both complete and sentence-level matches"""
@@ -244,7 +201,15 @@ def create_clip_info(match, output_dir, season, episode, idx):
         }
     }
 
-def main(input_path, subtitles_path, script_path, output_dir, padding_before, padding_after, force=False):
+def main(input_path, subtitles_path, script_path, output_dir, padding_before, padding_after, force=False,
+         alignments_dir=DEFAULT_ALIGNMENTS_DIR, engine='banded', rematch=False, reembed=False):
+    episode_options = dict(alignments_dir=alignments_dir, engine=engine, rematch=rematch, reembed=reembed)
+    # Every episode ends by storing its clips; refuse before any matching or cutting if that cannot work
+    try:
+        check_ingest_config((get_settings().search_config or {}).get("storage", {}))
+    except ValueError as e:
+        print(f"Error: {e}")
+        return
     input_path = Path(input_path)
     subtitles_path = Path(subtitles_path)
     script_path = Path(script_path)
@@ -258,7 +223,8 @@ def main(input_path, subtitles_path, script_path, output_dir, padding_before, pa
         if not subtitles_file.exists() or not script_file.exists():
             print(f"Subtitle file or script file not found: {subtitles_file} or {script_file}")
             return
-        process_episode(video_file, subtitles_file, script_file, output_dir, padding_before, padding_after, force)
+        process_episode(video_file, subtitles_file, script_file, output_dir, padding_before, padding_after, force,
+                        **episode_options)
     
     elif input_path.is_dir():
         # Process all video files in directory
@@ -273,7 +239,8 @@ def main(input_path, subtitles_path, script_path, output_dir, padding_before, pa
                 print(f"Subtitle file or script file not found: {subtitles_file} or {script_file}")
                 continue
             print(f"\nProcessing {video_file.name}")
-            process_episode(video_file, subtitles_file, script_file, output_dir, padding_before, padding_after, force)
+            process_episode(video_file, subtitles_file, script_file, output_dir, padding_before, padding_after, force,
+                            **episode_options)
     
     else:
         print(f"Input path does not exist: {input_path}")
@@ -290,7 +257,15 @@ if __name__ == '__main__':
                        help='Padding in seconds to add after each clip (default: 0.1)')
     parser.add_argument('--force', action='store_true',
                        help='Force replace existing episodes in database')
+    parser.add_argument('--alignments_dir', default=DEFAULT_ALIGNMENTS_DIR,
+                       help='Directory of stored per-episode alignments')
+    parser.add_argument('--engine', default='banded', choices=ENGINES, help='Dialog matcher engine')
+    parser.add_argument('--rematch', action='store_true',
+                       help='Match dialog again even when a stored alignment exists')
+    parser.add_argument('--reembed', action='store_true',
+                       help='Re-embed from the stored alignment and existing clips without cutting clips')
     args = parser.parse_args()
 
     main(args.input_path, args.subtitles_path, args.script_path, args.output_dir, 
-         args.padding_before, args.padding_after, args.force)
+         args.padding_before, args.padding_after, args.force,
+         args.alignments_dir, args.engine, args.rematch, args.reembed)
@@ -0,0 +1,106 @@
+from dataclasses import dataclass
+from typing import List, Tuple, Optional, Callable, Sequence, Iterator
+from rapidfuzz import fuzz, process
+import numpy as np
+import pysrt
+
+# Same acceptance rules as DialogMatcher's exhaustive search
+MATCH_THRESHOLD = 0.61
+MAX_GROUP_SIZE = 8
+MAX_GAP_MS = 2500
+
+CleanedSubtitle = Tuple[pysrt.SubRipItem, str, bool]
+
+@dataclass
+class SubtitleGroups:
+    """Every valid run of consecutive cleaned subtitles, flattened in (start, end) order"""
+    starts: np.ndarray
+    ends: np.ndarray  # Inclusive
+    texts: List[str]
+    offsets: np.ndarray  # Groups starting at subtitle s are offsets[s]:offsets[s + 1]
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def span(self, lo: int, hi: int) -> Tuple[int, int]:
+        """Group index range of the groups starting at subtitles [lo, hi)"""
+        return int(self.offsets[lo]), int(self.offsets[hi])
+
+def build_subtitle_groups(
+    cleaned_subtitles: Sequence[CleanedSubtitle],
+    clean_text: Optional[Callable[[str], str]] = None,
+    max_group_size: int = MAX_GROUP_SIZE,
+    max_gap_ms: int = MAX_GAP_MS
+) -> SubtitleGroups:
+    """Comparable text of every valid group, built once per episode.
+
+    Groups follow the exhaustive matcher's rules: at most max_group_size subtitles with
+    no gap above max_gap_ms, ellipsis continuations joined, and nothing that contains a
+    multi-speaker line or a mid-text " - " speaker change. With clean_text the group
+    text is normalized the same way as the script side of the comparison.
+    """
+    starts: List[int] = []
+    ends: List[int] = []
+    texts: List[str] = []
+    offsets = [0]
+    for start in range(len(cleaned_subtitles)):
+        combined = ""
+        raw_parts: List[str] = []
+        last_end = None
+        for end in range(start, min(start + max_group_size, len(cleaned_subtitles))):
+            sub, cleaned, is_multi = cleaned_subtitles[end]
+            if is_multi or (last_end is not None and sub.start.ordinal - last_end.ordinal > max_gap_ms):
+                break
+            if not combined:
+                combined = cleaned
+            elif combined.endswith('...') and not cleaned.startswith('...'):
+                combined = combined.rstrip('.') + ' ' + cleaned
+            else:
+                combined += ' ' + cleaned
+            raw_parts.append(sub.text)
+            last_end = sub.end
+            if ' - ' not in ' '.join(raw_parts):
+                starts.append(start)
+                ends.append(end)
+                texts.append(clean_text(combined) if clean_text else combined)
+        offsets.append(len(texts))
+    return SubtitleGroups(
+        starts=np.array(starts, dtype=np.int64),
+        ends=np.array(ends, dtype=np.int64),
+        texts=texts,
+        offsets=np.array(offsets, dtype=np.int64)
+    )
+
+def score_groups(
+    queries: Sequence[str],
+    groups: SubtitleGroups,
+    workers: int = -1,
+    chunk_size: int = 256
+) -> Iterator[Tuple[int, np.ndarray]]:
+    """Yield (first query index, fuzz.ratio score block) for chunks of queries.
+
+    Scoring runs in rapidfuzz's C++ cdist across all cores; chunking keeps the score
+    matrix at chunk_size x len(groups) however long the episode is.
+    """
+    for i in range(0, len(queries), chunk_size):
+        yield i, process.cdist(
+            queries[i:i + chunk_size], groups.texts,
+            scorer=fuzz.ratio, dtype=np.float64, workers=workers
+        )
+
+def best_group(
+    scores: np.ndarray,
+    groups: SubtitleGroups,
+    threshold: float = MATCH_THRESHOLD,
+    near: Optional[int] = None
+) -> Optional[int]:
+    """Index of the highest-scoring group above threshold; ties go to the start nearest `near`"""
+    if not len(scores):
+        return None
+    best = scores.max()
+    if best <= threshold * 100:
+        return None
+    tied = np.flatnonzero(scores == best)
+    if near is None or len(tied) == 1:
+        return int(tied[0])
+    return int(tied[np.argmin(np.abs(groups.starts[tied] - near))])
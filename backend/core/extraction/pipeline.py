@@ -0,0 +1,524 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Sequence, Tuple
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import time
+import pysrt
+
+from .script_parser import ScriptParser
+from .dialog_matcher import ENGINES, DialogMatcher
+from .clip_extractor import ClipExtractor
+from .alignment_artifact import read_alignment, write_alignment
+from .extract_video_clips import build_clip_specs, collect_dialogs
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+# Files up to this size are hashed whole; larger ones (videos) by size plus head and tail
+FULL_HASH_LIMIT = 64 * 1024 * 1024
+SAMPLE_BYTES = 1024 * 1024
+VIDEO_EXTENSIONS = ('.mkv', '.mp4', '.avi')
+
+def fingerprint(path) -> str:
+    """Content hash of a file, independent of its path and mtime"""
+    path = Path(path)
+    size = path.stat().st_size
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, 'rb') as f:
+        if size <= FULL_HASH_LIMIT:
+            for block in iter(lambda: f.read(SAMPLE_BYTES), b''):
+                digest.update(block)
+        else:
+            # Reading whole episodes would dominate a fully cached run
+            digest.update(f.read(SAMPLE_BYTES))
+            f.seek(-SAMPLE_BYTES, os.SEEK_END)
+            digest.update(f.read(SAMPLE_BYTES))
+    return digest.hexdigest()
+
+def _hashable(value: Any) -> Any:
+    if isinstance(value, Path):
+        return {"file": fingerprint(value)}
+    if isinstance(value, dict):
+        return {str(k): _hashable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_hashable(v) for v in value]
+    return value
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, Path):
+        return str(value)
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+def digest_value(value: Any) -> str:
+    """Stable hash of JSON-like data; Path values hash by file content, strings by value"""
+    return hashlib.sha256(json.dumps(_hashable(value), sort_keys=True).encode()).hexdigest()
+
+@dataclass(frozen=True)
+class Episode:
+    """Inputs of one episode; without a subtitles file they are extracted from the video"""
+    code: str
+    video: Path
+    script: Path
+    subtitles: Optional[Path] = None
+
+@dataclass
+class StageContext:
+    episode: Episode
+    params: Dict[str, Any]
+    inputs: Dict[str, Dict[str, Any]]  # Outputs of the dependency stages, by stage name
+    work_dir: Path  # Cache entry directory for the stage's output files
+
+@dataclass
+class Stage:
+    """One step of the per-episode pipeline.
+
+    run returns a JSON-like outputs dict. Its cache key covers the stage name, version,
+    params, the content of the episode files named by inputs and the outputs of its
+    dependencies, so changing any of them re-runs the stage and nothing upstream of it.
+    Settings that do not change the result (tool paths, worker counts) belong in the
+    function rather than in params.
+    """
+    name: str
+    run: Callable[[StageContext], Dict[str, Any]]
+    deps: Tuple[str, ...] = ()
+    inputs: Callable[[Episode], List[Path]] = lambda episode: []
+    params: Dict[str, Any] = field(default_factory=dict)
+    version: str = "1"
+    max_concurrent: Optional[int] = None  # Cap on units of this stage running at once
+
+@dataclass
+class StageResult:
+    episode: str
+    stage: str
+    status: str  # 'ran', 'cached', 'failed' or 'blocked' (a dependency failed)
+    seconds: float = 0.0
+    error: Optional[str] = None
+    manifest: Optional[Dict[str, Any]] = None
+
+@dataclass
+class PipelineReport:
+    results: List[StageResult] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    def count(self, status: str, stage: Optional[str] = None) -> int:
+        return sum(1 for r in self.results if r.status == status and stage in (None, r.stage))
+
+    @property
+    def failures(self) -> List[StageResult]:
+        return [r for r in self.results if r.status == 'failed']
+
+    @property
+    def ok(self) -> bool:
+        return not any(r.status in ('failed', 'blocked') for r in self.results)
+
+    def summary(self) -> str:
+        lines = [
+            f"Pipeline finished in {self.wall_seconds:.1f}s: {self.count('ran')} ran, "
+            f"{self.count('cached')} cached, {self.count('failed')} failed, {self.count('blocked')} blocked"
+        ]
+        for stage in dict.fromkeys(r.stage for r in self.results):
+            seconds = sum(r.seconds for r in self.results if r.stage == stage and r.status == 'ran')
+            lines.append(
+                f"  {stage}: {self.count('ran', stage)} ran ({seconds:.1f}s), "
+                f"{self.count('cached', stage)} cached, {self.count('failed', stage)} failed, "
+                f"{self.count('blocked', stage)} blocked"
+            )
+        for r in self.failures:
+            lines.append(f"  failed {r.episode}/{r.stage}: {r.error}")
+        return '\n'.join(lines)
+
+class StageCache:
+    """Stage outputs on disk under <root>/<stage>/<episode>/<key>/.
+
+    An entry is complete once its manifest exists; the manifest is written last and
+    atomically, so an entry left behind by a crash is cleared and recomputed.
+    """
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def entry_dir(self, stage: str, episode: str, key: str) -> Path:
+        return self.root / stage / episode / key
+
+    def load(self, stage: str, episode: str, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.entry_dir(stage, episode, key) / MANIFEST_NAME) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def prepare(self, stage: str, episode: str, key: str) -> Path:
+        """Empty entry directory for a stage about to run"""
+        entry = self.entry_dir(stage, episode, key)
+        if entry.exists():
+            shutil.rmtree(entry)
+        entry.mkdir(parents=True)
+        return entry
+
+    def save(self, stage: str, episode: str, key: str, manifest: Dict[str, Any]) -> None:
+        path = self.entry_dir(stage, episode, key) / MANIFEST_NAME
+        tmp = path.with_suffix(f".tmp.{os.getpid()}")
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, path)
+
+class Pipeline:
+    """Runs every (episode, stage) unit on one worker pool, reusing cached stage outputs.
+
+    A unit is scheduled as soon as the same episode's dependencies are done, so episodes
+    move through the stages independently; deeper stages go first, so finished episodes
+    accumulate steadily. Completed units are cached, so a crashed or interrupted run
+    resumes where it stopped, and after a change only the affected stages (and those
+    downstream whose inputs actually changed) run again.
+    """
+
+    def __init__(self, stages: Sequence[Stage], cache: StageCache, workers: int = 4):
+        self.stages = self._ordered(stages)
+        self.by_name = {stage.name: stage for stage in self.stages}
+        self.depth = {}
+        for stage in self.stages:
+            self.depth[stage.name] = 1 + max((self.depth[d] for d in stage.deps), default=-1)
+        self.cache = cache
+        self.workers = workers
+
+    @staticmethod
+    def _ordered(stages: Sequence[Stage]) -> List[Stage]:
+        """Stages in dependency order"""
+        names = [stage.name for stage in stages]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate stage names: {names}")
+        for stage in stages:
+            unknown = set(stage.deps) - set(names)
+            if unknown:
+                raise ValueError(f"Stage {stage.name} depends on unknown stages: {sorted(unknown)}")
+        ordered: List[Stage] = []
+        remaining = list(stages)
+        while remaining:
+            done = {stage.name for stage in ordered}
+            ready = [stage for stage in remaining if set(stage.deps) <= done]
+            if not ready:
+                raise ValueError(f"Stage dependencies form a cycle: {[s.name for s in remaining]}")
+            ordered.extend(ready)
+            remaining = [stage for stage in remaining if stage not in ready]
+        return ordered
+
+    def stage_key(self, stage: Stage, episode: Episode, upstream: Dict[str, Dict[str, Any]]) -> str:
+        return digest_value({
+            "stage": stage.name,
+            "version": stage.version,
+            "episode": episode.code,
+            "params": stage.params,
+            "inputs": [Path(path) for path in stage.inputs(episode)],
+            "upstream": {dep: upstream[dep]["output_hash"] for dep in stage.deps}
+        })
+
+    def run_unit(
+        self,
+        episode: Episode,
+        stage: Stage,
+        upstream: Dict[str, Dict[str, Any]],
+        force: bool = False
+    ) -> StageResult:
+        """Run one stage of one episode unless its output is cached; upstream holds dependency manifests"""
+        started = time.perf_counter()
+        try:
+            key = self.stage_key(stage, episode, upstream)
+            manifest = None if force else self.cache.load(stage.name, episode.code, key)
+            if manifest is not None:
+                return StageResult(episode.code, stage.name, 'cached', manifest=manifest)
+
+            work_dir = self.cache.prepare(stage.name, episode.code, key)
+            context = StageContext(
+                episode=episode,
+                params=stage.params,
+                inputs={dep: upstream[dep]["outputs"] for dep in stage.deps},
+                work_dir=work_dir
+            )
+            outputs = stage.run(context)
+            seconds = time.perf_counter() - started
+            manifest = {
+                "stage": stage.name,
+                "episode": episode.code,
+                "key": key,
+                "outputs": _jsonable(outputs),
+                "output_hash": digest_value(outputs),
+                "seconds": seconds
+            }
+            self.cache.save(stage.name, episode.code, key, manifest)
+            logger.info(f"{episode.code}/{stage.name} done in {seconds:.1f}s")
+            return StageResult(episode.code, stage.name, 'ran', seconds=seconds, manifest=manifest)
+        except Exception as e:
+            logger.exception(f"{episode.code}/{stage.name} failed")
+            return StageResult(
+                episode.code, stage.name, 'failed',
+                seconds=time.perf_counter() - started, error=f"{type(e).__name__}: {e}"
+            )
+
+    def run(self, episodes: Sequence[Episode], force: Sequence[str] = ()) -> PipelineReport:
+        """Run all stages for all episodes; stages named in force ignore their cache"""
+        unknown = set(force) - set(self.by_name)
+        if unknown:
+            raise ValueError(f"Unknown stages: {sorted(unknown)}")
+        report = PipelineReport()
+        started = time.perf_counter()
+        manifests: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        unfinished = set()  # Failed or blocked units
+        pending = [(episode, stage) for episode in episodes for stage in self.stages]
+        # Deeper stages first, then episode order
+        order = {episode.code: i for i, episode in enumerate(episodes)}
+        pending.sort(key=lambda unit: (-self.depth[unit[1].name], order[unit[0].code]))
+        running: Dict[Any, Tuple[Episode, Stage]] = {}
+
+        def submit_ready(executor):
+            per_stage: Dict[str, int] = {}
+            for _, stage in running.values():
+                per_stage[stage.name] = per_stage.get(stage.name, 0) + 1
+            for unit in list(pending):
+                if len(running) >= self.workers:
+                    return
+                episode, stage = unit
+                deps = [(episode.code, dep) for dep in stage.deps]
+                if any(dep in unfinished for dep in deps):
+                    pending.remove(unit)
+                    unfinished.add((episode.code, stage.name))
+                    report.results.append(StageResult(episode.code, stage.name, 'blocked'))
+                    continue
+                if not all(dep in manifests for dep in deps):
+                    continue
+                if stage.max_concurrent and per_stage.get(stage.name, 0) >= stage.max_concurrent:
+                    continue
+                pending.remove(unit)
+                upstream = {dep: manifests[(episode.code, dep)] for dep in stage.deps}
+                future = executor.submit(self.run_unit, episode, stage, upstream, stage.name in force)
+                running[future] = unit
+                per_stage[stage.name] = per_stage.get(stage.name, 0) + 1
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            submit_ready(executor)
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    episode, stage = running.pop(future)
+                    result = future.result()
+                    report.results.append(result)
+                    if result.manifest is not None:
+                        manifests[(episode.code, stage.name)] = result.manifest
+                    else:
+                        unfinished.add((episode.code, stage.name))
+                # Blocked units resolve without running; keep going until nothing is left
+                while True:
+                    before = len(pending)
+                    submit_ready(executor)
+                    if running or len(pending) == before:
+                        break
+
+        report.wall_seconds = time.perf_counter() - started
+        logger.info(report.summary())
+        return report
+
+def _subtitles_stage(context: StageContext) -> Dict[str, Any]:
+    if context.episode.subtitles:
+        return {"srt": Path(context.episode.subtitles)}
+    from backend.core.utils.extract_subtitles import extract_subtitles
+    srt = extract_subtitles(context.episode.video, context.work_dir)
+    if srt is None:
+        raise RuntimeError(f"No English subtitles in {context.episode.video}")
+    return {"srt": Path(srt)}
+
+def _sync_stage(alass: Optional[str], context: StageContext) -> Dict[str, Any]:
+    srt = Path(context.inputs["subtitles"]["srt"])
+    if not context.params["sync"]:
+        return {"srt": srt}
+    output = context.work_dir / f"{context.episode.code}.srt"
+    result = subprocess.run(
+        [alass, str(context.episode.video), str(srt), str(output), '--no-split'],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"alass failed: {result.stderr.strip()[-500:]}")
+    return {"srt": output}
+
+def _match_stage(context: StageContext) -> Dict[str, Any]:
+    segments = ScriptParser().parse_script(str(context.episode.script))
+    subtitles = pysrt.open(context.inputs["sync"]["srt"])
+    matched = DialogMatcher(segments, subtitles, engine=context.params["engine"]).match_dialog()
+    path = context.work_dir / "alignment.jsonl"
+    write_alignment(path, matched, subtitles, {"episode": context.episode.code, "engine": context.params["engine"]})
+    return {"alignment": path, "segments": len(matched)}
+
+def _clips_stage(clip_workers: int, context: StageContext) -> Dict[str, Any]:
+    subtitles = pysrt.open(context.inputs["sync"]["srt"])
+    _, matched = read_alignment(context.inputs["match"]["alignment"], subtitles)
+    code = context.episode.code
+    season, episode = (int(n) for n in re.match(r'S(\d+)E(\d+)', code).groups())
+    episode_dir = Path(context.params["output_dir"]) / code
+    episode_dir.mkdir(parents=True, exist_ok=True)
+
+    clips = build_clip_specs(
+        matched, episode_dir, code, context.params["padding_before"], context.params["padding_after"]
+    )
+    extraction = ClipExtractor(workers=clip_workers).extract(str(context.episode.video), clips)
+    if extraction.failed_ids and not extraction.extracted:
+        raise RuntimeError(f"No clips extracted: {extraction.summary()}")
+    # Clip files are not hashed: the dialogs list pins their paths and source ranges
+    path = context.work_dir / "dialogs.json"
+    with open(path, 'w') as f:
+        json.dump(collect_dialogs(matched, clips, extraction.failed_ids, season, episode), f)
+    return {"dialogs": path, "failed_ids": extraction.failed_ids, "summary": extraction.summary()}
+
+def _store_stage(storage_factory: Callable[[], Any], context: StageContext) -> Dict[str, Any]:
+    with open(context.inputs["clips"]["dialogs"]) as f:
+        dialogs = [tuple(dialog) for dialog in json.load(f)]
+    report = storage_factory().add_dialogs(dialogs)
+    if not report.ok:
+        # Not cached, so the next run retries; unchanged vectors are skipped then
+        raise RuntimeError(
+            f"{len(report.failed_ids)} clips failed to store, {len(report.verify_missing)} failed to verify"
+        )
+    return {"stored": report.upserted, "unchanged": report.unchanged}
+
+def episode_stages(
+    output_dir,
+    alass: Optional[str] = 'alass',
+    engine: str = 'banded',
+    padding_before: float = 0.1,
+    padding_after: float = 0.1,
+    storage_factory: Optional[Callable[[], Any]] = None,
+    clip_workers: int = 2,
+    max_concurrent_clips: Optional[int] = 2
+) -> List[Stage]:
+    """Standard extraction stages: subtitles, sync (alass), match, clips and, with a
+    storage factory, store. Without alass the subtitles are used unsynced."""
+    stages = [
+        Stage(
+            name="subtitles",
+            run=_subtitles_stage,
+            inputs=lambda e: [e.subtitles] if e.subtitles else [e.video]
+        ),
+        Stage(
+            name="sync",
+            run=partial(_sync_stage, alass),
+            deps=("subtitles",),
+            inputs=lambda e: [e.video] if alass else [],
+            params={"sync": bool(alass)}
+        ),
+        Stage(
+            name="match",
+            run=_match_stage,
+            deps=("sync",),
+            inputs=lambda e: [e.script],
+            params={"engine": engine}
+        ),
+        Stage(
+            name="clips",
+            run=partial(_clips_stage, clip_workers),
+            deps=("sync", "match"),
+            inputs=lambda e: [e.video],
+            params={
+                "output_dir": str(Path(output_dir).resolve()),
+                "padding_before": padding_before,
+                "padding_after": padding_after
+            },
+            max_concurrent=max_concurrent_clips
+        )
+    ]
+    if storage_factory is not None:
+        stages.append(Stage(name="store", run=partial(_store_stage, storage_factory), deps=("clips",)))
+    return stages
+
+def discover_episodes(video_dir, scripts_dir, subtitles_dir=None) -> List[Episode]:
+    """Episodes with a video and a script; subtitles are used when present"""
+    episodes = []
+    for video in sorted(p for p in Path(video_dir).iterdir() if p.suffix in VIDEO_EXTENSIONS):
+        match = re.search(r'S\d+E\d+', video.stem)
+        if not match:
+            logger.warning(f"Could not extract season/episode from filename: {video.name}")
+            continue
+        code = match.group(0)
+        script = Path(scripts_dir) / f"{code}.txt"
+        if not script.exists():
+            logger.warning(f"Script file not found: {script}")
+            continue
+        subtitles = Path(subtitles_dir) / f"{code}.srt" if subtitles_dir else None
+        episodes.append(Episode(
+            code=code,
+            video=video,
+            script=script,
+            subtitles=subtitles if subtitles and subtitles.exists() else None
+        ))
+    return episodes
+
+def default_storage():
+    """Dialog storage configured as DialogSearchSystem does: the search config's storage
+    and embeddings sections plus the OpenAI key"""
+    from backend.config.settings import get_settings
+    from backend.core.storage.dialog_storage import DialogStorage
+    settings = get_settings()
+    if not settings.openai_api_key:
+        raise ValueError("OpenAI API key is not set. Please set OPENAI_API_KEY environment variable.")
+    search_config = settings.search_config or {}
+    return DialogStorage({
+        **search_config.get("storage", {}),
+        "openai_api_key": settings.openai_api_key,
+        "embeddings": search_config.get("embeddings", {})
+    })
+
+def check_default_storage():
+    """Fail before any episode runs when default_storage cannot take per-clip ingest"""
+    from backend.config.settings import get_settings
+    from backend.core.storage.dialog_storage import check_ingest_config
+    check_ingest_config((get_settings().search_config or {}).get("storage", {}))
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the cached extraction pipeline over all episodes')
+    parser.add_argument('video_dir', help='Directory containing video files')
+    parser.add_argument('scripts_dir', help='Directory containing script files')
+    parser.add_argument('output_dir', help='Directory to save extracted clips')
+    parser.add_argument('--subtitles_dir', help='Directory with subtitle files (default: extract from video)')
+    parser.add_argument('--cache_dir', default='data/pipeline_cache', help='Stage cache directory')
+    parser.add_argument('--alass', default='alass', help="Path to alass executable, or '' to skip syncing")
+    parser.add_argument('--engine', default='banded', choices=ENGINES, help='Dialog matcher engine')
+    parser.add_argument('--padding_before', type=float, default=0.1)
+    parser.add_argument('--padding_after', type=float, default=0.1)
+    parser.add_argument('--workers', type=int, default=4, help='Units run concurrently')
+    parser.add_argument('--episodes', nargs='*', help='Only these episode codes')
+    parser.add_argument('--force', nargs='*', default=[], help='Stages to re-run regardless of the cache')
+    parser.add_argument('--store', action='store_true', help='Add extracted dialogs to the vector store')
+    args = parser.parse_args()
+    if args.store:
+        try:
+            check_default_storage()
+        except ValueError as e:
+            parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO)
+    episodes = discover_episodes(args.video_dir, args.scripts_dir, args.subtitles_dir)
+    if args.episodes:
+        episodes = [e for e in episodes if e.code in set(args.episodes)]
+    stages = episode_stages(
+        args.output_dir,
+        alass=os.path.expanduser(args.alass) if args.alass else None,
+        engine=args.engine,
+        padding_before=args.padding_before,
+        padding_after=args.padding_after,
+        storage_factory=default_storage if args.store else None
+    )
+    report = Pipeline(stages, StageCache(args.cache_dir), workers=args.workers).run(episodes, force=args.force)
+    print(report.summary())
+
+if __name__ == '__main__':
+    main()
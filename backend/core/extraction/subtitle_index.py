@@ -0,0 +1,73 @@
+from collections import defaultdict
+from typing import List, Dict, Callable, Sequence, Set
+import math
+import re
+import numpy as np
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+def text_features(cleaned: str, n: int = 3) -> Set[str]:
+    """Words and character n-grams of an already cleaned (lowercase) text"""
+    words = [word.strip("'") for word in WORD_PATTERN.findall(cleaned)]
+    words = [word for word in words if word]
+    features = {f"w:{word}" for word in words}
+    joined = ' '.join(words)
+    if len(joined) <= n:
+        if joined:
+            features.add(joined)
+    else:
+        features.update(joined[i:i + n] for i in range(len(joined) - n + 1))
+    return features
+
+class SubtitleNgramIndex:
+    """Inverted index from words and character trigrams to cleaned subtitle positions.
+
+    Built once per episode. For a piece of script text it proposes the few subtitle
+    positions that share the most (rare) features with it, so fuzzy scoring only has to
+    look at groups starting there. A subtitle group can only match well when its first
+    subtitle shares text with the script, so the true start is among the proposals.
+    """
+
+    def __init__(
+        self,
+        cleaned_texts: Sequence[str],
+        clean_text: Callable[[str], str],
+        n: int = 3,
+        max_df: float = 0.25
+    ):
+        self.clean_text = clean_text
+        self.n = n
+        self.size = len(cleaned_texts)
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for position, text in enumerate(cleaned_texts):
+            for feature in text_features(clean_text(text), n):
+                postings[feature].append(position)
+        self.postings = {feature: np.array(positions) for feature, positions in postings.items()}
+        # Features in more than max_df of the subtitles barely narrow anything down
+        self.common = {
+            feature for feature, positions in postings.items()
+            if len(positions) > max(1, max_df * self.size)
+        }
+        self.idf = {
+            feature: math.log(1 + self.size / len(positions))
+            for feature, positions in postings.items()
+        }
+
+    def scores(self, text: str) -> np.ndarray:
+        """Summed idf of the features each subtitle shares with text"""
+        features = [f for f in text_features(self.clean_text(text), self.n) if f in self.postings]
+        rare = [f for f in features if f not in self.common]
+        scores = np.zeros(self.size)
+        # Texts made only of common words ("Yes, sir.") still need candidates
+        for feature in rare or features:
+            scores[self.postings[feature]] += self.idf[feature]
+        return scores
+
+    def candidates(self, text: str, limit: int = 24, near: int = 0) -> List[int]:
+        """Up to `limit` subtitle positions by overlap, ties broken by distance to `near`; ascending"""
+        scores = self.scores(text)
+        positions = np.flatnonzero(scores)
+        if len(positions) > limit:
+            order = np.lexsort((np.abs(positions - near), -scores[positions]))
+            positions = positions[order[:limit]]
+        return sorted(int(position) for position in positions)
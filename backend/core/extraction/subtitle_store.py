@@ -0,0 +1,104 @@
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import List, Dict, Any, Tuple, Sequence
+import sys
+import numpy as np
+import pysrt
+
+# Numeric arrays are laid out back to back in one shared block, each 8-byte aligned
+ALIGNMENT = 8
+
+@dataclass
+class SubtitleStore:
+    """Array-backed cleaned subtitles for matching without pysrt objects.
+
+    One row per cleaned entry (a multi-speaker subtitle contributes one row per line):
+    integer millisecond times, a multi-speaker flag, the index of the original subtitle
+    and its cleaned text. Raw subtitle texts are kept per original subtitle for the
+    " - " check and for the matched subtitle text.
+    """
+    start_ms: np.ndarray
+    end_ms: np.ndarray
+    is_multi: np.ndarray
+    sub_index: np.ndarray
+    cleaned: List[str]
+    raw: List[str]
+
+    def __len__(self) -> int:
+        return len(self.cleaned)
+
+    @classmethod
+    def from_cleaned(
+        cls,
+        cleaned_subtitles: Sequence[Tuple[pysrt.SubRipItem, str, bool]],
+        subtitles: Sequence[pysrt.SubRipItem]
+    ) -> "SubtitleStore":
+        position_of = {id(sub): i for i, sub in enumerate(subtitles)}
+        return cls(
+            start_ms=np.array([sub.start.ordinal for sub, _, _ in cleaned_subtitles], dtype=np.int64),
+            end_ms=np.array([sub.end.ordinal for sub, _, _ in cleaned_subtitles], dtype=np.int64),
+            is_multi=np.array([is_multi for _, _, is_multi in cleaned_subtitles], dtype=bool),
+            sub_index=np.array([position_of[id(sub)] for sub, _, _ in cleaned_subtitles], dtype=np.int64),
+            cleaned=[cleaned for _, cleaned, _ in cleaned_subtitles],
+            raw=[sub.text for sub in subtitles]
+        )
+
+    def group_text(self, indices: Sequence[int]) -> str:
+        """Raw subtitle text of a group of cleaned entries, as joined for match output"""
+        return ' '.join(self.raw[self.sub_index[k]] for k in indices)
+
+    def to_shared(self) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+        """Copy the store into one shared memory block.
+
+        Returns the block (the caller closes and unlinks it) and a small picklable
+        descriptor that workers pass to attach().
+        """
+        arrays = {
+            "start_ms": self.start_ms.astype(np.int64),
+            "end_ms": self.end_ms.astype(np.int64),
+            "sub_index": self.sub_index.astype(np.int64),
+            "is_multi": self.is_multi.astype(np.uint8),
+        }
+        for name, texts in (("cleaned", self.cleaned), ("raw", self.raw)):
+            encoded = [text.encode('utf-8') for text in texts]
+            arrays[f"{name}_offsets"] = np.concatenate(([0], np.cumsum([len(e) for e in encoded]))).astype(np.int64)
+            arrays[f"{name}_blob"] = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        layout = []
+        size = 0
+        for name, array in arrays.items():
+            layout.append((name, array.dtype.str, len(array), size))
+            size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (name, _, _, offset), array in zip(layout, arrays.values()):
+            shm.buf[offset:offset + array.nbytes] = array.tobytes()
+        return shm, {"name": shm.name, "layout": layout}
+
+    @classmethod
+    def attach(cls, descriptor: Dict[str, Any]) -> Tuple["SubtitleStore", shared_memory.SharedMemory]:
+        """Store backed by an existing shared block; keep the returned block alive while in use"""
+        # Pool workers share the creating process's resource tracker, which unlinks the
+        # block only if the creator never does
+        shm = shared_memory.SharedMemory(name=descriptor["name"])
+        arrays = {
+            name: np.ndarray((length,), dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+            for name, dtype, length, offset in descriptor["layout"]
+        }
+
+        def decode(name: str) -> List[str]:
+            offsets, blob = arrays[f"{name}_offsets"], arrays[f"{name}_blob"]
+            # Interned, so repeated lines ("Yes, sir.") share one string per worker
+            return [
+                sys.intern(blob[offsets[i]:offsets[i + 1]].tobytes().decode('utf-8'))
+                for i in range(len(offsets) - 1)
+            ]
+
+        store = cls(
+            start_ms=arrays["start_ms"],
+            end_ms=arrays["end_ms"],
+            is_multi=arrays["is_multi"].view(bool),
+            sub_index=arrays["sub_index"],
+            cleaned=decode("cleaned"),
+            raw=decode("raw")
+        )
+        return store, shm
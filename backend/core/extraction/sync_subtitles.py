@@ -1,40 +1,65 @@
 import glob
+import shutil
 import subprocess
 import os
 import argparse
 import sys
 from pathlib import Path
 
-def sync_subtitles(video_dir, subs_dir, output_dir, alass_path):
+# Add the project root to the Python path
+project_root = str(Path(__file__).resolve().parents[3])
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.core.utils.batch import TaskResult, input_signature, is_fresh, run_batch, write_stamp
+
+ALASS_ARGS = ['--no-split']
+
+def sync_episode(video_file, subtitle_file, output_file, alass_path, force=False) -> TaskResult:
+    """Sync one episode's subtitles to its audio with alass, unless the output is up to date"""
+    episode_code = Path(video_file).stem
+    output_file = Path(output_file)
+    signature = input_signature([video_file, subtitle_file], alass=' '.join(ALASS_ARGS))
+    if not force and is_fresh(output_file, signature):
+        return TaskResult(episode=episode_code, status='fresh', output=str(output_file))
+    
+    # alass writes a temporary file that replaces the output only once complete
+    partial_file = output_file.parent / f".{output_file.name}.partial.srt"
+    cmd = [alass_path, str(video_file), str(subtitle_file), str(partial_file)] + ALASS_ARGS
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        partial_file.unlink(missing_ok=True)
+        error = (result.stderr or result.stdout).strip()[-500:]
+        return TaskResult(episode=episode_code, status='failed', error=f"alass exited with {result.returncode}: {error}")
+    os.replace(partial_file, output_file)
+    write_stamp(output_file, signature)
+    return TaskResult(episode=episode_code, status='done', output=str(output_file))
+
+def sync_subtitles(video_dir, subs_dir, output_dir, alass_path, workers=None, force=False):
+    """Sync every episode's subtitles, several episodes at a time; returns a BatchReport"""
     os.makedirs(output_dir, exist_ok=True)
     
-    video_files = glob.glob(os.path.join(video_dir, "S*.mkv"))
+    video_files = sorted(glob.glob(os.path.join(video_dir, "S*.mkv")))
     
     if not video_files:
         print(f"No video files found in {video_dir}")
-        return
+        return None
     
-    for video_file in video_files:
+    if not shutil.which(alass_path):
+        print(f"Error: Could not find alass executable at {alass_path}")
+        sys.exit(1)
+    
+    def task(video_file):
         episode_code = Path(video_file).stem
         subtitle_file = os.path.join(subs_dir, f"{episode_code}.srt")
-        
-        if os.path.exists(subtitle_file):
-            output_file = os.path.join(output_dir, f"{episode_code}.srt")
-            
-            # Use the provided alass path
-            cmd = [alass_path, video_file, subtitle_file, output_file, '--no-split']
-            print(f"Processing {episode_code}...")
-            
-            try:
-                subprocess.run(cmd, check=True)
-                print(f"Successfully processed {episode_code}")
-            except subprocess.CalledProcessError as e:
-                print(f"Error processing {episode_code}: {e}")
-            except FileNotFoundError:
-                print(f"Error: Could not find alass executable at {alass_path}")
-                sys.exit(1)
-        else:
-            print(f"No subtitle file found for {episode_code}")
+        if not os.path.exists(subtitle_file):
+            return TaskResult(episode=episode_code, status='skipped', error=f"No subtitle file {subtitle_file}")
+        output_file = os.path.join(output_dir, f"{episode_code}.srt")
+        return sync_episode(video_file, subtitle_file, output_file, alass_path, force)
+    
+    report = run_batch(video_files, task, workers)
+    print(report.summary())
+    return report
 
 def main():
     parser = argparse.ArgumentParser(description='Sync subtitles with video files using alass')
@@ -43,6 +68,11 @@ def main():
     parser.add_argument('output_dir', help='Directory for synced subtitle files')
     parser.add_argument('--alass', default='alass', 
                         help='Path to alass executable (default: searches in PATH)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Episodes synced at once (default: one per core)')
+    parser.add_argument('--force', action='store_true',
+                        help='Sync again even when the output is up to date')
+    parser.add_argument('--report', help='Write a JSON report of every episode to this file')
     
     args = parser.parse_args()
     
@@ -60,7 +90,11 @@ def main():
         print(f"Error: Subtitles directory '{subs_dir}' does not exist")
         sys.exit(1)
         
-    sync_subtitles(video_dir, subs_dir, output_dir, alass_path)
+    report = sync_subtitles(video_dir, subs_dir, output_dir, alass_path, args.workers, args.force)
+    if report and args.report:
+        report.write_json(args.report)
+    if report and report.failures:
+        sys.exit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,495 @@
+from dataclasses import asdict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+import redis
+
+from .dialog_matcher import ENGINES
+from .pipeline import (
+    Episode, Pipeline, Stage, StageCache, StageResult, check_default_storage, default_storage, discover_episodes,
+    episode_stages
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+
+# All scripts take the time from Redis, so lease expiry does not depend on worker clocks
+_NOW_MS = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+"""
+
+# KEYS: ready, leases, owners, attempts; ARGV: worker, lease_ms
+_CLAIM = _NOW_MS + """
+local id = redis.call('LPOP', KEYS[1])
+if not id then return false end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[2]), id)
+redis.call('HSET', KEYS[3], id, ARGV[1])
+local attempt = redis.call('HINCRBY', KEYS[4], id, 1)
+return {id, attempt}
+"""
+
+# KEYS: leases, owners; ARGV: unit, worker, lease_ms
+_HEARTBEAT = _NOW_MS + """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[3]), ARGV[1])
+return 1
+"""
+
+# KEYS: leases, owners, results, remaining, ready; ARGV: unit, worker, result, dependents
+_COMPLETE = """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+for _, dependent in ipairs(cjson.decode(ARGV[4])) do
+    if redis.call('HINCRBY', KEYS[4], dependent, -1) <= 0 then
+        redis.call('HDEL', KEYS[4], dependent)
+        -- Front of the queue, so started episodes finish before new ones start
+        redis.call('LPUSH', KEYS[5], dependent)
+    end
+end
+return 1
+"""
+
+# A unit that failed for good never releases its dependents: record them (transitively) as
+# skipped, so they count as finished rather than waiting forever
+_SKIP_DEPENDENTS = """
+local function skip_dependents(units, remaining, results, id)
+    local pending = cjson.decode(redis.call('HGET', units, id))['dependents']
+    local skipped = cjson.encode({status = 'skipped', error = 'dependency failed'})
+    while #pending > 0 do
+        local dependent = table.remove(pending)
+        if redis.call('HEXISTS', results, dependent) == 0 then
+            redis.call('HDEL', remaining, dependent)
+            redis.call('HSET', results, dependent, skipped)
+            for _, next_dependent in ipairs(cjson.decode(redis.call('HGET', units, dependent))['dependents']) do
+                table.insert(pending, next_dependent)
+            end
+        end
+    end
+end
+"""
+
+# KEYS: leases, owners, results, attempts, ready, errors, units, remaining; ARGV: unit, worker, result, max_attempts
+# Returns 0 for a lost lease, 1 when the unit was queued for a retry, 2 when it failed for good
+_FAIL = _SKIP_DEPENDENTS + """
+if redis.call('HGET', KEYS[2], ARGV[1]) ~= ARGV[2] then return 0 end
+redis.call('ZREM', KEYS[1], ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HSET', KEYS[6], ARGV[1], ARGV[3])
+if tonumber(redis.call('HGET', KEYS[4], ARGV[1]) or '0') < tonumber(ARGV[4]) then
+    redis.call('RPUSH', KEYS[5], ARGV[1])
+    return 1
+end
+redis.call('HSET', KEYS[3], ARGV[1], ARGV[3])
+skip_dependents(KEYS[7], KEYS[8], KEYS[3], ARGV[1])
+return 2
+"""
+
+# KEYS: leases, owners, attempts, ready, results, errors, units, remaining; ARGV: max_attempts
+_REAP = _NOW_MS + _SKIP_DEPENDENTS + """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', now)
+for _, id in ipairs(expired) do
+    local owner = redis.call('HGET', KEYS[2], id) or ''
+    local result = cjson.encode({status = 'failed', error = 'lease expired', worker = owner})
+    redis.call('ZREM', KEYS[1], id)
+    redis.call('HDEL', KEYS[2], id)
+    redis.call('HSET', KEYS[6], id, result)
+    if tonumber(redis.call('HGET', KEYS[3], id) or '0') < tonumber(ARGV[1]) then
+        redis.call('RPUSH', KEYS[4], id)
+    else
+        redis.call('HSET', KEYS[5], id, result)
+        skip_dependents(KEYS[7], KEYS[8], KEYS[5], id)
+    end
+end
+return #expired
+"""
+
+def unit_id(episode_code: str, stage_name: str) -> str:
+    return f"{episode_code}/{stage_name}"
+
+def _episode_from_dict(data: Dict[str, Any]) -> Episode:
+    return Episode(
+        code=data["code"],
+        video=Path(data["video"]),
+        script=Path(data["script"]),
+        subtitles=Path(data["subtitles"]) if data.get("subtitles") else None
+    )
+
+class WorkQueue:
+    """Redis-backed queue of (episode, stage) units with leases, retries and results.
+
+    A unit is ready once every stage it depends on has completed for its episode.
+    Claiming a unit leases it to a worker; the worker renews the lease with heartbeats,
+    and a lease that expires (the worker died or hung) puts the unit back in the queue,
+    up to max_attempts claims. Completed units record their stage manifest, which is
+    what downstream units on other machines start from. Claims, completion and expiry
+    run as Lua scripts, so concurrent workers never lose or duplicate a unit.
+    """
+
+    def __init__(
+        self,
+        client: redis.Redis,
+        name: str = "extraction",
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3
+    ):
+        self.client = client
+        self.prefix = f"work_queue:{name}"
+        self.lease_ms = int(lease_seconds * 1000)
+        self.max_attempts = max_attempts
+        self._claim = client.register_script(_CLAIM)
+        self._heartbeat = client.register_script(_HEARTBEAT)
+        self._complete = client.register_script(_COMPLETE)
+        self._fail = client.register_script(_FAIL)
+        self._reap = client.register_script(_REAP)
+
+    def key(self, name: str) -> str:
+        return f"{self.prefix}:{name}"
+
+    @property
+    def _all_keys(self) -> List[str]:
+        return [
+            self.key(name) for name in
+            ("units", "remaining", "ready", "leases", "owners", "attempts", "results", "errors", "workers", "config")
+        ]
+
+    def submit(
+        self,
+        episodes: Sequence[Episode],
+        stages: Sequence[Stage],
+        config: Optional[Dict[str, Any]] = None
+    ) -> int:
+        """Replace the queue with every (episode, stage) unit; returns the number of units.
+
+        config is stored for workers, so every machine builds the same stages.
+        """
+        stages = Pipeline._ordered(stages)
+        dependents: Dict[str, List[str]] = {}
+        for stage in stages:
+            for dep in stage.deps:
+                dependents.setdefault(dep, []).append(stage.name)
+
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(*self._all_keys)
+        pipe.set(self.key("config"), json.dumps(config or {}))
+        ready = []
+        for episode in episodes:
+            episode_data = {k: str(v) if v is not None else None for k, v in asdict(episode).items()}
+            for stage in stages:
+                uid = unit_id(episode.code, stage.name)
+                pipe.hset(self.key("units"), uid, json.dumps({
+                    "episode": episode_data,
+                    "stage": stage.name,
+                    "deps": [unit_id(episode.code, dep) for dep in stage.deps],
+                    "dependents": [unit_id(episode.code, name) for name in dependents.get(stage.name, [])]
+                }))
+                if stage.deps:
+                    pipe.hset(self.key("remaining"), uid, len(stage.deps))
+                else:
+                    ready.append(uid)
+        if ready:
+            pipe.rpush(self.key("ready"), *ready)
+        pipe.execute()
+        return len(episodes) * len(stages)
+
+    def config(self) -> Dict[str, Any]:
+        return json.loads(self.client.get(self.key("config")) or '{}')
+
+    def unit(self, uid: str) -> Dict[str, Any]:
+        return json.loads(self.client.hget(self.key("units"), uid))
+
+    def claim(self, worker: str) -> Optional[Tuple[str, int]]:
+        """Lease the next ready unit; returns (unit id, attempt) or None when nothing is ready"""
+        claimed = self._claim(
+            keys=[self.key("ready"), self.key("leases"), self.key("owners"), self.key("attempts")],
+            args=[worker, self.lease_ms]
+        )
+        if not claimed:
+            return None
+        uid, attempt = claimed
+        return (uid.decode() if isinstance(uid, bytes) else uid), int(attempt)
+
+    def heartbeat(self, uid: str, worker: str) -> bool:
+        """Renew a lease; False when the worker no longer holds it"""
+        return bool(self._heartbeat(keys=[self.key("leases"), self.key("owners")], args=[uid, worker, self.lease_ms]))
+
+    def complete(self, uid: str, worker: str, result: Dict[str, Any]) -> bool:
+        """Record a finished unit and release its dependents; False when the lease was lost"""
+        return bool(self._complete(
+            keys=[self.key("leases"), self.key("owners"), self.key("results"), self.key("remaining"), self.key("ready")],
+            args=[uid, worker, json.dumps(result), json.dumps(self.unit(uid)["dependents"])]
+        ))
+
+    def fail(self, uid: str, worker: str, result: Dict[str, Any]) -> int:
+        """Record a failed attempt: 0 lease lost, 1 queued for a retry, 2 failed for good.
+
+        A unit that failed for good marks everything downstream of it skipped.
+        """
+        return int(self._fail(
+            keys=[
+                self.key("leases"), self.key("owners"), self.key("results"),
+                self.key("attempts"), self.key("ready"), self.key("errors"),
+                self.key("units"), self.key("remaining")
+            ],
+            args=[uid, worker, json.dumps(result), self.max_attempts]
+        ))
+
+    def requeue_expired(self) -> int:
+        """Return units with expired leases to the queue (or fail them); any worker may call this"""
+        return int(self._reap(
+            keys=[
+                self.key("leases"), self.key("owners"), self.key("attempts"),
+                self.key("ready"), self.key("results"), self.key("errors"),
+                self.key("units"), self.key("remaining")
+            ],
+            args=[self.max_attempts]
+        ))
+
+    def manifests(self, uids: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        """Stage manifests of completed units, by unit id"""
+        if not uids:
+            return {}
+        values = self.client.hmget(self.key("results"), list(uids))
+        return {uid: json.loads(value)["manifest"] for uid, value in zip(uids, values) if value}
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """Result manifest of the run: outcome of every finished unit"""
+        return {
+            (uid.decode() if isinstance(uid, bytes) else uid): json.loads(value)
+            for uid, value in self.client.hgetall(self.key("results")).items()
+        }
+
+    def record_worker(self, worker: str, **status: Any) -> None:
+        self.client.hset(self.key("workers"), worker, json.dumps({**status, "seen": time.time()}))
+
+    def progress(self) -> Dict[str, Any]:
+        """Central progress across all workers"""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hlen(self.key("units"))
+        pipe.llen(self.key("ready"))
+        pipe.zcard(self.key("leases"))
+        pipe.hgetall(self.key("workers"))
+        total, ready, running, workers = pipe.execute()
+        results = self.results()
+        statuses = [result["status"] for result in results.values()]
+        return {
+            "total": total,
+            "ready": ready,
+            "running": running,
+            "done": sum(1 for status in statuses if status in ('ran', 'cached')),
+            "cached": statuses.count('cached'),
+            "failed": statuses.count('failed'),
+            "skipped": statuses.count('skipped'),
+            "waiting": total - ready - running - len(statuses),
+            "workers": {
+                (name.decode() if isinstance(name, bytes) else name): json.loads(value)
+                for name, value in workers.items()
+            }
+        }
+
+    def finished(self) -> bool:
+        """Nothing is ready or running, so no unit can become ready any more"""
+        pipe = self.client.pipeline(transaction=False)
+        pipe.llen(self.key("ready"))
+        pipe.zcard(self.key("leases"))
+        ready, running = pipe.execute()
+        return ready == 0 and running == 0
+
+class ExtractionWorker:
+    """Pulls units from a WorkQueue and runs them with a Pipeline's stages.
+
+    Stage outputs go to the pipeline's StageCache and the clips output directory, which
+    must be shared storage when workers run on several machines. Several workers (and
+    processes) may share one queue.
+    """
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        pipeline: Pipeline,
+        worker_id: Optional[str] = None,
+        poll_seconds: float = 1.0
+    ):
+        self.queue = queue
+        self.pipeline = pipeline
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.poll_seconds = poll_seconds
+        self.done = 0
+        self.failed = 0
+
+    def _keep_leased(self, uid: str, stop: threading.Event, lost: threading.Event):
+        interval = self.queue.lease_ms / 3000
+        while not stop.wait(interval):
+            if not self.queue.heartbeat(uid, self.worker_id):
+                logger.warning(f"{self.worker_id} lost the lease on {uid}")
+                lost.set()
+                return
+            self.queue.record_worker(self.worker_id, unit=uid, done=self.done, failed=self.failed)
+
+    def run_one(self) -> Optional[StageResult]:
+        """Claim and run one unit; None when nothing was ready"""
+        self.queue.requeue_expired()
+        claimed = self.queue.claim(self.worker_id)
+        if claimed is None:
+            return None
+        uid, attempt = claimed
+        unit = self.queue.unit(uid)
+        episode = _episode_from_dict(unit["episode"])
+        stage = self.pipeline.by_name[unit["stage"]]
+        self.queue.record_worker(self.worker_id, unit=uid, done=self.done, failed=self.failed)
+
+        upstream_by_unit = self.queue.manifests(unit["deps"])
+        upstream = {uid_dep.split('/', 1)[1]: manifest for uid_dep, manifest in upstream_by_unit.items()}
+        stop, lost = threading.Event(), threading.Event()
+        heartbeat = threading.Thread(target=self._keep_leased, args=(uid, stop, lost), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.pipeline.run_unit(episode, stage, upstream)
+        finally:
+            stop.set()
+            heartbeat.join()
+
+        record = {
+            "status": result.status,
+            "worker": self.worker_id,
+            "attempt": attempt,
+            "seconds": result.seconds,
+            "error": result.error,
+            "manifest": result.manifest
+        }
+        if result.manifest is not None:
+            accepted = self.queue.complete(uid, self.worker_id, record)
+            self.done += accepted
+        else:
+            accepted = self.queue.fail(uid, self.worker_id, record)
+            # Retried attempts are not failures yet
+            self.failed += accepted == 2
+        if not accepted:
+            # The lease expired meanwhile and the unit went to another worker
+            logger.warning(f"Discarded result of {uid}: lease lost")
+        self.queue.record_worker(self.worker_id, unit=None, done=self.done, failed=self.failed)
+        return result
+
+    def run(self, max_units: Optional[int] = None, exit_when_finished: bool = True) -> int:
+        """Process units until the queue is finished (or max_units ran); returns units run"""
+        processed = 0
+        self.queue.record_worker(self.worker_id, unit=None, done=self.done, failed=self.failed)
+        while max_units is None or processed < max_units:
+            result = self.run_one()
+            if result is not None:
+                processed += 1
+                continue
+            if exit_when_finished and self.queue.finished():
+                break
+            time.sleep(self.poll_seconds)
+        return processed
+
+def stages_from_config(config: Dict[str, Any]) -> List[Stage]:
+    return episode_stages(
+        config["output_dir"],
+        alass=config.get("alass"),
+        engine=config.get("engine", 'banded'),
+        padding_before=config.get("padding_before", 0.1),
+        padding_after=config.get("padding_after", 0.1),
+        storage_factory=default_storage if config.get("store") else None
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Distributed extraction over a Redis work queue')
+    parser.add_argument('--redis_url', default=DEFAULT_REDIS_URL)
+    parser.add_argument('--queue', default='extraction', help='Queue name')
+    parser.add_argument('--lease_seconds', type=float, default=60.0)
+    parser.add_argument('--max_attempts', type=int, default=3)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser('submit', help='Queue every episode x stage unit')
+    submit.add_argument('video_dir')
+    submit.add_argument('scripts_dir')
+    submit.add_argument('output_dir', help='Clip directory, on storage shared by all workers')
+    submit.add_argument('--subtitles_dir')
+    submit.add_argument('--alass', default='alass', help="Path to alass on the workers, or '' to skip syncing")
+    submit.add_argument('--engine', default='banded', choices=ENGINES, help='Dialog matcher engine')
+    submit.add_argument('--padding_before', type=float, default=0.1)
+    submit.add_argument('--padding_after', type=float, default=0.1)
+    submit.add_argument('--store', action='store_true')
+
+    worker = commands.add_parser('worker', help='Run units until the queue is finished')
+    worker.add_argument('--cache_dir', default='data/pipeline_cache', help='Stage cache, on shared storage')
+    worker.add_argument('--processes', type=int, default=1, help='Worker processes on this machine')
+
+    commands.add_parser('status', help='Show progress and failures')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    client = redis.Redis.from_url(args.redis_url)
+    queue = WorkQueue(client, args.queue, args.lease_seconds, args.max_attempts)
+
+    if args.command == 'submit':
+        if args.store:
+            try:
+                check_default_storage()
+            except ValueError as e:
+                parser.error(str(e))
+        config = {
+            "output_dir": str(Path(args.output_dir).resolve()),
+            "alass": args.alass or None,
+            "engine": args.engine,
+            "padding_before": args.padding_before,
+            "padding_after": args.padding_after,
+            "store": args.store
+        }
+        episodes = discover_episodes(args.video_dir, args.scripts_dir, args.subtitles_dir)
+        count = queue.submit(episodes, stages_from_config(config), config)
+        print(f"Queued {count} units for {len(episodes)} episodes")
+    elif args.command == 'worker':
+        run_workers(args.redis_url, args.queue, args.cache_dir, args.processes, args.lease_seconds, args.max_attempts)
+        print(json.dumps({k: v for k, v in queue.progress().items() if k != 'workers'}))
+    else:
+        progress = queue.progress()
+        print(json.dumps(progress, indent=2))
+        for uid, result in sorted(queue.results().items()):
+            if result["status"] == 'failed':
+                print(f"failed {uid} (worker {result.get('worker')}): {result.get('error')}")
+            elif result["status"] == 'skipped':
+                print(f"skipped {uid}: {result.get('error')}")
+
+def _worker_process(redis_url: str, queue_name: str, cache_dir: str, lease_seconds: float, max_attempts: int):
+    queue = WorkQueue(redis.Redis.from_url(redis_url), queue_name, lease_seconds, max_attempts)
+    pipeline = Pipeline(stages_from_config(queue.config()), StageCache(cache_dir), workers=1)
+    ExtractionWorker(queue, pipeline).run()
+
+def run_workers(
+    redis_url: str,
+    queue_name: str,
+    cache_dir: str,
+    processes: int = 1,
+    lease_seconds: float = 60.0,
+    max_attempts: int = 3
+) -> None:
+    """Run worker processes on this machine until the queue is finished"""
+    workers = [
+        multiprocessing.Process(
+            target=_worker_process,
+            args=(redis_url, queue_name, cache_dir, lease_seconds, max_attempts)
+        )
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ import chromadb
 
 from ..storage.dialog_storage import DialogStorage
 from ..utils.text_utils import clean_dialog_text, split_into_sentences
+from .lexical_index import LexicalIndex, get_lexical_index, reciprocal_rank_fusion
+from .embedding_batcher import get_embedding_batcher
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -38,6 +40,35 @@ class DialogSearchSystem:
             metadata={"hnsw:space": self.config["embeddings"]["similarity_metric"]}
         )
         logger.info(f"Initialized with collection '{storage_config['collection_name']}' containing {self.collection.count()} documents")
+        
+        # Query embeddings from concurrent turns can share one embeddings.create call
+        self.embedding_batcher = None
+        batching_config = self.config["embeddings"].get("batching", {})
+        if batching_config.get("enabled", False):
+            self.embedding_batcher = get_embedding_batcher(
+                self.config["openai"]["api_key"],
+                self.config["embeddings"]["model"],
+                batching_config
+            )
+        
+        # Optional in-process BM25 index for hybrid lexical + vector retrieval
+        self.lexical_config = self.config.get("lexical", {})
+        self.lexical_index = None
+        if self.lexical_config.get("enabled", False):
+            phrase_bonus = self.lexical_config.get("phrase_bonus", 0.5)
+            metadata_store = self.storage.metadata_store
+            if metadata_store is not None:
+                # Prefer the ingest-built metadata store, which mirrors the serving index
+                self.lexical_index = get_lexical_index(
+                    (storage_config["metadata_store_path"], ""),
+                    lambda: LexicalIndex.from_dialogs(metadata_store.iter_dialogs(), phrase_bonus=phrase_bonus),
+                    version=metadata_store.version
+                )
+            else:
+                self.lexical_index = get_lexical_index(
+                    (storage_config["chroma_path"], storage_config["collection_name"]),
+                    lambda: LexicalIndex.from_collection(self.collection, phrase_bonus=phrase_bonus)
+                )
 
     def _load_config(self, config_path: str) -> Dict[str, Any]:
         """Load configuration from file"""
@@ -63,17 +94,11 @@ class DialogSearchSystem:
             else:
                 logger.warning(f"Failed to store dialog {clip_id}")
 
-    def find_similar_dialog(
-        self,
-        query: str,
-        character: str = None,
-        n_results: int = 3
-    ) -> List[Tuple[str, Dict[str, Any]]]:
-        """Find similar dialog using vector similarity search"""
-        # Clean and prepare query
-        cleaned_query = clean_dialog_text(query)
+    def _embed_query(self, cleaned_query: str) -> List[float]:
+        """Embed a query, through the shared micro-batcher when it is enabled"""
+        if self.embedding_batcher is not None:
+            return self.embedding_batcher.embed(cleaned_query)
         
-        # Get embedding for query
         openai_client = OpenAI(
             api_key=self.config["openai"]["api_key"],
             base_url="https://api.openai.com/v1",  # Explicitly set the base URL
@@ -85,7 +110,36 @@ class DialogSearchSystem:
             input=cleaned_query,
             encoding_format="float"
         )
-        query_embedding = response.data[0].embedding
+        return response.data[0].embedding
+
+    def find_similar_dialog(
+        self,
+        query: str,
+        character: str = None,
+        n_results: int = 3
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Find similar dialog using vector similarity search"""
+        # Clean and prepare query
+        cleaned_query = clean_dialog_text(query)
+        
+        lexical_matches = []
+        exact_matches = []
+        if self.lexical_index is not None:
+            # Near-verbatim quotes are answered locally without an embedding round trip
+            if self.lexical_config.get("exact_match_fast_path", True):
+                exact_matches = self.lexical_index.exact_matches(cleaned_query, character, n_results)
+                if len(exact_matches) >= n_results:
+                    logger.info(f"Exact quote match for query: '{query}' ({len(exact_matches)} lines)")
+                    return exact_matches
+            
+            lexical_matches = self.lexical_index.search(
+                cleaned_query,
+                character,
+                self.lexical_config.get("candidates", n_results)
+            )
+        
+        # Get embedding for query
+        query_embedding = self._embed_query(cleaned_query)
         
         # Query Pinecone through storage layer
         matches = self.storage.find_similar(
@@ -94,6 +148,21 @@ class DialogSearchSystem:
             character=character
         )
         
+        if lexical_matches:
+            matches = reciprocal_rank_fusion(
+                [matches, lexical_matches],
+                n_results,
+                k=self.lexical_config.get("rrf_k", 60)
+            )
+        
+        if exact_matches:
+            # Too few exact quotes to fill the response; they rank ahead of the hybrid results
+            exact_keys = {metadata.get('clip_path') or text for text, metadata in exact_matches}
+            matches = exact_matches + [
+                (text, metadata) for text, metadata in matches
+                if (metadata.get('clip_path') or text) not in exact_keys
+            ][:n_results - len(exact_matches)]
+        
         # Log only summary
         logger.info(f"Found {len(matches)} matches for query: '{query}'")
         if character:
@@ -0,0 +1,217 @@
+import asyncio
+import queue
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple
+
+from openai import OpenAI
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _PendingEmbedding:
+    text: str
+    future: Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+class BatchMetrics:
+    """Running counters for queue delay and batch size"""
+
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.batches = 0
+        self.errors = 0
+        self.max_batch_size = 0
+        self.max_queue_delay_ms = 0.0
+        self.queue_delays_ms = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+
+    def record(self, batch_size: int, queue_delays_ms: List[float]) -> None:
+        with self.lock:
+            self.requests += batch_size
+            self.batches += 1
+            self.max_batch_size = max(self.max_batch_size, batch_size)
+            self.max_queue_delay_ms = max(self.max_queue_delay_ms, max(queue_delays_ms))
+            self.batch_sizes.append(batch_size)
+            self.queue_delays_ms.extend(queue_delays_ms)
+
+    def record_error(self) -> None:
+        with self.lock:
+            self.errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            delays = sorted(self.queue_delays_ms)
+            sizes = list(self.batch_sizes)
+
+        def percentile(values: List[float], pct: float) -> float:
+            return values[min(len(values) - 1, int(len(values) * pct))] if values else 0.0
+
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "errors": self.errors,
+            "mean_batch_size": sum(sizes) / len(sizes) if sizes else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "queue_delay_p50_ms": percentile(delays, 0.50),
+            "queue_delay_p95_ms": percentile(delays, 0.95),
+            "queue_delay_max_ms": self.max_queue_delay_ms,
+        }
+
+class EmbeddingBatcher:
+    """Coalesces embedding requests from concurrent chat turns into single embeddings.create calls.
+
+    Callers block on embed() (or await embed_async()); a background thread collects
+    requests for up to max_delay_ms or until max_batch_size, sends one request with
+    all inputs and routes each embedding back to its caller's future. Requests
+    cancelled or timed out before their batch is sent are dropped from it.
+    """
+
+    def __init__(
+        self,
+        client: OpenAI,
+        model: str,
+        max_batch_size: int = 64,
+        max_delay_ms: float = 5.0,
+        timeout: float = 30.0
+    ):
+        self.client = client
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000.0
+        self.timeout = timeout  # Seconds a caller waits for its embedding
+        self.metrics = BatchMetrics()
+        self._queue: "queue.Queue[Optional[_PendingEmbedding]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """Queue a text for embedding and return a future for its vector"""
+        pending = _PendingEmbedding(text=text, future=Future())
+        self._queue.put(pending)
+        return pending.future
+
+    def embed(self, text: str, timeout: Optional[float] = None) -> List[float]:
+        future = self.submit(text)
+        try:
+            return future.result(timeout=self.timeout if timeout is None else timeout)
+        except FutureTimeoutError:
+            # Dropped from its batch if that has not been sent yet
+            future.cancel()
+            raise
+
+    async def embed_async(self, text: str) -> List[float]:
+        return await asyncio.wrap_future(self.submit(text))
+
+    def stats(self) -> Dict[str, Any]:
+        return self.metrics.snapshot()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first: _PendingEmbedding) -> Tuple[List[_PendingEmbedding], bool]:
+        """Gather requests until the batch is full or the delay window closes"""
+        batch = [first]
+        deadline = first.enqueued_at + self.max_delay
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch, stopping = self._collect(first)
+            try:
+                self._send(batch)
+            except Exception as e:
+                # Keep the thread alive for later batches; nobody is left waiting on this one
+                logger.exception(f"Embedding batcher failed on a batch of {len(batch)}: {e}")
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+
+    def _send(self, batch: List[_PendingEmbedding]) -> None:
+        # Skip requests whose callers gave up; the rest can no longer be cancelled
+        batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        sent_at = time.perf_counter()
+        # Identical texts from different turns share one input slot
+        unique_texts = list(dict.fromkeys(item.text for item in batch))
+        try:
+            response = self.client.embeddings.create(
+                model=self.model,
+                input=unique_texts,
+                encoding_format="float"
+            )
+            if len(response.data) != len(unique_texts):
+                raise ValueError(
+                    f"Embedding response has {len(response.data)} vectors for {len(unique_texts)} inputs"
+                )
+            embeddings = {text: item.embedding for text, item in zip(unique_texts, response.data)}
+            for item in batch:
+                item.future.set_result(embeddings[item.text])
+        except Exception as e:
+            logger.error(f"Error generating batched embeddings: {e}")
+            self.metrics.record_error()
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+
+        queue_delays_ms = [(sent_at - item.enqueued_at) * 1000 for item in batch]
+        self.metrics.record(len(batch), queue_delays_ms)
+        logger.debug(
+            f"Embedded batch of {len(batch)} requests ({len(unique_texts)} unique) "
+            f"in {(time.perf_counter() - sent_at) * 1000:.1f} ms, "
+            f"max queue delay {max(queue_delays_ms):.1f} ms"
+        )
+
+_batchers: Dict[str, EmbeddingBatcher] = {}
+_batchers_lock = threading.Lock()
+
+def get_embedding_batcher(api_key: str, model: str, batching_config: Dict[str, Any]) -> EmbeddingBatcher:
+    """Process-wide batcher per model, shared by every search instance in the worker"""
+    with _batchers_lock:
+        batcher = _batchers.get(model)
+        if batcher is None:
+            client = OpenAI(
+                api_key=api_key,
+                base_url="https://api.openai.com/v1",
+                timeout=60.0,
+                max_retries=3
+            )
+            batcher = EmbeddingBatcher(
+                client,
+                model,
+                max_batch_size=batching_config.get("max_batch_size", 64),
+                max_delay_ms=batching_config.get("max_delay_ms", 5.0),
+                timeout=batching_config.get("timeout_seconds", 30.0)
+            )
+            _batchers[model] = batcher
+            logger.info(f"Started embedding batcher for {model}")
+        return batcher
+
+def batcher_stats() -> Dict[str, Dict[str, Any]]:
+    """Metrics for every running batcher, keyed by model"""
+    with _batchers_lock:
+        return {model: batcher.stats() for model, batcher in _batchers.items()}
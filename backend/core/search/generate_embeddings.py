@@ -4,72 +4,94 @@ import sys
 from tqdm import tqdm
 import time
 import yaml
+import chromadb
 from chromadb.utils import embedding_functions
-from backend.core.storage.dialog_storage import DialogStorage
+from backend.core.storage.embedding_store import get_embedding_store
 from backend.core.utils.text_utils import clean_dialog_text
 
-def generate_embeddings(config_path: str):
-    """Generate embeddings for all stored dialogs using OpenAI"""
-    # Initialize storage
-    storage = DialogStorage(config_path)
-    
-    # First, get all dialogs from the existing collection
-    all_dialogs = storage.get_all_dialogs()
-    if not all_dialogs or not all_dialogs['ids']:
-        print("No dialogs found in source storage.")
-        return
-    
-    # Store the dialogs temporarily
-    temp_dialogs = {
-        'ids': all_dialogs['ids'],
-        'documents': all_dialogs['documents'],
-        'metadatas': all_dialogs['metadatas']
-    }
-    
-    # Delete existing collection
-    try:
-        storage.client.delete_collection("star_trek_dialog")
-        print("Deleted existing collection")
-    except:
-        print("No existing collection to delete")
-    
-    # Create Gemini embedding function
+def load_collection_dialogs(collection, page_size: int = 5000):
+    """Read every (id, cleaned text, metadata) from a ChromaDB collection, one page at a time"""
+    dialogs = []
+    offset = 0
+    while True:
+        page = collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        for clip_id, text, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+            if text:
+                dialogs.append((clip_id, clean_dialog_text(text), metadata or {}))
+        offset += len(page['ids'])
+    return dialogs
+
+def generate_embeddings(config_path: str, dry_run: bool = False):
+    """Re-embed stored dialogs incrementally, skipping lines whose content hash is unchanged"""
     with open(config_path) as f:
         config = yaml.safe_load(f)
+    storage_config = config['storage']
     
+    # The collection holds Gemini embeddings. The model is part of every content key,
+    # so switching the embedding model (or provider) re-embeds every line.
+    model = f"models/{config['gemini']['models']['embedding']}"
+    dimensions = int(config['gemini']['models'].get('embedding_dimensions', 768))
     embedding_function = embedding_functions.GoogleGenerativeAiEmbeddingFunction(
         api_key=config['gemini']['api_key'],
-        model_name=f"models/{config['gemini']['models']['embedding']}",
+        model_name=model,
     )
     
-    # Create new collection with Gemini embeddings
-    collection = storage.client.create_collection(
-        name=config['vector_store']['collection_name'],
-        embedding_function=embedding_function,
-        metadata={"hnsw:space": config['vector_store']['similarity_metric']}
+    client = chromadb.PersistentClient(path=storage_config['chroma_path'])
+    collection = client.get_collection(storage_config['collection_name'], embedding_function=embedding_function)
+    store = get_embedding_store(
+        storage_config.get('embedding_store_path')
+        or str(Path(storage_config['chroma_path']) / 'embedding_store.sqlite')
     )
-    print("Created new collection with Gemini embeddings")
     
-    print(f"Found {len(temp_dialogs['ids'])} dialogs. Generating Gemini embeddings...")
+    all_dialogs = load_collection_dialogs(collection)
+    if not all_dialogs:
+        print("No dialogs found in source storage.")
+        return
+    
+    # Diff the collection against what was last written to it
+    target = f"chroma:{storage_config['collection_name']}"
+    plan = store.plan(target, all_dialogs, model, dimensions)
+    print(plan.summary())
+    if dry_run:
+        for clip_id in plan.upsert_ids[:20]:
+            print(f"  would update {clip_id}")
+        if len(plan.upsert_ids) > 20:
+            print(f"  ... and {len(plan.upsert_ids) - 20} more")
+        return plan
+    
+    # Only texts never embedded under this model are sent to Gemini
+    def embed(texts):
+        return [[float(value) for value in vector] for vector in embedding_function(texts)]
+    
+    if plan.new_texts:
+        print(f"Embedding {len(plan.new_texts)} new or changed texts...")
+        store.ensure_embeddings(plan.new_texts, embed, model, dimensions)
+    
+    dialogs_by_id = {clip_id: (text, metadata) for clip_id, text, metadata in all_dialogs}
     
     # Process in batches
     batch_size = 100
     max_retries = 5
     retry_delay = 3  # seconds
     
-    for i in tqdm(range(0, len(temp_dialogs['ids']), batch_size)):
-        batch_ids = temp_dialogs['ids'][i:i + batch_size]
-        batch_texts = temp_dialogs['documents'][i:i + batch_size]
-        batch_metadatas = temp_dialogs['metadatas'][i:i + batch_size]
+    for i in tqdm(range(0, len(plan.upsert_ids), batch_size)):
+        batch_ids = plan.upsert_ids[i:i + batch_size]
+        batch_texts = [dialogs_by_id[clip_id][0] for clip_id in batch_ids]
+        batch_metadatas = [dialogs_by_id[clip_id][1] for clip_id in batch_ids]
+        vectors = store.get_many(plan.keys[clip_id] for clip_id in batch_ids)
         
-        # Add to collection with retries
+        # Write the batch with retries
         for attempt in range(max_retries):
             try:
-                collection.add(
-                    documents=[clean_dialog_text(text) for text in batch_texts],
-                    metadatas=batch_metadatas,
-                    ids=batch_ids
+                collection.upsert(
+                    ids=batch_ids,
+                    embeddings=[vectors[plan.keys[clip_id]] for clip_id in batch_ids],
+                    documents=batch_texts,
+                    metadatas=batch_metadatas
                 )
+                store.set_states(target, [(clip_id, plan.states[clip_id]) for clip_id in batch_ids])
                 break
             except Exception as e:
                 if attempt < max_retries - 1:
@@ -80,11 +102,15 @@ def generate_embeddings(config_path: str):
                     user_input = input("Continue with next batch? (y/n): ").lower()
                     if user_input != 'y':
                         print("Embedding generation stopped by user.")
-                        return
+                        return plan
+    
+    print(f"Updated {len(plan.upsert_ids)} dialogs, skipped {len(plan.unchanged_ids)} unchanged")
+    return plan
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Generate embeddings for stored dialogs.')
     parser.add_argument('--config', required=True, help='Path to config file')
+    parser.add_argument('--dry-run', action='store_true', help='Report what would be re-embedded and written without changing anything')
     args = parser.parse_args()
 
-    generate_embeddings(args.config)
+    generate_embeddings(args.config, dry_run=args.dry_run)
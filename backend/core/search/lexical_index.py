@@ -0,0 +1,196 @@
+import math
+import re
+import threading
+import logging
+from collections import Counter, defaultdict
+from typing import List, Dict, Any, Tuple, Optional, Iterable, Callable
+
+from ..utils.text_utils import clean_dialog_text
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+def normalize_for_lookup(text: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace so near-verbatim quotes compare equal"""
+    return ' '.join(tokenize(text))
+
+def tokenize(text: str) -> List[str]:
+    """Split cleaned dialog text into lowercase word tokens"""
+    return [token.strip("'") for token in TOKEN_PATTERN.findall(clean_dialog_text(text).lower()) if token.strip("'")]
+
+class LexicalIndex:
+    """In-memory BM25 index over dialog text with a phrase bonus and an exact-quote lookup"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, phrase_bonus: float = 0.5):
+        self.k1 = k1
+        self.b = b
+        self.phrase_bonus = phrase_bonus
+        self.texts: List[str] = []
+        self.metadatas: List[Dict[str, Any]] = []
+        self.normalized: List[str] = []
+        self.doc_lengths: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.exact: Dict[str, List[int]] = defaultdict(list)
+        self.idf: Dict[str, float] = {}
+        self.avg_length = 0.0
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def add(self, text: str, metadata: Dict[str, Any]) -> None:
+        """Add one dialog line; call finalize() once all lines are added"""
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        doc_id = len(self.texts)
+        self.texts.append(clean_dialog_text(text))
+        self.metadatas.append(metadata)
+        normalized = ' '.join(tokens)
+        self.normalized.append(normalized)
+        self.doc_lengths.append(len(tokens))
+        self.exact[normalized].append(doc_id)
+        for term, freq in Counter(tokens).items():
+            self.postings[term].append((doc_id, freq))
+
+    def finalize(self) -> "LexicalIndex":
+        """Compute IDF weights and average document length"""
+        total = len(self.texts)
+        self.avg_length = sum(self.doc_lengths) / total if total else 0.0
+        self.idf = {
+            term: math.log(1 + (total - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+        return self
+
+    @classmethod
+    def from_dialogs(cls, dialogs: Iterable[Tuple[str, Dict[str, Any]]], **kwargs) -> "LexicalIndex":
+        index = cls(**kwargs)
+        for text, metadata in dialogs:
+            index.add(text, metadata)
+        return index.finalize()
+
+    @classmethod
+    def from_collection(cls, collection, page_size: int = 5000, **kwargs) -> "LexicalIndex":
+        """Build the index from the documents stored in a ChromaDB collection"""
+        index = cls(**kwargs)
+        offset = 0
+        while True:
+            page = collection.get(include=['documents', 'metadatas'], limit=page_size, offset=offset)
+            if not page['ids']:
+                break
+            for text, metadata in zip(page['documents'], page['metadatas']):
+                if text:
+                    index.add(text, metadata or {})
+            offset += len(page['ids'])
+        return index.finalize()
+
+    def _speaker_matches(self, doc_id: int, character: Optional[str]) -> bool:
+        return not character or self.metadatas[doc_id].get('speaker') == character
+
+    def _result(self, doc_id: int, **scores: float) -> Tuple[str, Dict[str, Any]]:
+        return self.texts[doc_id], {**self.metadatas[doc_id], **scores}
+
+    def exact_matches(
+        self,
+        query: str,
+        character: Optional[str] = None,
+        n_results: int = 3
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Dialog lines whose normalized text equals the query.
+
+        A verbatim quote embeds to the query's own vector, so these carry a match_ratio of 1.0.
+        """
+        doc_ids = self.exact.get(normalize_for_lookup(query), [])
+        return [
+            self._result(doc_id, match_ratio=1.0, lexical_score=1.0)
+            for doc_id in doc_ids
+            if self._speaker_matches(doc_id, character)
+        ][:n_results]
+
+    def search(
+        self,
+        query: str,
+        character: Optional[str] = None,
+        n_results: int = 3
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Rank dialog lines by BM25, boosting lines that contain the query as a phrase.
+
+        Scores go in lexical_score, relative to the best line (1.0). They are not cosine
+        similarities, so match_ratio is left to the vector search.
+        """
+        terms = tokenize(query)
+        if not terms or not self.texts:
+            return []
+
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(terms):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, freq in self.postings[term]:
+                length_norm = 1 - self.b + self.b * self.doc_lengths[doc_id] / self.avg_length
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + self.k1 * length_norm)
+
+        if len(terms) > 1:
+            phrase = f" {' '.join(terms)} "
+            for doc_id in scores:
+                if phrase in f" {self.normalized[doc_id]} ":
+                    scores[doc_id] *= 1 + self.phrase_bonus
+
+        ranked = sorted(
+            (doc_id for doc_id in scores if self._speaker_matches(doc_id, character)),
+            key=lambda doc_id: scores[doc_id],
+            reverse=True
+        )[:n_results]
+        if not ranked:
+            return []
+        top_score = scores[ranked[0]]
+        return [self._result(doc_id, lexical_score=scores[doc_id] / top_score) for doc_id in ranked]
+
+def reciprocal_rank_fusion(
+    result_lists: List[List[Tuple[str, Dict[str, Any]]]],
+    n_results: int,
+    k: int = 60
+) -> List[Tuple[str, Dict[str, Any]]]:
+    """Merge ranked (text, metadata) lists, scoring each dialog by sum(1 / (k + rank)).
+
+    The fused score goes in fused_score; each list's own scores (the vector search's
+    cosine match_ratio, the lexical_score) are kept, earlier lists winning on conflicts.
+    """
+    fused_scores: Dict[str, float] = defaultdict(float)
+    merged: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+    for results in result_lists:
+        for rank, (text, metadata) in enumerate(results):
+            key = metadata.get('clip_path') or text
+            fused_scores[key] += 1.0 / (k + rank + 1)
+            if key in merged:
+                merged_metadata = merged[key][1]
+                for name, value in metadata.items():
+                    merged_metadata.setdefault(name, value)
+            else:
+                merged[key] = (text, dict(metadata))
+    ranked = sorted(fused_scores, key=fused_scores.get, reverse=True)[:n_results]
+    return [(merged[key][0], {**merged[key][1], 'fused_score': fused_scores[key]}) for key in ranked]
+
+_index_cache: Dict[Tuple[str, str], Tuple[str, LexicalIndex]] = {}
+_index_lock = threading.Lock()
+
+def get_lexical_index(
+    cache_key: Tuple[str, str],
+    build: Callable[[], LexicalIndex],
+    version: str = ""
+) -> LexicalIndex:
+    """Build the lexical index once per process and share it between search instances.
+
+    A different version of the source (a newly installed metadata store) rebuilds it.
+    """
+    with _index_lock:
+        cached = _index_cache.get(cache_key)
+        if cached is None or cached[0] != version:
+            index = build()
+            _index_cache[cache_key] = (version, index)
+            logger.info(f"Built lexical index over {len(index)} dialog lines")
+            return index
+        return cached[1]
@@ -249,13 +249,27 @@ class LLMInterface:
                     continue
     
         all_matches = []
-        # Step 1: Find 40 matching dialogs for each response
-        for response in response_list:
-            matches = self.search_system.find_similar_dialog(
+        # A canonical index already returns one match per distinct line (with a random
+        # occurrence), so 15 results need no per-response grouping
+        canonical = self.search_system.storage.canonical
+        
+        # Step 1: Find matching dialogs for each response (15 distinct lines from a canonical
+        # index, else 40 clips to group), searching concurrently so the query embeddings can
+        # be batched together
+        def search(response: str) -> List[Tuple[str, Dict[str, Any]]]:
+            return self.search_system.find_similar_dialog(
                 query=response,
                 character=detected_character,  # Pass detected character to search system
-                n_results=40  # Get exactly 40 matches per response
+                n_results=15 if canonical else 40
             )
+        
+        with ThreadPoolExecutor(max_workers=max(1, len(response_list))) as executor:
+            response_matches = list(executor.map(search, response_list))
+        
+        for matches in response_matches:
+            if canonical:
+                all_matches.extend(matches)
+                continue
             
             # Step 2: Group matches by exact cleaned text content
             text_to_matches = {}
@@ -0,0 +1,100 @@
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import List, Dict, Any, Tuple, Optional
+
+import msgpack
+
+from ..utils.text_utils import clean_dialog_text
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 2
+
+# Common metadata fields are stored positionally so their key names never reach Redis;
+# any other metadata rides along in a trailing map
+RESULT_FIELDS = (
+    "clip_path", "start_time", "end_time", "season", "episode",
+    "speaker", "scene_info", "match_ratio"
+)
+
+CachedResults = List[Tuple[str, Dict[str, Any]]]
+
+def make_cache_key(prefix: str, query: str, character_name: Optional[str], n_results: int) -> str:
+    """Fixed-length key: a 128-bit BLAKE2b digest of the cleaned query, character and result count"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (clean_dialog_text(query), str(character_name), str(n_results)):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\x00')
+    return f"{prefix}{digest.hexdigest()}"
+
+def encode_results(results: CachedResults, soft_expiry: float) -> bytes:
+    """Serialize results with their soft expiry as a compact msgpack payload"""
+    rows = []
+    for text, metadata in results:
+        extra = {name: value for name, value in metadata.items() if name not in RESULT_FIELDS}
+        rows.append([text] + [metadata.get(name) for name in RESULT_FIELDS] + [extra or None])
+    return msgpack.packb([FORMAT_VERSION, soft_expiry, rows], use_bin_type=True)
+
+def decode_results(payload: bytes) -> Optional[Tuple[float, CachedResults]]:
+    """Inverse of encode_results; None for payloads written in another format"""
+    try:
+        version, soft_expiry, rows = msgpack.unpackb(payload, raw=False)
+    except (ValueError, TypeError, msgpack.UnpackException):
+        return None
+    if version != FORMAT_VERSION:
+        return None
+    results = []
+    for row in rows:
+        metadata = {name: value for name, value in zip(RESULT_FIELDS, row[1:]) if value is not None}
+        metadata.update(row[-1] or {})
+        results.append((row[0], metadata))
+    return soft_expiry, results
+
+class LocalResultCache:
+    """Bounded in-process LRU in front of Redis, holding already-decoded results"""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, float, CachedResults]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Tuple[float, CachedResults]]:
+        """(soft_expiry, results) for a live entry, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[2]
+
+    def put(self, key: str, soft_expiry: float, hard_expiry: float, results: CachedResults) -> None:
+        with self.lock:
+            self.entries[key] = (soft_expiry, hard_expiry, results)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+_local_caches: Dict[str, LocalResultCache] = {}
+_local_caches_lock = threading.Lock()
+
+def get_local_cache(name: str, max_entries: int) -> LocalResultCache:
+    """Process-wide local tier, shared by the per-request WebDialogSearch instances"""
+    with _local_caches_lock:
+        cache = _local_caches.get(name)
+        if cache is None:
+            cache = LocalResultCache(max_entries)
+            _local_caches[name] = cache
+        return cache
@@ -1,18 +1,26 @@
 from redis.asyncio import Redis
+from redis.client import NEVER_DECODE
 import yaml
 import json
-from typing import List, Dict, Any, Tuple, Optional
+import asyncio
+import time
+from typing import List, Dict, Any, Tuple, Optional, Set
 import os
 import logging
 from fastapi import HTTPException
 
 from .dialog_search import DialogSearchSystem
+from .result_cache import make_cache_key, encode_results, decode_results, get_local_cache
 from ..utils.text_utils import clean_dialog_text, split_into_sentences
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
+# Keys with a background refresh in flight, so a hot stale key is recomputed once
+_refreshing: Set[str] = set()
+_refresh_tasks: Set[asyncio.Task] = set()
+
 class WebDialogSearch:
     def __init__(self, config_path: str, redis: Redis):
         """Initialize web-optimized dialog search"""
@@ -21,10 +29,16 @@ class WebDialogSearch:
         self.search_system = DialogSearchSystem(config_path)
         
         # Cache settings
-        self.cache_prefix = "dialog_search:"
-        self.cache_ttl = 3600  # 1 hour
+        cache_config = self.search_system.config.get("cache", {})
+        self.cache_prefix = "dialog_search:v2:"
+        self.cache_ttl = cache_config.get("ttl", 3600)  # Fresh for 1 hour
+        self.stale_ttl = cache_config.get("stale_ttl", 600)  # Then served stale while refreshing
+        self.local_cache = get_local_cache(self.cache_prefix, cache_config.get("local_max_entries", 2048))
+        # Results fetched and cached per query, whatever the conversation has used, so every
+        # conversation shares one cache entry; used dialogs are filtered out after the read
+        self.fetch_results = cache_config.get("fetch_results", 20)
         self.batch_size = 50
-        logger.debug(f"Cache settings - TTL: {self.cache_ttl}s, Batch size: {self.batch_size}")
+        logger.debug(f"Cache settings - TTL: {self.cache_ttl}s, Stale TTL: {self.stale_ttl}s, Batch size: {self.batch_size}")
 
     async def find_similar_dialog(
         self,
@@ -43,7 +57,7 @@ class WebDialogSearch:
             logger.debug(f"Used dialogs: {len(used_dialogs) if used_dialogs else 0}")
             
             # Check rate limit if session provided
-            if session_id:
+            if session_id and self.redis is not None:
                 rate_limited = await self._check_rate_limit(session_id)
                 if not rate_limited:
                     logger.warning(f"Rate limit exceeded for session {session_id}")
@@ -53,27 +67,31 @@ class WebDialogSearch:
                     )
                 logger.debug("Rate limit check passed")
             
+            # Over-fetch so enough results remain once used dialogs are filtered out
+            used = set(used_dialogs or [])
+            fetch_n = max(self.fetch_results, n_results)
+            
             # Try cache first
-            cache_key = self._get_cache_key(query, character_name, n_results)
+            cache_key = self._get_cache_key(query, character_name, fetch_n)
             cached = await self._get_cached_results(cache_key)
             if cached:
-                logger.debug("Found cached results")
-                return cached
+                soft_expiry, matches = cached
+                if soft_expiry <= time.time():
+                    logger.debug("Serving stale cached results while refreshing")
+                    self._schedule_refresh(cache_key, query, character_name, fetch_n)
+                else:
+                    logger.debug("Found cached results")
+                return await self._unused_matches(query, character_name, matches, used, n_results)
             logger.debug("No cached results found")
             
             # Get matches from search system
-            matches = self.search_system.find_similar_dialog(
-                query=query,
-                character=character_name,
-                n_results=n_results,
-                used_dialogs=used_dialogs
-            )
+            matches = await self._search(query, character_name, fetch_n)
             
             # Cache results
             await self._cache_results(cache_key, matches)
             logger.debug(f"Cached {len(matches)} results")
             
-            return matches
+            return await self._unused_matches(query, character_name, matches, used, n_results)
             
         except HTTPException:
             raise
@@ -84,29 +102,106 @@ class WebDialogSearch:
                 detail=f"Error searching dialogs: {str(e)}"
             )
 
+    async def _search(
+        self,
+        query: str,
+        character_name: Optional[str],
+        n_results: int
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Run the blocking vector search off the event loop"""
+        return await asyncio.to_thread(
+            self.search_system.find_similar_dialog,
+            query=query,
+            character=character_name,
+            n_results=n_results
+        )
+
+    def _exclude_used(
+        self,
+        matches: List[Tuple[str, Dict[str, Any]]],
+        used: Set[str],
+        n_results: int
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Drop matches whose text or clip path was already used in this conversation"""
+        if used:
+            matches = [
+                (text, metadata) for text, metadata in matches
+                if text not in used and metadata.get('clip_path') not in used
+            ]
+        return matches[:n_results]
+
+    async def _unused_matches(
+        self,
+        query: str,
+        character_name: Optional[str],
+        matches: List[Tuple[str, Dict[str, Any]]],
+        used: Set[str],
+        n_results: int
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Filter used dialogs out of the shared results, searching deeper (uncached) when
+        a long conversation has used up the over-fetch"""
+        results = self._exclude_used(matches, used, n_results)
+        if len(results) < n_results and len(matches) >= max(self.fetch_results, n_results):
+            logger.debug("Cached results exhausted by used dialogs, searching deeper")
+            matches = await self._search(query, character_name, n_results + len(used))
+            results = self._exclude_used(matches, used, n_results)
+        return results
+
+    def _schedule_refresh(
+        self,
+        cache_key: str,
+        query: str,
+        character_name: Optional[str],
+        n_results: int
+    ) -> None:
+        """Recompute a stale entry in the background, at most once per key at a time"""
+        if cache_key in _refreshing:
+            return
+        _refreshing.add(cache_key)
+
+        async def refresh() -> None:
+            try:
+                matches = await self._search(query, character_name, n_results)
+                await self._cache_results(cache_key, matches)
+                logger.debug(f"Refreshed stale cache entry {cache_key}")
+            except Exception as e:
+                logger.error(f"Error refreshing cache entry: {str(e)}")
+            finally:
+                _refreshing.discard(cache_key)
+
+        task = asyncio.create_task(refresh())
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+
     def _get_cache_key(self, query: str, character_name: Optional[str], n_results: int) -> str:
-        """Generate cache key for query"""
-        key_parts = [
-            clean_dialog_text(query),
-            str(character_name),
-            str(n_results)
-        ]
-        key = f"dialog_search:{':'.join(key_parts)}"
+        """Generate a fixed-length cache key for query"""
+        key = make_cache_key(self.cache_prefix, query, character_name, n_results)
         logger.debug(f"Generated cache key: {key}")
         return key
 
     async def _get_cached_results(
         self,
         cache_key: str
-    ) -> Optional[List[Tuple[str, Dict[str, Any]]]]:
-        """Get cached search results"""
-        try:
-            cached = await self.redis.get(cache_key)
-            if cached:
-                results = json.loads(cached)
-                logger.debug(f"Retrieved {len(results)} cached results")
-                return results
+    ) -> Optional[Tuple[float, List[Tuple[str, Dict[str, Any]]]]]:
+        """Get cached search results and their soft expiry, local tier first"""
+        cached = self.local_cache.get(cache_key)
+        if cached:
+            return cached
+        if self.redis is None:
             return None
+        try:
+            # The shared pool decodes responses; cached payloads are binary msgpack
+            payload = await self.redis.execute_command("GET", cache_key, **{NEVER_DECODE: True})
+            if not payload:
+                return None
+            cached = decode_results(payload)
+            if cached is None:
+                return None
+            soft_expiry, results = cached
+            # Promote to the local tier for the rest of the entry's lifetime
+            self.local_cache.put(cache_key, soft_expiry, soft_expiry + self.stale_ttl, results)
+            logger.debug(f"Retrieved {len(results)} cached results")
+            return cached
         except Exception as e:
             logger.error(f"Error retrieving from cache: {str(e)}")
             return None
@@ -116,14 +211,20 @@ class WebDialogSearch:
         cache_key: str,
         results: List[Tuple[str, Dict[str, Any]]]
     ) -> None:
-        """Cache search results"""
+        """Cache search results in both tiers"""
+        soft_expiry = time.time() + self.cache_ttl
+        # Metadata may be a ClipRecord view from the metadata store
+        results = [(text, dict(metadata)) for text, metadata in results]
+        self.local_cache.put(cache_key, soft_expiry, soft_expiry + self.stale_ttl, results)
+        if self.redis is None:
+            return
         try:
             await self.redis.setex(
                 cache_key,
-                self.cache_ttl,
-                json.dumps(results)
+                self.cache_ttl + self.stale_ttl,
+                encode_results(results, soft_expiry)
             )
-            logger.debug(f"Cached {len(results)} results for {self.cache_ttl}s")
+            logger.debug(f"Cached {len(results)} results for {self.cache_ttl}s (+{self.stale_ttl}s stale)")
         except Exception as e:
             logger.error(f"Error caching results: {str(e)}")
             pass  # Fail silently on cache errors
@@ -2,10 +2,18 @@ import pinecone
 from pinecone import Pinecone
 from pathlib import Path
 from typing import Dict, Optional, List, Tuple, Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import random
+import time
 import yaml
 from openai import OpenAI
 import google.generativeai as genai
 from core.utils.text_utils import clean_dialog_text
+from core.storage.matryoshka import MatryoshkaConfig, truncate_embedding, rescore
+from core.storage.metadata_store import add_to_build_store, get_metadata_store
+from core.storage.embedding_store import SyncPlan, get_embedding_store
+from core.storage.index_registry import resolve_index_name
 import os
 import logging
 # Configure logging
@@ -16,6 +24,56 @@ from config.settings import get_settings
 
 settings = get_settings()
 
+def check_ingest_config(storage_config: Dict[str, Any]) -> None:
+    """Raise up front when per-clip ingest cannot write to the configured index"""
+    if storage_config.get("canonical_lines", False):
+        raise ValueError(
+            "storage.canonical_lines is on: the index holds one vector per distinct line, which "
+            "per-clip ingest cannot update. Add the clips to ChromaDB and re-run scripts/setup_pinecone.py"
+        )
+
+def speaker_filter_metadata(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """The speaker fields coarse vectors need for character filtering"""
+    if "speakers" in metadata:
+        return {"speakers": metadata["speakers"]}
+    return {"speaker": metadata.get("speaker", "")}
+
+@dataclass
+class IngestReport:
+    """Outcome and timings of a bulk add_dialogs call"""
+    total: int = 0
+    upserted: int = 0
+    unchanged: int = 0
+    embeddings_reused: int = 0
+    failed_ids: List[str] = field(default_factory=list)
+    embedding_requests: int = 0
+    upsert_requests: int = 0
+    verified: int = 0
+    verify_missing: List[str] = field(default_factory=list)
+    embed_seconds: float = 0.0
+    upsert_seconds: float = 0.0
+    verify_seconds: float = 0.0
+    total_seconds: float = 0.0
+
+    @property
+    def clips_per_second(self) -> float:
+        return self.upserted / self.total_seconds if self.total_seconds else 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed_ids and not self.verify_missing
+
+    def summary(self) -> str:
+        return (
+            f"Ingested {self.upserted}/{self.total} clips in {self.total_seconds:.1f}s "
+            f"({self.clips_per_second:.1f} clips/s; {self.embedding_requests} embedding and "
+            f"{self.upsert_requests} upsert requests; {self.unchanged} unchanged, "
+            f"{self.embeddings_reused} embeddings reused; embed {self.embed_seconds:.1f}s, "
+            f"upsert {self.upsert_seconds:.1f}s, verify {self.verify_seconds:.1f}s); "
+            f"verified {self.verified - len(self.verify_missing)}/{self.verified} sampled, "
+            f"{len(self.failed_ids)} failed"
+        )
+
 class DialogStorage:
     def __init__(self, config: Dict[str, Any]):
         """Initialize dialog storage with configuration"""
@@ -24,7 +82,8 @@ class DialogStorage:
         # Get Pinecone settings
         pinecone_api_key = settings.pinecone_api_key
         pinecone_env = settings.pinecone_environment
-        pinecone_index = settings.pinecone_index
+        # The configured name may be an alias for the active blue/green build
+        pinecone_index = resolve_index_name(settings.pinecone_index, settings.pinecone_index_registry)
         
         logger.debug(f"Initializing Pinecone with environment: {pinecone_env}")
         logger.debug(f"Using index: {pinecone_index}")
@@ -33,19 +92,49 @@ class DialogStorage:
         if not pinecone_api_key:
             raise ValueError("Pinecone API key is not set. Please set PINECONE_API_KEY environment variable.")
         
+        # Get embedding config
+        self.embedding_config = config.get("embeddings", {})
+        if not self.embedding_config:
+            raise ValueError("Embedding configuration is required")
+        self.matryoshka = MatryoshkaConfig.from_embedding_config(self.embedding_config)
+        
         try:
             # Initialize Pinecone with new API
             pc = Pinecone(api_key=pinecone_api_key)
             self.index = pc.Index(pinecone_index)
+            self.index_name = pinecone_index
             logger.info(f"Successfully connected to Pinecone index: {pinecone_index}")
+            
+            # Coarse index holds truncated vectors for the first retrieval stage
+            self.coarse_index = None
+            if self.matryoshka.enabled:
+                coarse_index_name = resolve_index_name(
+                    self.matryoshka.coarse_index, settings.pinecone_index_registry
+                )
+                self.coarse_index = pc.Index(coarse_index_name)
+                logger.info(
+                    f"Using coarse index {coarse_index_name} "
+                    f"({self.matryoshka.coarse_dimensions} dims) for two-stage retrieval"
+                )
         except Exception as e:
             logger.error(f"Failed to initialize Pinecone: {str(e)}")
             raise ValueError(f"Pinecone initialization failed: {str(e)}")
         
-        # Get embedding config
-        self.embedding_config = config.get("embeddings", {})
-        if not self.embedding_config:
-            raise ValueError("Embedding configuration is required")
+        # Local metadata store lets vector queries return IDs only
+        self.metadata_store = None
+        self.metadata_store_path = config.get("metadata_store_path")
+        if self.metadata_store_path:
+            self.metadata_store = get_metadata_store(self.metadata_store_path)
+        
+        # Canonical indexes hold one vector per distinct line; occurrences come from the metadata store
+        self.canonical = bool(config.get("canonical_lines", False))
+        if self.canonical and self.metadata_store is None:
+            raise ValueError("storage.canonical_lines requires a built metadata store (storage.metadata_store_path)")
+        
+        # Content-hash store lets re-ingest skip unchanged embeddings and upserts
+        self.embedding_store = None
+        if config.get("embedding_store_path"):
+            self.embedding_store = get_embedding_store(config["embedding_store_path"])
         
         # Initialize provider client (currently supporting OpenAI)
         if self.embedding_config["provider"] == "openai":
@@ -95,6 +184,7 @@ class DialogStorage:
 
     def add_dialog(self, text: str, metadata: Dict, clip_id: str) -> bool:
         """Store dialog text and metadata"""
+        check_ingest_config({"canonical_lines": self.canonical})
         try:
             cleaned_text = clean_dialog_text(text)
             # Get embedding
@@ -105,21 +195,9 @@ class DialogStorage:
             )
             embedding = response.data[0].embedding
             
-            # Ensure text is stored in metadata
-            metadata_with_text = {
-                **metadata,
-                "text": cleaned_text,  # Store the actual dialog text
-                "speaker": metadata.get("speaker", ""),  # Ensure speaker is present for filtering
-            }
-            
             # Store in Pinecone
-            self.index.upsert(
-                vectors=[{
-                    "id": clip_id,
-                    "values": embedding,
-                    "metadata": metadata_with_text
-                }]
-            )
+            self._upsert_vectors([self._build_vector(clip_id, cleaned_text, embedding, metadata)])
+            self._add_to_metadata_store([(clip_id, cleaned_text, metadata)])
             
             # Verify storage
             result = self.index.fetch([clip_id])
@@ -140,6 +218,191 @@ class DialogStorage:
             logger.error(f"Error storing dialog: {str(e)}")
             return False
 
+    def _build_vector(self, clip_id: str, cleaned_text: str, embedding: List[float], metadata: Dict) -> Dict[str, Any]:
+        """Pinecone vector record with the dialog text stored in its metadata"""
+        return {
+            "id": clip_id,
+            "values": embedding,
+            "metadata": {
+                **metadata,
+                "text": cleaned_text,  # Store the actual dialog text
+                "speaker": metadata.get("speaker", ""),  # Ensure speaker is present for filtering
+            }
+        }
+
+    def _upsert_vectors(self, vectors: List[Dict[str, Any]]) -> None:
+        """Upsert full vectors, mirroring truncated copies into the coarse index"""
+        self.index.upsert(vectors=vectors)
+        if self.coarse_index is not None:
+            self.coarse_index.upsert(vectors=[
+                {
+                    "id": vector["id"],
+                    "values": truncate_embedding(vector["values"], self.matryoshka.coarse_dimensions),
+                    "metadata": speaker_filter_metadata(vector["metadata"])
+                }
+                for vector in vectors
+            ])
+
+    def _add_to_metadata_store(self, dialogs: List[Tuple[str, str, Dict]]) -> None:
+        """Make ingested clips joinable: ID-only queries resolve them from the metadata store"""
+        if not self.metadata_store_path or not dialogs:
+            return
+        count = add_to_build_store(self.metadata_store_path, self.index_name, dialogs)
+        self.metadata_store = get_metadata_store(self.metadata_store_path)
+        logger.info(f"Added {len(dialogs)} clips to the metadata store ({count} clips)")
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        response = self.embedding_client.embeddings.create(
+            model=self.embedding_config["model"],
+            input=texts,
+            encoding_format="float"
+        )
+        return [item.embedding for item in response.data]
+
+    def add_dialogs(
+        self,
+        dialogs: List[Tuple[str, str, Dict]],
+        embed_batch_size: int = 512,
+        upsert_batch_size: int = 200,
+        max_workers: int = 4,
+        verify_sample: int = 50
+    ) -> IngestReport:
+        """Store many (clip_id, text, metadata) dialogs at once.
+
+        Texts are embedded in large batches (identical lines share one input), vectors
+        are upserted in batches with bounded concurrency, and storage is verified with
+        one batched fetch over a random sample instead of a fetch per clip. With an
+        embedding store configured, only texts never embedded before are sent to the
+        embeddings API and only new or changed vectors are upserted.
+        """
+        check_ingest_config({"canonical_lines": self.canonical})
+        report = IngestReport(total=len(dialogs))
+        started = time.perf_counter()
+        cleaned = [(clip_id, clean_dialog_text(text), metadata) for clip_id, text, metadata in dialogs]
+        
+        plan = self.plan_dialogs(dialogs) if self.embedding_store is not None else None
+        if plan is not None:
+            upsert_ids = set(plan.upsert_ids)
+            cleaned = [dialog for dialog in cleaned if dialog[0] in upsert_ids]
+            report.unchanged = len(plan.unchanged_ids)
+            logger.info(plan.summary())
+        
+        # Embed each distinct cleaned text once
+        unique_texts = list(dict.fromkeys(text for _, text, _ in cleaned))
+        embeddings: Dict[str, List[float]] = {}
+        if plan is not None:
+            keys_by_text = {text: plan.keys[clip_id] for clip_id, text, _ in cleaned}
+            stored = self.embedding_store.get_many(keys_by_text.values())
+            embeddings = {text: stored[key] for text, key in keys_by_text.items() if key in stored}
+            report.embeddings_reused = len(embeddings)
+            unique_texts = [text for text in unique_texts if text not in embeddings]
+        text_batches = [
+            unique_texts[i:i + embed_batch_size]
+            for i in range(0, len(unique_texts), embed_batch_size)
+        ]
+        
+        def embed_batch(batch: List[str]) -> Dict[str, List[float]]:
+            try:
+                batch_embeddings = dict(zip(batch, self._embed_texts(batch)))
+                if plan is not None:
+                    self.embedding_store.put_many(
+                        self.embedding_config["model"],
+                        self._dimensions(),
+                        [(keys_by_text[text], vector) for text, vector in batch_embeddings.items()]
+                    )
+                return batch_embeddings
+            except Exception as e:
+                logger.error(f"Error generating embeddings for batch of {len(batch)} texts: {str(e)}")
+                return {}
+        
+        phase_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for batch_embeddings in executor.map(embed_batch, text_batches):
+                embeddings.update(batch_embeddings)
+        report.embedding_requests = len(text_batches)
+        report.embed_seconds = time.perf_counter() - phase_started
+        
+        vectors = []
+        for clip_id, text, metadata in cleaned:
+            if text in embeddings:
+                vectors.append(self._build_vector(clip_id, text, embeddings[text], metadata))
+            else:
+                report.failed_ids.append(clip_id)
+        
+        # Upsert in batches, a bounded number in flight at once
+        vector_batches = [
+            vectors[i:i + upsert_batch_size]
+            for i in range(0, len(vectors), upsert_batch_size)
+        ]
+        
+        def upsert_batch(batch: List[Dict[str, Any]]) -> List[str]:
+            try:
+                self._upsert_vectors(batch)
+                return []
+            except Exception as e:
+                logger.error(f"Error upserting batch of {len(batch)} vectors: {str(e)}")
+                return [vector["id"] for vector in batch]
+        
+        upsert_failed: List[str] = []
+        phase_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for failed in executor.map(upsert_batch, vector_batches):
+                upsert_failed.extend(failed)
+        report.failed_ids.extend(upsert_failed)
+        report.upsert_requests = len(vector_batches)
+        report.upsert_seconds = time.perf_counter() - phase_started
+        report.upserted = len(vectors) - len(upsert_failed)
+        
+        # Verify a sample of the stored clips in a single fetch
+        failed = set(upsert_failed)
+        stored_ids = [vector["id"] for vector in vectors if vector["id"] not in failed]
+        if plan is not None:
+            self.embedding_store.set_states(
+                self.index_name,
+                [(clip_id, plan.states[clip_id]) for clip_id in stored_ids]
+            )
+        # Unchanged clips are included, in case they were stored before the metadata store existed
+        failed_ids = set(report.failed_ids)
+        self._add_to_metadata_store([
+            (clip_id, clean_dialog_text(text), metadata)
+            for clip_id, text, metadata in dialogs if clip_id not in failed_ids
+        ])
+        sample = random.sample(stored_ids, min(verify_sample, len(stored_ids)))
+        phase_started = time.perf_counter()
+        if sample:
+            try:
+                fetched = self.index.fetch(ids=sample).vectors
+            except Exception as e:
+                logger.error(f"Error verifying ingested dialogs: {str(e)}")
+                fetched = {}
+            report.verified = len(sample)
+            report.verify_missing = [
+                clip_id for clip_id in sample
+                if clip_id not in fetched or not fetched[clip_id].metadata.get('text')
+            ]
+        report.verify_seconds = time.perf_counter() - phase_started
+        report.total_seconds = time.perf_counter() - started
+        
+        logger.info(report.summary())
+        if report.verify_missing:
+            logger.error(f"Failed to verify storage of {len(report.verify_missing)} sampled clips: {report.verify_missing[:5]}")
+        return report
+
+    def _dimensions(self) -> int:
+        return int(self.embedding_config.get("dimensions", 1536))
+
+    def plan_dialogs(self, dialogs: List[Tuple[str, str, Dict]]) -> SyncPlan:
+        """Dry-run diff of (clip_id, text, metadata) dialogs against the embedding store"""
+        if self.embedding_store is None:
+            raise ValueError("Planning an ingest requires storage.embedding_store_path")
+        cleaned = [(clip_id, clean_dialog_text(text), metadata) for clip_id, text, metadata in dialogs]
+        return self.embedding_store.plan(
+            self.index_name,
+            [(clip_id, text, self._build_vector(clip_id, text, [], metadata)["metadata"]) for clip_id, text, metadata in cleaned],
+            self.embedding_config["model"],
+            self._dimensions()
+        )
+
     def get_dialog(self, clip_id: str) -> Optional[Dict]:
         """Retrieve dialog by ID"""
         try:
@@ -163,36 +426,111 @@ class DialogStorage:
         """Find similar dialogs using vector similarity search"""
         try:
             # Build filter if character specified
-            filter_dict = {"speaker": {"$eq": character}} if character else None
+            filter_dict = None
+            if character:
+                if self.canonical:
+                    filter_dict = {"speakers": {"$in": [character]}}
+                else:
+                    # Near-duplicate representatives list every speaker of their cluster
+                    filter_dict = {"$or": [
+                        {"speaker": {"$eq": character}},
+                        {"speakers": {"$in": [character]}}
+                    ]}
+            
+            if self.coarse_index is not None:
+                return self._find_similar_two_stage(query_embedding, n_results, filter_dict, character)
             
-            # Query Pinecone
+            # Query Pinecone, leaving metadata out when it can be joined locally
             results = self.index.query(
                 vector=query_embedding,
                 top_k=n_results,
                 filter=filter_dict,
-                include_metadata=True
+                include_metadata=self.metadata_store is None
             )
-            
-            # Format results
-            matches = []
-            for match in results.matches:
-                # Safely extract text and metadata
-                metadata = match.metadata if hasattr(match, 'metadata') else {}
-                text = metadata.get('text', '')
-                
-                # Remove text from metadata to match expected format
-                metadata_without_text = {k: v for k, v in metadata.items() if k != 'text'}
-                
-                # Add match score
-                metadata_without_text['match_ratio'] = match.score if hasattr(match, 'score') else 0.0
-                
-                if text:  # Only add if we have text content
-                    matches.append((text, metadata_without_text))
-                else:
-                    logger.warning(f"Skipping match due to missing text")
-            
-            logger.info(f"Found {len(matches)} valid matches from vector search")
-            return matches
+            if self.metadata_store is not None:
+                matches = self._join(
+                    [(match.id, match.score) for match in results.matches],
+                    character
+                )
+                logger.info(f"Found {len(matches)} valid matches from vector search")
+                return matches
+            return self._format_matches(results.matches)
         except Exception as e:
             logger.error(f"Error searching dialogs: {str(e)}")
             return []
+
+    def _find_similar_two_stage(
+        self,
+        query_embedding: List[float],
+        n_results: int,
+        filter_dict: Optional[Dict[str, Any]],
+        character: Optional[str] = None
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Coarse search on truncated vectors, then rescore the candidates with full vectors
+        fetched from the main index (a second round trip per query)"""
+        coarse_results = self.coarse_index.query(
+            vector=truncate_embedding(query_embedding, self.matryoshka.coarse_dimensions),
+            top_k=self.matryoshka.candidate_count(n_results),
+            filter=filter_dict,
+            include_metadata=False  # Only IDs are needed, metadata comes with the full vectors
+        )
+        candidate_ids = [match.id for match in coarse_results.matches]
+        if not candidate_ids:
+            return []
+        
+        # Fetch full-dimension vectors (and metadata) for the candidates only
+        fetched = self.index.fetch(ids=candidate_ids).vectors
+        candidates = [
+            (clip_id, fetched[clip_id].values)
+            for clip_id in candidate_ids
+            if clip_id in fetched
+        ]
+        ranked = rescore(query_embedding, candidates, n_results)
+        
+        logger.debug(f"Rescored {len(candidates)} coarse candidates down to {len(ranked)}")
+        if self.metadata_store is not None:
+            return self._join(ranked, character)
+        return self._format_matches(
+            [fetched[clip_id] for clip_id, _ in ranked],
+            scores=dict(ranked)
+        )
+
+    def _join(
+        self,
+        scored_ids: List[Tuple[str, float]],
+        character: Optional[str]
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Resolve ID-only results locally; canonical line ids and near-duplicate representatives
+        pick one of their clips per query"""
+        if self.canonical:
+            return self.metadata_store.join_lines(scored_ids, character)
+        return self.metadata_store.join(scored_ids, character)
+
+    def _format_matches(
+        self,
+        vectors: List[Any],
+        scores: Optional[Dict[str, float]] = None
+    ) -> List[Tuple[str, Dict[str, Any]]]:
+        """Convert Pinecone matches or fetched vectors into (text, metadata) tuples"""
+        matches = []
+        for match in vectors:
+            # Safely extract text and metadata
+            metadata = match.metadata if hasattr(match, 'metadata') else {}
+            text = metadata.get('text', '')
+            
+            # Remove text from metadata to match expected format
+            metadata_without_text = {k: v for k, v in metadata.items() if k != 'text'}
+            
+            # Add match score (rescored matches carry their score separately)
+            if scores is not None:
+                metadata_without_text['match_ratio'] = scores.get(match.id, 0.0)
+            else:
+                metadata_without_text['match_ratio'] = match.score if hasattr(match, 'score') else 0.0
+            
+            if text:  # Only add if we have text content
+                matches.append((text, metadata_without_text))
+            else:
+                logger.warning(f"Skipping match due to missing text")
+        
+        logger.info(f"Found {len(matches)} valid matches from vector search")
+        return matches
@@ -0,0 +1,186 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterable, Tuple, Callable
+import hashlib
+import json
+import sqlite3
+import threading
+import logging
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def content_key(model: str, dimensions: int, cleaned_text: str) -> str:
+    """Hash identifying an embedding: the same cleaned text under the same model always reuses it"""
+    return hashlib.sha256(f"{model}\x00{dimensions}\x00{cleaned_text}".encode('utf-8')).hexdigest()
+
+def state_hash(key: str, metadata: Dict[str, Any]) -> str:
+    """Hash of everything written for one vector, so unchanged vectors can skip the upsert"""
+    payload = json.dumps(metadata, sort_keys=True, default=str)
+    return hashlib.sha256(f"{key}\x00{payload}".encode('utf-8')).hexdigest()
+
+@dataclass
+class SyncPlan:
+    """Diff between the dialogs to store and what a target index already holds"""
+    target: str
+    total: int = 0
+    new_texts: List[str] = field(default_factory=list)  # Cleaned texts with no stored embedding
+    upsert_ids: List[str] = field(default_factory=list)  # New or changed vectors
+    unchanged_ids: List[str] = field(default_factory=list)
+    delete_ids: List[str] = field(default_factory=list)  # In the target but no longer in the source
+    keys: Dict[str, str] = field(default_factory=dict)  # clip_id -> content key
+    states: Dict[str, str] = field(default_factory=dict)  # clip_id -> state hash
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.upsert_ids or self.delete_ids)
+
+    def summary(self) -> str:
+        return (
+            f"{self.target}: {self.total} dialogs, {len(self.new_texts)} texts to embed, "
+            f"{len(self.upsert_ids)} vectors to upsert, {len(self.unchanged_ids)} unchanged, "
+            f"{len(self.delete_ids)} to delete"
+        )
+
+class EmbeddingStore:
+    """Persistent embeddings keyed by content hash, plus per-target records of what was upserted.
+
+    Backed by a single SQLite file so a re-run only embeds and writes what actually changed.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, dimensions INTEGER NOT NULL, vector BLOB NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS vector_state ("
+                "target TEXT NOT NULL, clip_id TEXT NOT NULL, state TEXT NOT NULL, "
+                "PRIMARY KEY (target, clip_id))"
+            )
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        """Stored embeddings for whichever of the keys are present"""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def put_many(self, model: str, dimensions: int, items: Iterable[Tuple[str, List[float]]]) -> None:
+        rows = [
+            (key, model, dimensions, np.asarray(vector, dtype=np.float32).tobytes())
+            for key, vector in items
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector) VALUES (?, ?, ?, ?)",
+                rows
+            )
+
+    def states(self, target: str) -> Dict[str, str]:
+        """clip_id -> state hash of every vector recorded as written to target"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT clip_id, state FROM vector_state WHERE target = ?", (target,)
+            ).fetchall()
+        return dict(rows)
+
+    def set_states(self, target: str, states: Iterable[Tuple[str, str]]) -> None:
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vector_state (target, clip_id, state) VALUES (?, ?, ?)",
+                [(target, clip_id, state) for clip_id, state in states]
+            )
+
+    def delete_states(self, target: str, clip_ids: Optional[Iterable[str]] = None) -> None:
+        """Forget written vectors for target; all of them when clip_ids is None"""
+        with self.lock, self.conn:
+            if clip_ids is None:
+                self.conn.execute("DELETE FROM vector_state WHERE target = ?", (target,))
+            else:
+                self.conn.executemany(
+                    "DELETE FROM vector_state WHERE target = ? AND clip_id = ?",
+                    [(target, clip_id) for clip_id in clip_ids]
+                )
+
+    def plan(
+        self,
+        target: str,
+        dialogs: List[Tuple[str, str, Dict[str, Any]]],
+        model: str,
+        dimensions: int,
+        full_sync: bool = False
+    ) -> SyncPlan:
+        """Diff (clip_id, cleaned_text, metadata) dialogs against the store.
+
+        With full_sync the dialogs are the whole corpus for the target, so recorded
+        vectors missing from them are scheduled for deletion.
+        """
+        plan = SyncPlan(target=target, total=len(dialogs))
+        text_keys: Dict[str, str] = {}
+        for clip_id, text, metadata in dialogs:
+            key = text_keys.setdefault(text, content_key(model, dimensions, text))
+            plan.keys[clip_id] = key
+            plan.states[clip_id] = state_hash(key, metadata)
+
+        stored = self.get_many(text_keys.values())
+        plan.new_texts = [text for text, key in text_keys.items() if key not in stored]
+
+        written = self.states(target)
+        for clip_id, state in plan.states.items():
+            if written.get(clip_id) == state:
+                plan.unchanged_ids.append(clip_id)
+            else:
+                plan.upsert_ids.append(clip_id)
+        if full_sync:
+            plan.delete_ids = [clip_id for clip_id in written if clip_id not in plan.states]
+        return plan
+
+    def ensure_embeddings(
+        self,
+        texts: List[str],
+        embed: Callable[[List[str]], List[List[float]]],
+        model: str,
+        dimensions: int,
+        batch_size: int = 512
+    ) -> int:
+        """Embed and store the given cleaned texts in batches; returns how many were embedded"""
+        embedded = 0
+        for i in range(0, len(texts), batch_size):
+            batch = texts[i:i + batch_size]
+            vectors = embed(batch)
+            self.put_many(model, dimensions, [
+                (content_key(model, dimensions, text), vector)
+                for text, vector in zip(batch, vectors)
+            ])
+            embedded += len(batch)
+        return embedded
+
+_stores: Dict[str, EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+def get_embedding_store(path: str) -> EmbeddingStore:
+    """Open each embedding store once per process"""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = EmbeddingStore(path)
+            logger.info(f"Opened embedding store at {path}")
+        return _stores[path]
@@ -0,0 +1,112 @@
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import json
+import os
+import tempfile
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+def versioned_index_name(alias: str, now: Optional[datetime] = None) -> str:
+    """Physical index name for a new build of alias, e.g. chattng-dialogs-v20240301120000"""
+    now = now or datetime.now(timezone.utc)
+    return f"{alias}-v{now.strftime('%Y%m%d%H%M%S')}"
+
+class IndexRegistry:
+    """JSON file mapping index aliases to versioned physical indexes.
+
+    Readers resolve an alias to its active version on every lookup, so flipping the
+    active version (one atomic file replace) switches search over without a restart.
+    Older versions stay registered until pruned, for instant rollback.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def _load(self) -> Dict[str, Any]:
+        if not self.path.exists():
+            return {}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def _save(self, data: Dict[str, Any]) -> None:
+        """Write to a temp file in the same directory, then os.replace it over the registry"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+
+    def resolve(self, alias: str) -> str:
+        """Active physical index for alias; the alias itself when it has no versions"""
+        entry = self._load().get(alias)
+        if entry and entry.get("active"):
+            return entry["active"]
+        return alias
+
+    def versions(self, alias: str) -> List[Dict[str, Any]]:
+        """Registered versions of alias, oldest first"""
+        return self._load().get(alias, {}).get("versions", [])
+
+    def register(self, alias: str, name: str, vector_count: int, **details: Any) -> None:
+        """Record a built (but not yet active) version"""
+        data = self._load()
+        entry = data.setdefault(alias, {"active": None, "versions": []})
+        entry["versions"] = [v for v in entry["versions"] if v["name"] != name]
+        entry["versions"].append({
+            "name": name,
+            "vector_count": vector_count,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            **details
+        })
+        self._save(data)
+
+    def activate(self, alias: str, name: str) -> Optional[str]:
+        """Point alias at a registered version; returns the previously active one"""
+        data = self._load()
+        entry = data.get(alias)
+        if not entry or name not in {v["name"] for v in entry["versions"]}:
+            raise ValueError(f"{name} is not a registered version of {alias}")
+        previous = entry.get("active")
+        entry["active"] = name
+        self._save(data)
+        logger.info(f"Index alias {alias} now points at {name} (was {previous})")
+        return previous
+
+    def rollback(self, alias: str) -> str:
+        """Re-activate the version registered just before the active one"""
+        names = [v["name"] for v in self.versions(alias)]
+        active = self.resolve(alias)
+        if active not in names or names.index(active) == 0:
+            raise ValueError(f"No earlier version of {alias} to roll back to")
+        target = names[names.index(active) - 1]
+        self.activate(alias, target)
+        return target
+
+    def prune(self, alias: str, keep: int) -> List[str]:
+        """Unregister all but the newest `keep` versions (never the active one); returns removed names"""
+        data = self._load()
+        entry = data.get(alias)
+        if not entry:
+            return []
+        versions = entry["versions"]
+        kept = versions[-keep:] if keep > 0 else []
+        kept_names = {v["name"] for v in kept} | {entry.get("active")}
+        removed = [v["name"] for v in versions if v["name"] not in kept_names]
+        entry["versions"] = [v for v in versions if v["name"] in kept_names]
+        self._save(data)
+        return removed
+
+def resolve_index_name(alias: str, registry_path: Optional[str]) -> str:
+    """Physical index to read for alias, honouring the registry when one is configured"""
+    if not registry_path:
+        return alias
+    return IndexRegistry(registry_path).resolve(alias)
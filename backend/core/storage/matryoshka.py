@@ -0,0 +1,86 @@
+from dataclasses import dataclass
+from typing import Dict, Any, List, Sequence, Tuple
+import numpy as np
+
+# Dimensions text-embedding-3-small can be truncated to while keeping most of its quality
+SUPPORTED_COARSE_DIMENSIONS = (256, 512, 768, 1024)
+
+@dataclass
+class MatryoshkaConfig:
+    """Settings for two-stage retrieval over truncated (Matryoshka) embeddings.
+
+    This mode trades storage for latency: the coarse index is kept in addition to the
+    full-dimension index (which still serves the rescore fetch), so vector storage grows
+    by coarse_dimensions / full_dimensions, and each query makes two round trips
+    (coarse query, then a fetch of the candidates' full vectors).
+    """
+    enabled: bool = False
+    full_dimensions: int = 1536
+    coarse_dimensions: int = 256
+    rescore_factor: int = 3
+    min_candidates: int = 50
+    coarse_index: str = ""
+
+    @classmethod
+    def from_embedding_config(cls, embedding_config: Dict[str, Any]) -> "MatryoshkaConfig":
+        """Build from the `embeddings` section of the search config"""
+        section = embedding_config.get("matryoshka", {}) or {}
+        config = cls(
+            enabled=bool(section.get("enabled", False)),
+            full_dimensions=int(embedding_config.get("dimensions", 1536)),
+            coarse_dimensions=int(section.get("coarse_dimensions", 256)),
+            rescore_factor=int(section.get("rescore_factor", 3)),
+            min_candidates=int(section.get("min_candidates", 50)),
+            coarse_index=section.get("coarse_index", ""),
+        )
+        if config.enabled:
+            if config.coarse_dimensions not in SUPPORTED_COARSE_DIMENSIONS:
+                raise ValueError(
+                    f"Unsupported coarse dimensions {config.coarse_dimensions}, "
+                    f"expected one of {SUPPORTED_COARSE_DIMENSIONS}"
+                )
+            if config.coarse_dimensions >= config.full_dimensions:
+                raise ValueError("Coarse dimensions must be smaller than the full embedding dimensions")
+            if config.rescore_factor < 1:
+                raise ValueError("embeddings.matryoshka.rescore_factor must be a positive integer")
+            if not config.coarse_index:
+                raise ValueError("embeddings.matryoshka.coarse_index is required when matryoshka is enabled")
+        return config
+
+    def candidate_count(self, n_results: int) -> int:
+        """Number of coarse candidates to rescore for a query asking for n_results"""
+        return max(n_results * self.rescore_factor, self.min_candidates, n_results)
+
+def truncate_embedding(embedding: Sequence[float], dimensions: int) -> List[float]:
+    """Truncate an embedding to its first `dimensions` values and renormalize to unit length"""
+    vector = np.asarray(embedding[:dimensions], dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    if norm > 0:
+        vector = vector / norm
+    return vector.tolist()
+
+def truncate_embeddings(embeddings: np.ndarray, dimensions: int) -> np.ndarray:
+    """Vectorized truncate-and-renormalize for a (n, d) matrix of embeddings"""
+    truncated = np.ascontiguousarray(embeddings[:, :dimensions], dtype=np.float32)
+    norms = np.linalg.norm(truncated, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return truncated / norms
+
+def rescore(
+    query_embedding: Sequence[float],
+    candidates: List[Tuple[str, Sequence[float]]],
+    n_results: int
+) -> List[Tuple[str, float]]:
+    """Rank coarse candidates by cosine similarity over the full-dimension vectors"""
+    if not candidates:
+        return []
+    query = np.asarray(query_embedding, dtype=np.float32)
+    query_norm = np.linalg.norm(query)
+    if query_norm > 0:
+        query = query / query_norm
+    matrix = np.asarray([values for _, values in candidates], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1)
+    norms[norms == 0] = 1.0
+    scores = (matrix @ query) / norms
+    order = np.argsort(-scores, kind="stable")[:n_results]
+    return [(candidates[i][0], float(scores[i])) for i in order]
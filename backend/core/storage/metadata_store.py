@@ -0,0 +1,415 @@
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import fcntl
+import hashlib
+import os
+import random
+import shutil
+import threading
+import logging
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+RECORD_KEYS = (
+    "clip_path", "start_time", "end_time", "season", "episode",
+    "speaker", "scene_info", "match_ratio"
+)
+
+def time_to_ms(value: str) -> int:
+    """Parse an SRT timestamp (HH:MM:SS,mmm) into integer milliseconds"""
+    hours, minutes, seconds = str(value).replace(',', '.').split(':')
+    return int(round((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000))
+
+def ms_to_time(ms: int) -> str:
+    """Format integer milliseconds as an SRT timestamp (HH:MM:SS,mmm)"""
+    ms = int(ms)
+    hours, ms = divmod(ms, 3600000)
+    minutes, ms = divmod(ms, 60000)
+    seconds, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d},{ms:03d}"
+
+def canonical_line_id(text: str) -> str:
+    """Stable vector id shared by every clip of one cleaned dialog line"""
+    return f"line-{hashlib.sha1(text.encode('utf-8')).hexdigest()[:20]}"
+
+def _pack_strings(values: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Pack strings into one UTF-8 buffer plus an offsets array"""
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+def _unpack_strings(buffer: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = buffer.tobytes()
+    return [data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+
+class ClipRecord(Mapping):
+    """Read-only metadata view of one clip, resolved lazily from the store's columns"""
+    __slots__ = ("_store", "index", "score")
+
+    def __init__(self, store: "MetadataStore", index: int, score: float = 0.0):
+        self._store = store
+        self.index = index
+        self.score = score
+
+    @property
+    def text(self) -> str:
+        return self._store.texts[self._store.text_idx[self.index]]
+
+    def __getitem__(self, key: str) -> Any:
+        store, i = self._store, self.index
+        if key == "clip_path":
+            return store.clip_paths[i]
+        if key == "start_time":
+            return ms_to_time(store.start_ms[i])
+        if key == "end_time":
+            return ms_to_time(store.end_ms[i])
+        if key == "season":
+            return int(store.season[i])
+        if key == "episode":
+            return int(store.episode[i])
+        if key == "speaker":
+            return store.speakers[store.speaker_idx[i]]
+        if key == "scene_info":
+            return store.scenes[store.scene_idx[i]]
+        if key == "match_ratio":
+            return self.score
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(RECORD_KEYS)
+
+    def __len__(self) -> int:
+        return len(RECORD_KEYS)
+
+    def __repr__(self) -> str:
+        return f"ClipRecord({self._store.ids[self.index]!r}, score={self.score:.4f})"
+
+class MetadataStoreBuilder:
+    """Accumulates clip metadata at ingest time and interns repeated strings"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.clip_paths: List[str] = []
+        self.columns: Dict[str, List[int]] = {
+            "season": [], "episode": [], "start_ms": [], "end_ms": [],
+            "speaker_idx": [], "scene_idx": [], "text_idx": []
+        }
+        self.tables: Dict[str, Dict[str, int]] = {"speakers": {}, "scenes": {}, "texts": {}}
+        # Representative clip id of each clip's near-duplicate cluster ("" for representatives)
+        self.duplicate_of: List[str] = []
+
+    def _intern(self, table: str, value: str) -> int:
+        interned = self.tables[table]
+        if value not in interned:
+            interned[value] = len(interned)
+        return interned[value]
+
+    def add(self, clip_id: str, text: str, metadata: Dict[str, Any]) -> None:
+        self.ids.append(clip_id)
+        self.clip_paths.append(metadata.get("clip_path", ""))
+        self.columns["season"].append(int(metadata.get("season", 0)))
+        self.columns["episode"].append(int(metadata.get("episode", 0)))
+        self.columns["start_ms"].append(time_to_ms(metadata.get("start_time", "00:00:00,000")))
+        self.columns["end_ms"].append(time_to_ms(metadata.get("end_time", "00:00:00,000")))
+        self.columns["speaker_idx"].append(self._intern("speakers", metadata.get("speaker", "") or ""))
+        self.columns["scene_idx"].append(self._intern("scenes", metadata.get("scene_info", "") or ""))
+        self.columns["text_idx"].append(self._intern("texts", text))
+        self.duplicate_of.append(metadata.get("duplicate_of", "") or "")
+
+    def build(self) -> "MetadataStore":
+        id_to_index = {clip_id: i for i, clip_id in enumerate(self.ids)}
+        # A clip whose representative is missing stands on its own
+        group_idx = [id_to_index.get(keep, i) if keep else i for i, keep in enumerate(self.duplicate_of)]
+        return MetadataStore(
+            ids=self.ids,
+            clip_paths=self.clip_paths,
+            season=np.asarray(self.columns["season"], dtype=np.uint16),
+            episode=np.asarray(self.columns["episode"], dtype=np.uint16),
+            start_ms=np.asarray(self.columns["start_ms"], dtype=np.int32),
+            end_ms=np.asarray(self.columns["end_ms"], dtype=np.int32),
+            speaker_idx=np.asarray(self.columns["speaker_idx"], dtype=np.uint16),
+            scene_idx=np.asarray(self.columns["scene_idx"], dtype=np.int32),
+            text_idx=np.asarray(self.columns["text_idx"], dtype=np.int32),
+            speakers=list(self.tables["speakers"]),
+            scenes=list(self.tables["scenes"]),
+            texts=list(self.tables["texts"]),
+            group_idx=np.asarray(group_idx, dtype=np.int32),
+        )
+
+class MetadataStore:
+    """Columnar clip metadata keyed by integer clip index, joined locally to ID-only vector results"""
+
+    def __init__(
+        self,
+        ids: List[str],
+        clip_paths: List[str],
+        season: np.ndarray,
+        episode: np.ndarray,
+        start_ms: np.ndarray,
+        end_ms: np.ndarray,
+        speaker_idx: np.ndarray,
+        scene_idx: np.ndarray,
+        text_idx: np.ndarray,
+        speakers: List[str],
+        scenes: List[str],
+        texts: List[str],
+        group_idx: Optional[np.ndarray] = None,
+        version: str = ""
+    ):
+        self.ids = ids
+        self.clip_paths = clip_paths
+        self.season = season
+        self.episode = episode
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.speaker_idx = speaker_idx
+        self.scene_idx = scene_idx
+        self.text_idx = text_idx
+        self.speakers = speakers
+        self.scenes = scenes
+        self.texts = texts
+        # Index of each clip's near-duplicate cluster representative (itself when it has none)
+        self.group_idx = group_idx if group_idx is not None else np.arange(len(ids), dtype=np.int32)
+        self.version = version  # file_version of the file it was loaded from
+        self.id_to_index = {clip_id: i for i, clip_id in enumerate(ids)}
+        # Occurrence groups are built on first use; _line_index is set last and marks them ready
+        self._occurrence_order: Optional[np.ndarray] = None
+        self._occurrence_offsets: Optional[np.ndarray] = None
+        self._group_order: Optional[np.ndarray] = None
+        self._group_offsets: Optional[np.ndarray] = None
+        self._speaker_lookup: Optional[Dict[str, int]] = None
+        self._line_index: Optional[Dict[str, int]] = None
+        self._occurrences_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def index_of(self, clip_id: str) -> Optional[int]:
+        return self.id_to_index.get(clip_id)
+
+    def record(self, index: int, score: float = 0.0) -> ClipRecord:
+        return ClipRecord(self, index, score)
+
+    def text(self, index: int) -> str:
+        return self.texts[self.text_idx[index]]
+
+    def duplicate_of(self, index: int) -> str:
+        """Clip id of the cluster representative a clip was folded into; "" if it is not a duplicate"""
+        keep = int(self.group_idx[index])
+        return self.ids[keep] if keep != index else ""
+
+    def join(
+        self,
+        scored_ids: List[Tuple[str, float]],
+        character: Optional[str] = None,
+        rng: Optional[random.Random] = None
+    ) -> List[Tuple[str, ClipRecord]]:
+        """Resolve (id, score) pairs from a vector query into (text, record) tuples.
+
+        A near-duplicate cluster representative resolves to one of its cluster's clips,
+        chosen at random per query among those spoken by the character.
+        """
+        rng = rng or random
+        joined = []
+        for clip_id, score in scored_ids:
+            index = self.id_to_index.get(clip_id)
+            if index is None:
+                logger.warning(f"Vector {clip_id} missing from metadata store")
+                continue
+            members = self.group(index)
+            if len(members) > 1:
+                if character:
+                    speaker = self._speaker_lookup.get(character, -1)
+                    members = members[self.speaker_idx[members] == speaker]
+                if len(members) == 0:
+                    continue
+                index = int(members[rng.randrange(len(members))])
+            joined.append((self.text(index), ClipRecord(self, index, score)))
+        return joined
+
+    def _build_occurrences(self) -> None:
+        """Group clip indices by text (derived from text_idx) and by near-duplicate cluster.
+
+        Built once under a lock; concurrent queries see either nothing or every group.
+        """
+        if self._line_index is not None:
+            return
+        with self._occurrences_lock:
+            if self._line_index is not None:
+                return
+            counts = np.bincount(self.text_idx, minlength=len(self.texts))
+            self._occurrence_offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._occurrence_order = np.argsort(self.text_idx, kind='stable')
+            counts = np.bincount(self.group_idx, minlength=len(self.ids))
+            self._group_offsets = np.concatenate(([0], np.cumsum(counts)))
+            self._group_order = np.argsort(self.group_idx, kind='stable')
+            self._speaker_lookup = {speaker: i for i, speaker in enumerate(self.speakers)}
+            self._line_index = {canonical_line_id(text): i for i, text in enumerate(self.texts)}
+
+    def occurrences(self, text_index: int) -> np.ndarray:
+        """Clip indices of every occurrence of one distinct line"""
+        self._build_occurrences()
+        start, end = self._occurrence_offsets[text_index], self._occurrence_offsets[text_index + 1]
+        return self._occurrence_order[start:end]
+
+    def group(self, index: int) -> np.ndarray:
+        """Clip indices of the near-duplicate cluster a representative stands for (just itself otherwise)"""
+        self._build_occurrences()
+        start, end = self._group_offsets[index], self._group_offsets[index + 1]
+        return self._group_order[start:end]
+
+    def line_index(self, line_id: str) -> Optional[int]:
+        self._build_occurrences()
+        return self._line_index.get(line_id)
+
+    def join_lines(
+        self,
+        scored_line_ids: List[Tuple[str, float]],
+        character: Optional[str] = None,
+        rng: Optional[random.Random] = None
+    ) -> List[Tuple[str, ClipRecord]]:
+        """Resolve canonical line ids to one clip occurrence each, chosen at random per query"""
+        rng = rng or random
+        joined = []
+        for line_id, score in scored_line_ids:
+            text_index = self.line_index(line_id)
+            if text_index is None:
+                logger.warning(f"Line {line_id} missing from metadata store")
+                continue
+            candidates = self.occurrences(text_index)
+            if character:
+                speaker = self._speaker_lookup.get(character, -1)
+                candidates = candidates[self.speaker_idx[candidates] == speaker]
+            if len(candidates) == 0:
+                continue
+            index = int(candidates[rng.randrange(len(candidates))])
+            joined.append((self.texts[text_index], ClipRecord(self, index, score)))
+        return joined
+
+    def iter_lines(self) -> Iterator[Tuple[str, str, List[str]]]:
+        """Every distinct line as (line id, text, sorted speakers)"""
+        for text_index, text in enumerate(self.texts):
+            speakers = {self.speakers[i] for i in self.speaker_idx[self.occurrences(text_index)]}
+            yield canonical_line_id(text), text, sorted(speakers)
+
+    def iter_dialogs(self) -> Iterator[Tuple[str, ClipRecord]]:
+        """Every stored clip as a (text, record) tuple"""
+        for index in range(len(self.ids)):
+            yield self.text(index), ClipRecord(self, index)
+
+    def save(self, path: str) -> None:
+        """Write the store as a single uncompressed .npz (no pickled objects)"""
+        arrays = {
+            "season": self.season, "episode": self.episode,
+            "start_ms": self.start_ms, "end_ms": self.end_ms,
+            "speaker_idx": self.speaker_idx, "scene_idx": self.scene_idx,
+            "text_idx": self.text_idx, "group_idx": self.group_idx,
+        }
+        for name in ("ids", "clip_paths", "speakers", "scenes", "texts"):
+            arrays[f"{name}_data"], arrays[f"{name}_offsets"] = _pack_strings(getattr(self, name))
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "MetadataStore":
+        with open(path, 'rb') as f, np.load(f, allow_pickle=False) as data:
+            # Versioned by the file actually read, even if the path is replaced meanwhile
+            version = _stat_version(os.fstat(f.fileno()))
+            strings = {
+                name: _unpack_strings(data[f"{name}_data"], data[f"{name}_offsets"])
+                for name in ("ids", "clip_paths", "speakers", "scenes", "texts")
+            }
+            return cls(
+                season=data["season"], episode=data["episode"],
+                start_ms=data["start_ms"], end_ms=data["end_ms"],
+                speaker_idx=data["speaker_idx"], scene_idx=data["scene_idx"],
+                text_idx=data["text_idx"],
+                # Stores written before near-duplicate clusters were kept have none
+                group_idx=data["group_idx"] if "group_idx" in data.files else None,
+                version=version,
+                **strings
+            )
+
+def _stat_version(st: os.stat_result) -> str:
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+def file_version(path: str) -> Optional[str]:
+    """Identity of a file's current contents (mtime and size, which every install changes); None if missing"""
+    try:
+        return _stat_version(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+def build_store_path(path: str, build: str) -> str:
+    """Where the metadata store matching one index build is kept, next to the live store"""
+    live = Path(path)
+    return str(live.with_name(f"{live.stem}.{build}{live.suffix}"))
+
+def install_build_store(path: str, build: str) -> bool:
+    """Make a build's metadata store the live one; False when that build has none.
+
+    The build's copy is kept so a rollback can install it again.
+    """
+    source = Path(build_store_path(path, build))
+    if not source.exists():
+        return False
+    live = Path(path)
+    tmp = live.with_name(f".{live.name}.{os.getpid()}")
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, live)
+    return True
+
+def add_to_build_store(path: str, build: str, dialogs: List[Tuple[str, str, Dict[str, Any]]]) -> int:
+    """Add ingested (clip_id, cleaned text, metadata) clips to a build's metadata store and
+    install it as the live one; returns the number of clips in the store.
+
+    Clips already in the store are replaced. Starts from the live store when the build has
+    no copy yet. A lock file serializes concurrent ingests (other workers, other processes).
+    """
+    live = Path(path)
+    live.parent.mkdir(parents=True, exist_ok=True)
+    with open(live.with_name(f".{live.name}.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        build_path = Path(build_store_path(path, build))
+        base = build_path if build_path.exists() else live if live.exists() else None
+        added = {clip_id for clip_id, _, _ in dialogs}
+        builder = MetadataStoreBuilder()
+        if base is not None:
+            store = MetadataStore.load(str(base))
+            for index, clip_id in enumerate(store.ids):
+                if clip_id not in added:
+                    builder.add(
+                        clip_id, store.text(index),
+                        {**store.record(index), "duplicate_of": store.duplicate_of(index)}
+                    )
+        for clip_id, text, metadata in dialogs:
+            builder.add(clip_id, text, metadata)
+        store = builder.build()
+        tmp = build_path.with_name(f".{build_path.name}.{os.getpid()}")
+        store.save(str(tmp))
+        os.replace(tmp, build_path)
+        install_build_store(path, build)
+        return len(store)
+
+_store_cache: Dict[str, MetadataStore] = {}
+_store_lock = threading.Lock()
+
+def get_metadata_store(path: str) -> Optional[MetadataStore]:
+    """Load the metadata store once per process, reloading it when a new build is installed;
+    None if it has not been built yet"""
+    with _store_lock:
+        version = file_version(path)
+        if version is None:
+            logger.warning(f"Metadata store not found at {path}, falling back to Pinecone metadata")
+            return None
+        store = _store_cache.get(path)
+        if store is None or store.version != version:
+            store = MetadataStore.load(path)
+            _store_cache[path] = store
+            logger.info(f"Loaded metadata store with {len(store)} clips from {path}")
+        return store
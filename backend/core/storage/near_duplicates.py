@@ -0,0 +1,161 @@
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+import re
+import zlib
+import numpy as np
+
+from core.utils.text_utils import clean_dialog_text
+
+# Character names as speaker labels anywhere in a line ("DATA: ...", "... RIKER: ...")
+SPEAKER_LABEL_PATTERN = re.compile(r"\b[A-Z][A-Z'.]*(?:\s[A-Z][A-Z'.]*)?\s*:")
+TOKEN_PATTERN = re.compile(r"[a-z0-9']+")
+
+HASH_SHIFT = np.uint64(32)
+
+def normalize_dialog(text: str) -> str:
+    """Cleaned, speaker-label-free, lowercase word sequence used for near-duplicate comparison"""
+    text = SPEAKER_LABEL_PATTERN.sub(' ', clean_dialog_text(text))
+    return ' '.join(token.strip("'") for token in TOKEN_PATTERN.findall(text.lower()) if token.strip("'"))
+
+def shingles(normalized: str, k: int = 4) -> List[int]:
+    """32-bit hashes of the character k-grams of a normalized line (short lines need characters, not words)"""
+    if len(normalized) <= k:
+        return [zlib.crc32(normalized.encode('utf-8'))]
+    return [zlib.crc32(normalized[i:i + k].encode('utf-8')) for i in range(len(normalized) - k + 1)]
+
+class MinHasher:
+    """MinHash signatures from a fixed family of multiply-shift hash functions"""
+
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        # (a * x + b) mod 2^64, top 32 bits; a must be odd
+        self.a = (rng.randint(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64) << np.uint64(1)) | np.uint64(1)
+        self.b = rng.randint(0, 1 << 63, size=(num_perm, 1), dtype=np.uint64)
+
+    def signature(self, hashes: Sequence[int]) -> np.ndarray:
+        return self.signatures([hashes])[0]
+
+    def signatures(self, shingle_sets: Sequence[Sequence[int]], chunk_size: int = 100_000) -> np.ndarray:
+        """(len(shingle_sets), num_perm) signatures, hashing shingles in fixed-size chunks"""
+        lengths = np.fromiter((len(hashes) for hashes in shingle_sets), dtype=np.int64, count=len(shingle_sets))
+        values = np.fromiter(
+            (value for hashes in shingle_sets for value in hashes), dtype=np.uint64, count=int(lengths.sum())
+        )
+        starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        result = np.empty((len(shingle_sets), self.num_perm), dtype=np.uint32)
+        row = 0
+        while row < len(shingle_sets):
+            # Whole rows per chunk so each segment's minimum comes from a single reduce
+            end_row = int(np.searchsorted(starts, starts[row] + chunk_size, side='right'))
+            end_row = max(end_row, row + 1)
+            lo, hi = starts[row], starts[end_row - 1] + lengths[end_row - 1]
+            # (num_perm, shingles) so every per-line minimum reduces over contiguous memory
+            permuted = (self.a * values[None, lo:hi] + self.b) >> HASH_SHIFT
+            result[row:end_row] = np.minimum.reduceat(permuted, starts[row:end_row] - lo, axis=1).T
+            row = end_row
+        return result
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.parent = list(range(size))
+
+    def find(self, i: int) -> int:
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i: int, j: int) -> None:
+        root_i, root_j = self.find(i), self.find(j)
+        if root_i != root_j:
+            self.parent[max(root_i, root_j)] = min(root_i, root_j)
+
+def find_near_duplicates(
+    texts: Sequence[str],
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    bands: int = 16,
+    max_pairwise_bucket: int = 32
+) -> List[List[int]]:
+    """Cluster line indices whose normalized texts have estimated Jaccard similarity >= threshold.
+
+    Identical normalized texts are grouped directly; only distinct forms get MinHash
+    signatures. LSH banding proposes candidate pairs, which are confirmed against the
+    full signature before being merged. Returns clusters (of two or more lines) as
+    sorted index lists.
+    """
+    if num_perm % bands:
+        raise ValueError("num_perm must be a multiple of bands")
+    rows = num_perm // bands
+
+    # Exact duplicates after normalization share one signature
+    forms: Dict[str, List[int]] = defaultdict(list)
+    for i, text in enumerate(texts):
+        normalized = normalize_dialog(text)
+        if normalized:
+            forms[normalized].append(i)
+    unique_forms = list(forms)
+
+    hasher = MinHasher(num_perm)
+    signatures = hasher.signatures([shingles(form) for form in unique_forms])
+
+    # Candidate pairs from LSH buckets, deduplicated across bands
+    candidates = set()
+    for band in range(bands):
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        band_values = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for i in range(len(unique_forms)):
+            buckets[band_values[i].tobytes()].append(i)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            if len(members) <= max_pairwise_bucket:
+                candidates.update(
+                    (members[x], members[y])
+                    for x in range(len(members))
+                    for y in range(x + 1, len(members))
+                )
+            else:
+                # Large buckets are compared against their first member to stay linear
+                candidates.update((members[0], other) for other in members[1:])
+
+    # Confirm candidates against the full signatures, vectorized
+    union_find = UnionFind(len(unique_forms))
+    if candidates:
+        pairs = np.fromiter(
+            (index for pair in candidates for index in pair), dtype=np.int64, count=2 * len(candidates)
+        ).reshape(-1, 2)
+        for start in range(0, len(pairs), 200_000):
+            chunk = pairs[start:start + 200_000]
+            agreement = np.count_nonzero(signatures[chunk[:, 0]] == signatures[chunk[:, 1]], axis=1) / num_perm
+            for i, j in chunk[agreement >= threshold]:
+                union_find.union(int(i), int(j))
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for form_index, form in enumerate(unique_forms):
+        clusters[union_find.find(form_index)].extend(forms[form])
+    return sorted(
+        (sorted(members) for members in clusters.values() if len(members) > 1),
+        key=lambda members: members[0]
+    )
+
+def choose_representative(texts: Sequence[str], members: List[int]) -> int:
+    """Member whose normalized form is most common in the cluster (earliest on ties)"""
+    counts: Dict[str, int] = defaultdict(int)
+    normalized = {i: normalize_dialog(texts[i]) for i in members}
+    for form in normalized.values():
+        counts[form] += 1
+    return max(members, key=lambda i: (counts[normalized[i]], -i))
+
+def plan_dedup(
+    ids: Sequence[str],
+    texts: Sequence[str],
+    threshold: float = 0.8
+) -> List[Tuple[str, List[str]]]:
+    """(kept id, all member ids) for every near-duplicate cluster"""
+    plan = []
+    for members in find_near_duplicates(texts, threshold=threshold):
+        keep = choose_representative(texts, members)
+        plan.append((ids[keep], [ids[i] for i in members]))
+    return plan
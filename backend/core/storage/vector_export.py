@@ -0,0 +1,208 @@
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Callable, Tuple
+import json
+import os
+import queue
+import threading
+import time
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+Page = Dict[str, List[Any]]
+
+def iter_collection_pages(
+    collection,
+    page_size: int = 500,
+    start_offset: int = 0,
+    include: Optional[List[str]] = None
+) -> Iterator[Tuple[int, Page]]:
+    """Yield (offset, page) from a ChromaDB collection without loading it all at once"""
+    include = include or ['embeddings', 'metadatas', 'documents']
+    offset = start_offset
+    while True:
+        page = collection.get(include=include, limit=page_size, offset=offset)
+        if not page['ids']:
+            return
+        yield offset, page
+        offset += len(page['ids'])
+
+class ExportCheckpoint:
+    """Offset of the last page fully written to a target, persisted for resume"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        if not self.path.exists():
+            return None
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, target: str, offset: int, **details: Any) -> None:
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump({"target": target, "offset": offset, **details}, f)
+        os.replace(tmp_path, self.path)
+
+    def offset_for(self, target: str) -> int:
+        """Resume offset for target; 0 when the checkpoint belongs to another target"""
+        data = self.load()
+        if data and data.get("target") == target:
+            return int(data.get("offset", 0))
+        return 0
+
+    def clear(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
+
+@dataclass
+class ExportReport:
+    start_offset: int = 0
+    end_offset: int = 0
+    pages: int = 0
+    rows: int = 0
+    vectors: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def vectors_per_second(self) -> float:
+        return self.vectors / self.seconds if self.seconds else 0.0
+
+    def summary(self) -> str:
+        resumed = f", resumed at row {self.start_offset}" if self.start_offset else ""
+        return (
+            f"Exported {self.vectors} vectors from {self.rows} rows in {self.pages} pages "
+            f"({self.batches} upserts) in {self.seconds:.1f}s, "
+            f"{self.vectors_per_second:.0f} vectors/s{resumed}"
+        )
+
+class StreamingExporter:
+    """Streams collection pages through a bounded queue into concurrent batch upserts.
+
+    The reader thread turns each page into vectors with `transform` and blocks when
+    `queue_size` batches are waiting, so memory stays at a few pages however large the
+    corpus is. The checkpoint only advances past a page once every batch from it and
+    from all earlier pages has been written, so a failed run resumes without gaps.
+    """
+
+    def __init__(
+        self,
+        upsert: Callable[[List[Dict[str, Any]]], None],
+        transform: Callable[[Page], List[Dict[str, Any]]],
+        page_size: int = 500,
+        batch_size: int = 100,
+        max_workers: int = 4,
+        queue_size: int = 8,
+        max_retries: int = 3,
+        retry_delay: float = 2.0
+    ):
+        self.upsert = upsert
+        self.transform = transform
+        self.page_size = page_size
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+
+    def _upsert_with_retries(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(self.max_retries):
+            try:
+                self.upsert(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    raise
+                logger.warning(f"Upsert of {len(batch)} vectors failed, retrying in {self.retry_delay}s: {e}")
+                time.sleep(self.retry_delay * (attempt + 1))
+
+    def run(
+        self,
+        collection,
+        target: str,
+        checkpoint: Optional[ExportCheckpoint] = None
+    ) -> ExportReport:
+        start_offset = checkpoint.offset_for(target) if checkpoint else 0
+        report = ExportReport(start_offset=start_offset, end_offset=start_offset)
+        work: "queue.Queue[Optional[Tuple[int, List[Dict[str, Any]]]]]" = queue.Queue(maxsize=self.queue_size)
+        lock = threading.Lock()
+        failure: List[BaseException] = []
+        # Page bookkeeping for the checkpoint: start offset -> [batches outstanding, end offset, reading done]
+        pages: Dict[int, List[Any]] = {}
+        started = time.perf_counter()
+
+        def advance_checkpoint() -> None:
+            # Called with lock held: move past every leading page that is fully written
+            while pages:
+                first = min(pages)
+                outstanding, end_offset, done = pages[first]
+                if outstanding or not done:
+                    return
+                del pages[first]
+                report.end_offset = end_offset
+                if checkpoint:
+                    checkpoint.save(target, end_offset)
+
+        def worker() -> None:
+            while True:
+                item = work.get()
+                if item is None:
+                    return
+                page_offset, batch = item
+                if failure:
+                    continue
+                try:
+                    self._upsert_with_retries(batch)
+                except BaseException as e:
+                    logger.error(f"Export to {target} failed at page {page_offset}: {e}")
+                    with lock:
+                        failure.append(e)
+                    continue
+                with lock:
+                    report.vectors += len(batch)
+                    report.batches += 1
+                    pages[page_offset][0] -= 1
+                    advance_checkpoint()
+
+        workers = [
+            threading.Thread(target=worker, name=f"export-upsert-{i}", daemon=True)
+            for i in range(self.max_workers)
+        ]
+        for thread in workers:
+            thread.start()
+
+        try:
+            for offset, page in iter_collection_pages(collection, self.page_size, start_offset):
+                if failure:
+                    break
+                vectors = self.transform(page)
+                batches = [
+                    vectors[i:i + self.batch_size]
+                    for i in range(0, len(vectors), self.batch_size)
+                ]
+                with lock:
+                    pages[offset] = [len(batches), offset + len(page['ids']), False]
+                    report.pages += 1
+                    report.rows += len(page['ids'])
+                for batch in batches:
+                    work.put((offset, batch))  # Blocks while the queue is full
+                with lock:
+                    pages[offset][2] = True
+                    advance_checkpoint()
+        finally:
+            for _ in workers:
+                work.put(None)
+            for thread in workers:
+                thread.join()
+
+        report.seconds = time.perf_counter() - started
+        if failure:
+            raise RuntimeError(
+                f"Export to {target} stopped after row {report.end_offset}; re-run to resume"
+            ) from failure[0]
+        logger.info(report.summary())
+        return report
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Sequence
+import json
+import os
+import time
+
+@dataclass
+class TaskResult:
+    """Outcome of one episode in a batch"""
+    episode: str
+    status: str  # 'done', 'fresh' (output up to date), 'skipped' (missing input) or 'failed'
+    seconds: float = 0.0
+    output: Optional[str] = None
+    error: Optional[str] = None
+
+@dataclass
+class BatchReport:
+    results: List[TaskResult] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    def count(self, status: str) -> int:
+        return sum(1 for r in self.results if r.status == status)
+
+    @property
+    def failures(self) -> List[TaskResult]:
+        return [r for r in self.results if r.status == 'failed']
+
+    def summary(self) -> str:
+        busy = sum(r.seconds for r in self.results)
+        lines = [
+            f"{len(self.results)} episodes in {self.wall_seconds:.1f}s ({busy:.1f}s of work): "
+            f"{self.count('done')} done, {self.count('fresh')} up to date, "
+            f"{self.count('skipped')} skipped, {self.count('failed')} failed"
+        ]
+        for r in sorted(self.results, key=lambda r: r.episode):
+            detail = f": {r.error}" if r.error else ""
+            lines.append(f"  {r.episode}: {r.status} in {r.seconds:.1f}s{detail}")
+        return '\n'.join(lines)
+
+    def write_json(self, path) -> None:
+        """Structured report, failures included, for scripts and CI"""
+        with open(path, 'w') as f:
+            json.dump({
+                "wall_seconds": self.wall_seconds,
+                "counts": {status: self.count(status) for status in ('done', 'fresh', 'skipped', 'failed')},
+                "results": [asdict(r) for r in self.results]
+            }, f, indent=2)
+
+def run_batch(
+    items: Sequence[Any],
+    task: Callable[[Any], TaskResult],
+    workers: Optional[int] = None
+) -> BatchReport:
+    """Run task over items with at most workers in flight (default: one per core).
+
+    Tasks spend their time in external processes (ffmpeg, alass), so threads give the
+    same parallelism as a process pool. A task that raises is reported as failed.
+    """
+    report = BatchReport()
+    started = time.perf_counter()
+
+    def guarded(item) -> TaskResult:
+        task_started = time.perf_counter()
+        try:
+            result = task(item)
+        except Exception as e:
+            result = TaskResult(episode=str(item), status='failed', error=f"{type(e).__name__}: {e}")
+        result.seconds = result.seconds or time.perf_counter() - task_started
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        report.results = list(executor.map(guarded, items))
+    report.wall_seconds = time.perf_counter() - started
+    return report
+
+def _stamp_path(output: Path) -> Path:
+    return output.parent / f".{output.name}.stamp"
+
+def input_signature(inputs: Sequence, **params: Any) -> Dict[str, Any]:
+    """Size and mtime of every input plus the parameters that shape the output"""
+    files = {}
+    for path in inputs:
+        stat = Path(path).stat()
+        files[str(Path(path).resolve())] = [stat.st_size, stat.st_mtime_ns]
+    return {"inputs": files, "params": params}
+
+def is_fresh(output, signature: Dict[str, Any]) -> bool:
+    """Whether output exists and was produced from exactly these inputs and parameters.
+
+    Outputs without a stamp (made before stamps existed) count as fresh when they are
+    newer than every input; their stamp is written then.
+    """
+    output = Path(output)
+    if not output.exists() or output.stat().st_size == 0:
+        return False
+    try:
+        with open(_stamp_path(output)) as f:
+            return json.load(f) == signature
+    except FileNotFoundError:
+        pass
+    except json.JSONDecodeError:
+        return False
+    newest_input = max((mtime for _, mtime in signature["inputs"].values()), default=0)
+    if output.stat().st_mtime_ns < newest_input:
+        return False
+    write_stamp(output, signature)
+    return True
+
+def write_stamp(output, signature: Dict[str, Any]) -> None:
+    stamp = _stamp_path(Path(output))
+    tmp = stamp.with_name(f"{stamp.name}.{os.getpid()}")
+    with open(tmp, 'w') as f:
+        json.dump(signature, f)
+    os.replace(tmp, stamp)
@@ -1,81 +1,262 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
 from pathlib import Path
+from typing import List, Optional, Tuple, Sequence
+import bisect
+import json
+import os
+import re
+import statistics
+import subprocess
 import sys
-import random
-import yaml
-from collections import defaultdict
+import time
 
 # Add project root to Python path
-project_root = str(Path(__file__).resolve().parents[2])
+project_root = str(Path(__file__).resolve().parents[3])
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-from src.playback.video_player import VideoPlayer
-from src.storage.dialog_storage import DialogStorage
-
-def check_episode_alignment(config_path: str):
-    # Initialize dialog storage
-    storage = DialogStorage(config_path)
-    
-    # Get all entries from the collection
-    results = storage.collection.get()
-    
-    if not results or not results['ids']:
-        print("No entries found in the collection.")
-        return
-    
-    # Group clips by episode
-    episode_clips = defaultdict(list)
-    for i, metadata in enumerate(results['metadatas']):
-        episode_key = f"S{metadata['season']:02d}E{metadata['episode']:02d}"
-        episode_clips[episode_key].append({
-            'clip_path': metadata['clip_path'],
-            'start_time': metadata['start_time'],
-            'end_time': metadata['end_time'],
-            'text': results['documents'][i]
-        })
-    
-    # Initialize video player
-    player = VideoPlayer()
-    
-    print(f"\nFound {len(episode_clips)} episodes with clips")
-    print("Press Enter to play next clip, 'q' to quit, 'm' to mark episode as misaligned")
-    misaligned_episodes = set()
-    
-    # Process each episode
-    for episode in sorted(episode_clips.keys()):
-        # Select a random clip from this episode
-        clip_info = random.choice(episode_clips[episode])
-        print(f"\nPlaying clip from {episode}")
-        print(f"Dialog: {clip_info['text']}")
-        print(f"Clip path: {clip_info['clip_path']}")
-        
-        # Play the clip
-        player.play_clip(clip_info['clip_path'])
-        
-        # Get user input
-        response = input("Press Enter for next clip, 'q' to quit, 'm' to mark as misaligned: ").lower()
-        if response == 'q':
-            break
-        elif response == 'm':
-            misaligned_episodes.add(episode)
-    
-    # Print summary of misaligned episodes
-    if misaligned_episodes:
-        print("\nMisaligned episodes:")
-        for episode in sorted(misaligned_episodes):
-            print(f"- {episode}")
-        
-        # Save to file
+from backend.core.extraction.alignment_artifact import read_alignment
+
+VIDEO_EXTENSIONS = ('.mkv', '.mp4', '.avi')
+SILENCE_START = re.compile(r'silence_start:\s*(-?[\d.]+)')
+SILENCE_END = re.compile(r'silence_end:\s*(-?[\d.]+)')
+
+@dataclass
+class ClipScore:
+    """How well one subtitle interval lines up with detected speech (seconds)"""
+    start: float
+    end: float
+    overlap: float  # Fraction of the interval that is speech
+    offset: Optional[float]  # Nearest speech onset minus subtitle start, None if none nearby
+
+@dataclass
+class EpisodeQA:
+    episode: str
+    clips: int = 0
+    median_overlap: float = 0.0
+    median_offset: Optional[float] = None
+    flagged: bool = False
+    reasons: List[str] = field(default_factory=list)
+    seconds: float = 0.0
+    error: Optional[str] = None
+
+@dataclass
+class AlignmentReport:
+    episodes: List[EpisodeQA] = field(default_factory=list)
+    wall_seconds: float = 0.0
+
+    @property
+    def flagged(self) -> List[EpisodeQA]:
+        return [e for e in self.episodes if e.flagged]
+
+    def summary(self) -> str:
+        lines = [
+            f"Checked {len(self.episodes)} episodes in {self.wall_seconds:.1f}s: "
+            f"{len(self.flagged)} flagged"
+        ]
+        for e in sorted(self.episodes, key=lambda e: e.episode):
+            offset = f"{e.median_offset:+.2f}s" if e.median_offset is not None else "n/a"
+            status = f"FLAGGED ({'; '.join(e.reasons)})" if e.flagged else "ok"
+            lines.append(
+                f"  {e.episode}: {e.clips} clips, median overlap {e.median_overlap:.2f}, "
+                f"median offset {offset}, {status}"
+            )
+        return '\n'.join(lines)
+
+    def write_json(self, path) -> None:
+        with open(path, 'w') as f:
+            json.dump({
+                "wall_seconds": self.wall_seconds,
+                "flagged": [e.episode for e in self.flagged],
+                "episodes": [asdict(e) for e in self.episodes]
+            }, f, indent=2)
+
+def detect_silences(
+    video_file,
+    noise_db: float = -30.0,
+    min_silence: float = 0.3,
+    ffmpeg: str = 'ffmpeg'
+) -> Tuple[List[Tuple[float, float]], float]:
+    """One audio-only silencedetect pass; returns silences and the audio duration"""
+    # Progress stats stay on: the last one carries the duration
+    cmd = [
+        ffmpeg, '-hide_banner',
+        '-vn', '-sn', '-dn',
+        '-i', str(video_file),
+        '-map', '0:a:0',
+        '-af', f'silencedetect=noise={noise_db}dB:d={min_silence}',
+        '-f', 'null', '-'
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.strip()[-500:]}")
+    return parse_silences(result.stderr), parse_duration(result.stderr)
+
+def parse_duration(stderr: str) -> float:
+    """Audio duration from ffmpeg's final progress line (time=HH:MM:SS.ss)"""
+    times = re.findall(r'time=(\d+):(\d+):([\d.]+)', stderr)
+    if not times:
+        return 0.0
+    hours, minutes, seconds = times[-1]
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def parse_silences(stderr: str) -> List[Tuple[float, float]]:
+    """(start, end) silences from silencedetect output; a trailing open silence is closed at infinity"""
+    silences = []
+    start = None
+    for line in stderr.splitlines():
+        match = SILENCE_START.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = SILENCE_END.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    if start is not None:
+        silences.append((start, float('inf')))
+    return silences
+
+def speech_intervals(silences: Sequence[Tuple[float, float]], duration: float) -> List[Tuple[float, float]]:
+    """Complement of the silences within [0, duration]"""
+    speech = []
+    position = 0.0
+    for start, end in sorted(silences):
+        if start > position:
+            speech.append((position, min(start, duration)))
+        position = max(position, end)
+    if position < duration:
+        speech.append((position, duration))
+    return [(start, end) for start, end in speech if end > start]
+
+def score_interval(
+    start: float,
+    end: float,
+    speech: Sequence[Tuple[float, float]],
+    onsets: Sequence[float],
+    max_offset: float = 2.0
+) -> ClipScore:
+    """Speech overlap of [start, end] and the offset to the nearest speech onset"""
+    covered = sum(max(0.0, min(end, s_end) - max(start, s_start)) for s_start, s_end in speech
+                  if s_start < end and s_end > start)
+    overlap = covered / (end - start) if end > start else 0.0
+    i = bisect.bisect_left(onsets, start)
+    nearby = [onsets[j] - start for j in (i - 1, i) if 0 <= j < len(onsets)]
+    nearby = [offset for offset in nearby if abs(offset) <= max_offset]
+    return ClipScore(start, end, overlap, min(nearby, key=abs) if nearby else None)
+
+def score_episode(
+    episode: str,
+    intervals: Sequence[Tuple[float, float]],
+    speech: Sequence[Tuple[float, float]],
+    min_overlap: float = 0.6,
+    max_median_offset: float = 0.5
+) -> EpisodeQA:
+    """Score every clip interval and flag the episode when the medians fall out of bounds"""
+    onsets = sorted(start for start, _ in speech)
+    scores = [score_interval(start, end, speech, onsets) for start, end in intervals]
+    qa = EpisodeQA(episode=episode, clips=len(scores))
+    if not scores:
+        qa.flagged = True
+        qa.reasons.append("no clips to check")
+        return qa
+    qa.median_overlap = statistics.median(score.overlap for score in scores)
+    offsets = [score.offset for score in scores if score.offset is not None]
+    qa.median_offset = statistics.median(offsets) if offsets else None
+    if qa.median_overlap < min_overlap:
+        qa.reasons.append(f"median overlap {qa.median_overlap:.2f} < {min_overlap}")
+    if qa.median_offset is None:
+        qa.reasons.append("no speech onsets near the subtitles")
+    elif abs(qa.median_offset) > max_median_offset:
+        qa.reasons.append(f"median offset {qa.median_offset:+.2f}s beyond {max_median_offset}s")
+    qa.flagged = bool(qa.reasons)
+    return qa
+
+def alignment_intervals(alignment_file) -> List[Tuple[float, float]]:
+    """Source-video subtitle intervals of every complete match (sentence matches otherwise)"""
+    _, segments = read_alignment(alignment_file)
+    intervals = []
+    for segment in segments:
+        matches = [segment['complete']] if segment['complete'] else segment['sentences']
+        for match in matches:
+            if match:
+                intervals.append((match['start_time'].ordinal / 1000, match['end_time'].ordinal / 1000))
+    return intervals
+
+def latest_alignment(alignments_dir, episode: str) -> Optional[Path]:
+    candidates = list((Path(alignments_dir) / episode).glob('*.jsonl'))
+    return max(candidates, key=lambda p: p.stat().st_mtime) if candidates else None
+
+def check_episode(video_file, alignment_file, min_overlap=0.6, max_median_offset=0.5, **silence_options) -> EpisodeQA:
+    episode = Path(alignment_file).parent.name
+    started = time.perf_counter()
+    try:
+        silences, duration = detect_silences(video_file, **silence_options)
+        intervals = alignment_intervals(alignment_file)
+        duration = duration or max((end for _, end in intervals), default=0.0)
+        qa = score_episode(episode, intervals, speech_intervals(silences, duration), min_overlap, max_median_offset)
+    except Exception as e:
+        qa = EpisodeQA(episode=episode, flagged=True, reasons=["check failed"], error=f"{type(e).__name__}: {e}")
+    qa.seconds = time.perf_counter() - started
+    return qa
+
+def check_episode_alignment(
+    video_dir,
+    alignments_dir,
+    workers: Optional[int] = None,
+    min_overlap: float = 0.6,
+    max_median_offset: float = 0.5,
+    episodes: Optional[Sequence[str]] = None
+) -> AlignmentReport:
+    """Check every episode with a video and a stored alignment, several episodes at a time"""
+    jobs = []
+    for video in sorted(p for p in Path(video_dir).iterdir() if p.suffix in VIDEO_EXTENSIONS):
+        match = re.search(r'S\d+E\d+', video.stem)
+        if not match or (episodes and match.group(0) not in episodes):
+            continue
+        alignment = latest_alignment(alignments_dir, match.group(0))
+        if alignment is None:
+            print(f"No stored alignment for {match.group(0)}, skipping")
+            continue
+        jobs.append((video, alignment))
+
+    report = AlignmentReport()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+        report.episodes = list(executor.map(
+            lambda job: check_episode(job[0], job[1], min_overlap, max_median_offset), jobs
+        ))
+    report.wall_seconds = time.perf_counter() - started
+    return report
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check episode dialog alignment against detected speech')
+    parser.add_argument('video_dir', help='Directory containing video files')
+    parser.add_argument('--alignments_dir', default='data/processed/alignments',
+                        help='Directory of stored per-episode alignments')
+    parser.add_argument('--workers', type=int, default=None, help='Episodes checked at once (default: one per core)')
+    parser.add_argument('--min_overlap', type=float, default=0.6,
+                        help='Flag episodes whose median speech overlap is below this')
+    parser.add_argument('--max_offset', type=float, default=0.5,
+                        help='Flag episodes whose median onset offset exceeds this many seconds')
+    parser.add_argument('--episodes', nargs='*', help='Only these episode codes')
+    parser.add_argument('--report', help='Write a JSON report to this file')
+    args = parser.parse_args()
+
+    report = check_episode_alignment(
+        args.video_dir, args.alignments_dir, args.workers, args.min_overlap, args.max_offset, args.episodes
+    )
+    print(report.summary())
+    if args.report:
+        report.write_json(args.report)
+
+    # Misaligned episodes, one per line, as the manual review used to write them
+    if report.flagged:
         output_file = Path(project_root) / "data" / "misaligned_episodes.txt"
+        output_file.parent.mkdir(parents=True, exist_ok=True)
         with open(output_file, 'w') as f:
-            for episode in sorted(misaligned_episodes):
+            for episode in sorted(e.episode for e in report.flagged):
                 f.write(f"{episode}\n")
         print(f"\nSaved misaligned episodes to: {output_file}")
-
-if __name__ == '__main__':
-    parser = argparse.ArgumentParser(description='Check episode dialog alignment')
-    parser.add_argument('--config', default='config/app_config.yaml', help='Path to config file')
-    args = parser.parse_args()
-    
-    check_episode_alignment(args.config)
\ No newline at end of file
@@ -2,10 +2,17 @@ import argparse
 from pathlib import Path
 import subprocess
 import json
+import os
 import sys
-from tqdm import tqdm
 import re
 
+# Add the project root to the Python path
+project_root = str(Path(__file__).resolve().parents[3])
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from backend.core.utils.batch import TaskResult, input_signature, is_fresh, run_batch, write_stamp
+
 def get_subtitle_streams(video_file):
     """Get all subtitle streams from the video file"""
     cmd = [
@@ -24,9 +31,11 @@ def get_subtitle_streams(video_file):
     
     data = json.loads(result.stdout)
     streams = data.get('streams', [])
-    print(f"Found {len(streams)} subtitle streams:")
-    for stream in streams:
-        print(f"  - Stream {stream.get('index')}: codec={stream.get('codec_name')}, language={stream.get('tags', {}).get('language')}")
+    described = ', '.join(
+        f"{stream.get('index')}:{stream.get('codec_name')}/{stream.get('tags', {}).get('language')}"
+        for stream in streams
+    )
+    print(f"Found {len(streams)} subtitle streams in {Path(video_file).name}: {described}")
     return streams
 
 def extract_episode_info(filename):
@@ -37,7 +46,7 @@ def extract_episode_info(filename):
         return f"S{match.group(1)}E{match.group(2)}"
     return None
 
-def extract_subtitles(video_file, output_dir):
+def extract_subtitles(video_file, output_dir, force=False):
     """Extract English subtitles from video file"""
     video_file = Path(video_file)
     output_dir = Path(output_dir)
@@ -45,15 +54,15 @@ def extract_subtitles(video_file, output_dir):
     
     # Try to extract episode info from filename
     episode_name = extract_episode_info(video_file.stem)
-    print(f"Extracted episode info: {episode_name}")
     # Use episode format (S01E01) if found, otherwise use original filename
     output_filename = f"{episode_name}.srt" if episode_name else f"{video_file.stem}.srt"
     
-    # Check if output file already exists
+    # Skip when the output was extracted from this very video file
     output_file = output_dir / output_filename
-    if output_file.exists():
-        print(f"Subtitle file already exists: {output_file}")
-        return output_file  # Return existing file path
+    signature = input_signature([video_file], codec='srt')
+    if not force and is_fresh(output_file, signature):
+        print(f"Subtitle file is up to date: {output_file}")
+        return output_file
     
     # Get all subtitle streams
     subtitle_streams = get_subtitle_streams(video_file)
@@ -69,46 +78,60 @@ def extract_subtitles(video_file, output_dir):
         language = tags.get('language', '').lower()
         codec = stream.get('codec_name', '').lower()
         
-        print(f"Checking stream: language={language}, codec={codec}")
-        
         if language in ['eng', 'en']:
             # Prefer text-based subtitle formats
             if codec in ['subrip', 'ass', 'ssa']:
-                print(f"Found preferred text-based English subtitle stream: {stream['index']}")
                 english_stream = stream
                 break
             # Fallback to first English stream if no text-based format is found
             elif not english_stream:
-                print(f"Found fallback English subtitle stream: {stream['index']}")
                 english_stream = stream
     
     if not english_stream:
         print(f"No English subtitles found in {video_file}")
         return None
     
-    # Extract the subtitles
-    output_file = output_dir / output_filename
+    # Extract the subtitles into a temporary file, so an interrupted run never
+    # leaves a partial file that looks complete
     stream_index = english_stream['index']
+    partial_file = output_dir / f".{output_filename}.partial.srt"
     
-    print(f"Extracting subtitle stream {stream_index} to {output_file}")
+    print(f"Extracting subtitle stream {stream_index} of {video_file.name} to {output_file}")
     
     cmd = [
         'ffmpeg',
+        '-y',
+        '-loglevel', 'error',
         '-i', str(video_file),
         '-map', f'0:{stream_index}',
         '-c:s', 'srt',
-        str(output_file)
+        str(partial_file)
     ]
     
     result = subprocess.run(cmd, capture_output=True, text=True)
     if result.returncode != 0:
+        partial_file.unlink(missing_ok=True)
         print(f"Error extracting subtitles from {video_file}: {result.stderr}")
         return None
     
+    os.replace(partial_file, output_file)
+    write_stamp(output_file, signature)
     return output_file
 
-def process_video_folder(input_dir, output_dir):
-    """Process all video files in a directory"""
+def extract_episode(video_file, output_dir, force=False) -> TaskResult:
+    """extract_subtitles for one video, as a batch result"""
+    video_file = Path(video_file)
+    episode = extract_episode_info(video_file.stem) or video_file.stem
+    output_file = Path(output_dir) / f"{episode}.srt"
+    if not force and output_file.exists() and is_fresh(output_file, input_signature([video_file], codec='srt')):
+        return TaskResult(episode=episode, status='fresh', output=str(output_file))
+    output = extract_subtitles(video_file, output_dir, force=True)
+    if output is None:
+        return TaskResult(episode=episode, status='failed', error="No English subtitle stream could be extracted")
+    return TaskResult(episode=episode, status='done', output=str(output))
+
+def process_video_folder(input_dir, output_dir, workers=None, force=False, report_path=None):
+    """Extract subtitles of all video files in a directory, several at a time"""
     input_dir = Path(input_dir)
     output_dir = Path(output_dir)
     
@@ -119,34 +142,36 @@ def process_video_folder(input_dir, output_dir):
     
     if not video_files:
         print(f"No video files found in {input_dir}")
-        return
+        return None
     
     print(f"Found {len(video_files)} video files")
-    successful = 0
-    failed = 0
-    
-    # Process each video file
-    for video_file in tqdm(sorted(video_files), desc="Extracting subtitles"):
-        output_file = extract_subtitles(video_file, output_dir)
-        if output_file:
-            print(f"Extracted subtitles from {video_file.name} to {output_file}")
-            successful += 1
-        else:
-            print(f"Failed to extract subtitles from {video_file.name}")
-            failed += 1
+    report = run_batch(
+        sorted(video_files),
+        lambda video_file: extract_episode(video_file, output_dir, force),
+        workers
+    )
     
     print(f"\nProcessing complete:")
-    print(f"Successfully processed: {successful}")
-    print(f"Failed: {failed}")
+    print(report.summary())
+    if report_path:
+        report.write_json(report_path)
+    return report
 
 def main():
     parser = argparse.ArgumentParser(description='Extract English subtitles from video files')
     parser.add_argument('input_dir', help='Directory containing video files')
     parser.add_argument('--output_dir', default='data/raw/subtitles/srt', 
                        help='Directory to save extracted subtitles')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Videos processed at once (default: one per core)')
+    parser.add_argument('--force', action='store_true',
+                       help='Extract again even when the subtitle file is up to date')
+    parser.add_argument('--report', help='Write a JSON report of every episode to this file')
     args = parser.parse_args()
     
-    process_video_folder(args.input_dir, args.output_dir)
+    report = process_video_folder(args.input_dir, args.output_dir, args.workers, args.force, args.report)
+    if report and report.failures:
+        sys.exit(1)
 
 if __name__ == '__main__':
     main()
@@ -1,34 +1,72 @@
+import argparse
 import yaml
-from src.storage.dialog_storage import DialogStorage
-
-def remove_duplicate_dialogs(config_path: str):
-    # Initialize storage
-    storage = DialogStorage(config_path)
-    
-    # Retrieve all dialogs
-    all_dialogs = storage.get_all_dialogs()
-    if not all_dialogs or not all_dialogs['ids']:
+import chromadb
+from backend.core.storage.near_duplicates import plan_dedup
+
+def remove_duplicate_dialogs(config_path: str, threshold: float = 0.8, dry_run: bool = False):
+    """Mark near-duplicate dialog lines so the index keeps one vector per cluster.
+
+    Nothing is deleted: every clip stays in Chroma, the source of truth. Folded clips get
+    `duplicate_of` set to their representative's id and representatives an `occurrence_count`;
+    setup_pinecone then indexes only representatives and the metadata store resolves each
+    one to a clip of its cluster at query time. Re-running replaces earlier marks.
+    """
+    with open(config_path) as f:
+        config = yaml.safe_load(f)
+    client = chromadb.PersistentClient(path=config['storage']['chroma_path'])
+    collection = client.get_collection(config['storage']['collection_name'])
+
+    # Page through documents and metadata only; embeddings are not needed
+    ids, documents, metadatas = [], [], []
+    offset = 0
+    while True:
+        page = collection.get(include=['documents', 'metadatas'], limit=5000, offset=offset)
+        if not page['ids']:
+            break
+        ids.extend(page['ids'])
+        documents.extend(text or '' for text in page['documents'])
+        metadatas.extend(metadata or {} for metadata in page['metadatas'])
+        offset += len(page['ids'])
+
+    if not ids:
         print("No dialogs found in the database.")
         return
-    
-    # Use a set to track unique dialogs
-    unique_dialogs = set()
-    duplicate_ids = []
-
-    # Iterate over all dialogs
-    for dialog_id, text in zip(all_dialogs['ids'], all_dialogs['documents']):
-        if text in unique_dialogs:
-            duplicate_ids.append(dialog_id)
-        else:
-            unique_dialogs.add(text)
-    
-    # Remove duplicates
-    if duplicate_ids:
-        storage.collection.delete(ids=duplicate_ids)
-        print(f"Removed {len(duplicate_ids)} duplicate dialogs.")
-    else:
-        print("No duplicates found.")
+
+    clusters = plan_dedup(ids, documents, threshold=threshold)
+    index_of = {dialog_id: i for i, dialog_id in enumerate(ids)}
+    duplicate_count = sum(len(members) - 1 for _, members in clusters)
+    print(f"Found {len(clusters)} near-duplicate clusters covering {duplicate_count + len(clusters)} of {len(ids)} dialogs")
+    for keep, members in clusters[:10]:
+        print(f"  keep {keep!r}: {documents[index_of[keep]][:60]!r} ({len(members)} lines)")
+
+    if dry_run:
+        return clusters
+
+    # Chroma merges metadata on update, so stale marks are cleared with "" rather than dropped
+    marks = {}
+    for keep, members in clusters:
+        for member in members:
+            marks[member] = {"duplicate_of": "" if member == keep else keep, "occurrence_count": len(members)}
+    for dialog_id, metadata in zip(ids, metadatas):
+        if dialog_id not in marks and (metadata.get("duplicate_of") or metadata.get("occurrence_count", 1) != 1):
+            marks[dialog_id] = {"duplicate_of": "", "occurrence_count": 1}
+    changed = [
+        dialog_id for dialog_id, mark in marks.items()
+        if any(metadatas[index_of[dialog_id]].get(field) != value for field, value in mark.items())
+    ]
+    for i in range(0, len(changed), 1000):
+        batch = changed[i:i + 1000]
+        collection.update(
+            ids=batch,
+            metadatas=[{**metadatas[index_of[dialog_id]], **marks[dialog_id]} for dialog_id in batch]
+        )
+    print(f"Marked {duplicate_count} duplicate dialogs ({len(changed)} updated); re-run setup_pinecone to apply.")
+    return clusters
 
 if __name__ == '__main__':
-    config_path = 'config/app_config.yaml'  # Update with your actual config path
-    remove_duplicate_dialogs(config_path)
+    parser = argparse.ArgumentParser(description='Mark near-duplicate dialog lines in ChromaDB.')
+    parser.add_argument('--config', default='config/search_config.yaml', help='Path to search config file')
+    parser.add_argument('--threshold', type=float, default=0.8, help='Minimum estimated Jaccard similarity to merge lines')
+    parser.add_argument('--dry-run', action='store_true', help='Report clusters without changing the collection')
+    args = parser.parse_args()
+    remove_duplicate_dialogs(args.config, threshold=args.threshold, dry_run=args.dry_run)
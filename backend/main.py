@@ -167,6 +167,18 @@ try:
                             "message": str(e)
                         }
 
+                # Report embedding micro-batcher metrics when it is running
+                from core.search.embedding_batcher import batcher_stats
+                embedding_stats = batcher_stats()
+                if embedding_stats:
+                    response["components"]["embedding_batcher"] = embedding_stats
+
+                # Report transcode cache metrics once the cache is in use
+                from api.services.transcode_cache import transcode_cache_stats
+                cache_stats = transcode_cache_stats()
+                if cache_stats:
+                    response["components"]["transcode_cache"] = cache_stats
+
                 return response
 
             @app.on_event("startup")
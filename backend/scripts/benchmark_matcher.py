@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""Benchmark ScriptParser and DialogMatcher on the committed fixture episode.
+
+The fixture (tests/fixtures/alignment) is scaled by a synthetic generator: copies of
+the episode are appended back to back, each with its words consistently replaced by
+pseudo-words in both script and subtitles, so every copy is distinct but aligns the
+same way. Reports parse time, segments/second, peak memory and accuracy against the
+golden alignment, and exits non-zero when accuracy or performance regresses, including
+an engine falling below its MIN_SPEEDUP over the exhaustive engine when both are run.
+
+    python scripts/benchmark_matcher.py
+    python scripts/benchmark_matcher.py --engines banded vectorized exhaustive --copies 1 4
+    python scripts/benchmark_matcher.py --baseline
+    python scripts/benchmark_matcher.py --save-baseline scripts/matcher_baseline.json
+
+Matching goes through DialogMatcher.match_complete (and match_dialog with --full).
+scripts/matcher_baseline.json holds the default banded runs; throughput is machine
+dependent, so regenerate it on the machine that checks against it.
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+
+import pysrt
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.dialog_matcher import DialogMatcher, ENGINES
+from backend.core.extraction.script_parser import ScriptParser
+
+BASELINE_PATH = Path(__file__).resolve().parent / "matcher_baseline.json"
+FIXTURE_DIR = Path(backend_root) / "tests" / "fixtures" / "alignment"
+SPEAKER_LINE = re.compile(r'^([A-Z][A-Z\s]+?:)(.*)$')
+WORD = re.compile(r'[A-Za-z]+')
+Golden = Dict[int, List[int]]
+
+# Throughput an engine must keep over the exhaustive engine on the same episode
+MIN_SPEEDUP = {'banded': 10.0, 'vectorized': 10.0}
+
+@dataclass
+class BenchmarkResult:
+    engine: str
+    copies: int
+    segments: int
+    parse_seconds: float
+    setup_seconds: float
+    match_seconds: float
+    correct: int
+    expected: int
+    false_matches: int  # Segments without a golden match that were matched anyway
+    peak_mb: Optional[float] = None
+    full_seconds: Optional[float] = None  # match_dialog with sentence matching
+
+    @property
+    def segments_per_second(self) -> float:
+        seconds = self.setup_seconds + self.match_seconds
+        return self.segments / seconds if seconds else 0.0
+
+    @property
+    def accuracy(self) -> float:
+        return self.correct / self.expected if self.expected else 0.0
+
+    def summary(self) -> str:
+        peak = f"{self.peak_mb:.1f} MB" if self.peak_mb is not None else "n/a"
+        full = f", match_dialog {self.full_seconds:.2f}s" if self.full_seconds is not None else ""
+        return (
+            f"{self.engine:>10} x{self.copies:<3} {self.segments:>6} segments: "
+            f"parse {self.parse_seconds * 1000:.0f} ms, {self.segments_per_second:,.0f} seg/s, "
+            f"peak {peak}, accuracy {self.accuracy:.3f} ({self.correct}/{self.expected}, "
+            f"{self.false_matches} false){full}"
+        )
+
+def load_fixture() -> Tuple[str, pysrt.SubRipFile, Golden]:
+    script_text = (FIXTURE_DIR / "episode.txt").read_text(encoding='utf-8')
+    subtitles = pysrt.open(str(FIXTURE_DIR / "episode.srt"))
+    with open(FIXTURE_DIR / "golden.json") as f:
+        golden = {int(position): span for position, span in json.load(f)["segments"].items()}
+    return script_text, subtitles, golden
+
+def _pseudo_words(copy: int, seed: int):
+    """Consistent word replacement for one copy; copy 0 keeps the original words"""
+    cache: Dict[str, str] = {}
+
+    def replace(match: re.Match) -> str:
+        word = match.group(0)
+        if copy == 0:
+            return word
+        key = word.lower()
+        if key not in cache:
+            rng = random.Random(f"{seed}:{copy}:{key}")
+            cache[key] = ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in key)
+        pseudo = cache[key]
+        if word.isupper() and len(word) > 1:
+            return pseudo.upper()
+        return pseudo.capitalize() if word[0].isupper() else pseudo
+
+    return lambda text: WORD.sub(replace, text)
+
+def synthesize_episode(
+    script_text: str,
+    subtitles: pysrt.SubRipFile,
+    golden: Golden,
+    segments_per_copy: int,
+    copies: int,
+    seed: int = 0,
+    gap_seconds: float = 60.0
+) -> Tuple[str, pysrt.SubRipFile, Golden]:
+    """Episode made of copies of the fixture, with its golden alignment"""
+    lines = script_text.splitlines()
+    first_dialog = next(i for i, line in enumerate(lines) if SPEAKER_LINE.match(line))
+    span_ms = subtitles[-1].end.ordinal + int(gap_seconds * 1000)
+
+    script_lines = lines[:first_dialog]
+    synthetic_subtitles = pysrt.SubRipFile()
+    synthetic_golden: Golden = {}
+    for copy in range(copies):
+        transform = _pseudo_words(copy, seed)
+        for line in lines[first_dialog:]:
+            speaker = SPEAKER_LINE.match(line)
+            script_lines.append(speaker.group(1) + transform(speaker.group(2)) if speaker else transform(line))
+        for sub in subtitles:
+            synthetic_subtitles.append(pysrt.SubRipItem(
+                index=len(synthetic_subtitles) + 1,
+                start=pysrt.SubRipTime.from_ordinal(sub.start.ordinal + copy * span_ms),
+                end=pysrt.SubRipTime.from_ordinal(sub.end.ordinal + copy * span_ms),
+                text=transform(sub.text)
+            ))
+        for position, (first, last) in golden.items():
+            synthetic_golden[position + copy * segments_per_copy] = [
+                first + copy * len(subtitles), last + copy * len(subtitles)
+            ]
+    return '\n'.join(script_lines) + '\n', synthetic_subtitles, synthetic_golden
+
+def parse_script_text(script_text: str) -> Tuple[list, float]:
+    """Parse a script through ScriptParser's file interface; returns segments and seconds"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "episode.txt"
+        path.write_text(script_text, encoding='utf-8')
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            segments = ScriptParser().parse_script(str(path))
+            seconds = time.perf_counter() - started
+    return segments, seconds
+
+def complete_spans(matcher: DialogMatcher) -> List[Optional[List[int]]]:
+    """First and last SRT index of each segment's complete match, from DialogMatcher.match_complete"""
+    return [
+        [match['subtitle_group'][0].index, match['subtitle_group'][-1].index] if match else None
+        for match in matcher.match_complete()
+    ]
+
+def run_matcher(engine: str, segments, subtitles) -> Tuple[List[Optional[List[int]]], float, float]:
+    """Spans, setup seconds and matching seconds"""
+    started = time.perf_counter()
+    matcher = DialogMatcher(segments, subtitles, engine=engine)
+    setup_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    spans = complete_spans(matcher)
+    return spans, setup_seconds, time.perf_counter() - started
+
+def sentence_tokenizer_available() -> bool:
+    import nltk
+    try:
+        nltk.sent_tokenize("One. Two.")
+        return True
+    except LookupError:
+        return False
+
+def run_benchmark(
+    engine: str,
+    copies: int,
+    fixture: Optional[Tuple[str, pysrt.SubRipFile, Golden]] = None,
+    measure_memory: bool = True,
+    full: bool = False
+) -> BenchmarkResult:
+    script_text, subtitles, golden = fixture or load_fixture()
+    base_segments, _ = parse_script_text(script_text)
+    script_text, subtitles, golden = synthesize_episode(script_text, subtitles, golden, len(base_segments), copies)
+    segments, parse_seconds = parse_script_text(script_text)
+
+    spans, setup_seconds, match_seconds = run_matcher(engine, segments, subtitles)
+    result = BenchmarkResult(
+        engine=engine,
+        copies=copies,
+        segments=len(segments),
+        parse_seconds=parse_seconds,
+        setup_seconds=setup_seconds,
+        match_seconds=match_seconds,
+        correct=sum(1 for position, span in enumerate(spans) if span is not None and span == golden.get(position)),
+        expected=len(golden),
+        false_matches=sum(1 for position, span in enumerate(spans) if span is not None and position not in golden)
+    )
+    if measure_memory:
+        # A separate run: tracing allocations slows Python code down considerably
+        tracemalloc.start()
+        run_matcher(engine, segments, subtitles)
+        result.peak_mb = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    if full:
+        matcher = DialogMatcher(segments, subtitles, engine=engine)
+        with contextlib.redirect_stderr(io.StringIO()):
+            started = time.perf_counter()
+            matcher.match_dialog()
+            result.full_seconds = time.perf_counter() - started
+    return result
+
+def check_regressions(
+    results: List[BenchmarkResult],
+    baseline: Optional[Dict[str, Dict[str, float]]] = None,
+    tolerance: float = 0.25,
+    min_accuracy: float = 0.95
+) -> List[str]:
+    """Regressions against absolute accuracy, MIN_SPEEDUP and an optional baseline from --save-baseline"""
+    problems = []
+    exhaustive_rates = {r.copies: r.segments_per_second for r in results if r.engine == 'exhaustive'}
+    for result in results:
+        name = f"{result.engine} x{result.copies}"
+        if result.accuracy < min_accuracy:
+            problems.append(f"{name}: accuracy {result.accuracy:.3f} below {min_accuracy}")
+        min_speedup = MIN_SPEEDUP.get(result.engine)
+        exhaustive_rate = exhaustive_rates.get(result.copies)
+        if min_speedup and exhaustive_rate and result.segments_per_second < min_speedup * exhaustive_rate:
+            problems.append(
+                f"{name}: {result.segments_per_second / exhaustive_rate:.1f}x the exhaustive engine, "
+                f"expected at least {min_speedup:g}x"
+            )
+        reference = (baseline or {}).get(f"{result.engine}:{result.copies}")
+        if not reference:
+            continue
+        if result.accuracy < reference["accuracy"]:
+            problems.append(f"{name}: accuracy {result.accuracy:.3f} below baseline {reference['accuracy']:.3f}")
+        if result.segments_per_second < reference["segments_per_second"] * (1 - tolerance):
+            problems.append(
+                f"{name}: {result.segments_per_second:,.0f} seg/s, baseline "
+                f"{reference['segments_per_second']:,.0f} seg/s"
+            )
+        if result.peak_mb is not None and reference.get("peak_mb") and \
+                result.peak_mb > reference["peak_mb"] * (1 + tolerance):
+            problems.append(f"{name}: peak {result.peak_mb:.1f} MB, baseline {reference['peak_mb']:.1f} MB")
+    return problems
+
+def to_baseline(results: List[BenchmarkResult]) -> Dict[str, Dict[str, float]]:
+    return {
+        f"{r.engine}:{r.copies}": {
+            "segments_per_second": r.segments_per_second,
+            "peak_mb": r.peak_mb,
+            "accuracy": r.accuracy
+        }
+        for r in results
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DialogMatcher on fixture and synthetic episodes')
+    parser.add_argument('--engines', nargs='+', default=['banded'],
+                        choices=ENGINES, help='Engines to run (default: banded)')
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 4, 16],
+                        help='Episode lengths, in copies of the fixture (default: 1 4 16)')
+    parser.add_argument('--full', action='store_true',
+                        help='Also time match_dialog with sentence matching (needs NLTK punkt)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc run')
+    parser.add_argument('--min-accuracy', type=float, default=0.95,
+                        help='Fail below this fraction of golden matches (default: 0.95)')
+    parser.add_argument('--baseline', nargs='?', const=str(BASELINE_PATH),
+                        help='Fail on regressions against this baseline JSON (default: the committed one)')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed throughput/memory regression against the baseline (default: 0.25)')
+    parser.add_argument('--save-baseline', help='Write the results as a baseline JSON')
+    parser.add_argument('--json', help='Write all results to this JSON file')
+    args = parser.parse_args()
+
+    if args.full and not sentence_tokenizer_available():
+        print("NLTK punkt is not installed; skipping match_dialog timings")
+        args.full = False
+
+    fixture = load_fixture()
+    results = []
+    for engine in args.engines:
+        for copies in args.copies:
+            result = run_benchmark(engine, copies, fixture, measure_memory=not args.no_memory, full=args.full)
+            print(result.summary())
+            results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump([{**asdict(r), "segments_per_second": r.segments_per_second, "accuracy": r.accuracy}
+                       for r in results], f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(to_baseline(results), f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    problems = check_regressions(results, baseline, args.tolerance, args.min_accuracy)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == '__main__':
+    main()
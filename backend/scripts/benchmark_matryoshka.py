@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Benchmark two-stage (Matryoshka) retrieval against exact full-dimension search.
+
+Reports per-query latency, memory and recall@k of the coarse+rescore pipeline
+relative to brute-force search over the full 1536-dim vectors. Two-stage mode keeps
+both indexes, so its memory is reported as the combined cost, and its latency adds
+one more network round trip per query (--round-trip-ms models that cost).
+
+    python scripts/benchmark_matryoshka.py --chroma ../data/processed/vector_store
+    python scripts/benchmark_matryoshka.py --synthetic 50000 --coarse-dims 256 512
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+# Add project root to Python path
+project_root = str(Path(__file__).resolve().parents[1])
+if project_root not in sys.path:
+    sys.path.append(project_root)
+
+from core.storage.matryoshka import truncate_embeddings
+
+def load_chroma_embeddings(vector_store: str, collection_name: str = None, page_size: int = 5000) -> np.ndarray:
+    """Load all embeddings from a ChromaDB collection page by page"""
+    import chromadb
+    from chromadb.config import Settings
+
+    client = chromadb.PersistentClient(path=vector_store, settings=Settings(anonymized_telemetry=False))
+    if collection_name:
+        collection = client.get_collection(collection_name)
+    else:
+        collection = client.list_collections()[0]
+    print(f"Loading embeddings from collection: {collection.name}")
+
+    pages = []
+    offset = 0
+    while True:
+        page = collection.get(include=['embeddings'], limit=page_size, offset=offset)
+        if not page['ids']:
+            break
+        pages.append(np.asarray(page['embeddings'], dtype=np.float32))
+        offset += len(page['ids'])
+    return np.vstack(pages)
+
+def synthetic_embeddings(count: int, dimensions: int = 1536, seed: int = 0) -> np.ndarray:
+    """Random embeddings whose variance decays with dimension, like Matryoshka-trained models"""
+    rng = np.random.default_rng(seed)
+    scale = 1.0 / np.sqrt(1.0 + np.arange(dimensions) / 64.0)
+    vectors = rng.standard_normal((count, dimensions)).astype(np.float32) * scale
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def make_queries(corpus: np.ndarray, count: int, noise: float, seed: int = 1) -> np.ndarray:
+    """Perturbed copies of corpus vectors, standing in for paraphrased queries"""
+    rng = np.random.default_rng(seed)
+    picks = rng.choice(len(corpus), size=count, replace=False)
+    queries = corpus[picks] + rng.standard_normal((count, corpus.shape[1])).astype(np.float32) * noise
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = matrix @ query
+    k = min(k, len(scores))
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+def run_exact(corpus: np.ndarray, queries: np.ndarray, k: int) -> Tuple[List[np.ndarray], List[float]]:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(top_k(corpus, query, k))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+def run_two_stage(
+    corpus: np.ndarray,
+    coarse: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    candidates: int
+) -> Tuple[List[np.ndarray], List[float]]:
+    dims = coarse.shape[1]
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        coarse_query = query[:dims] / np.linalg.norm(query[:dims])
+        candidate_ids = top_k(coarse, coarse_query, candidates)
+        rescored = corpus[candidate_ids] @ query
+        results.append(candidate_ids[np.argsort(-rescored)[:k]])
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+def recall(expected: List[np.ndarray], actual: List[np.ndarray]) -> float:
+    hits = sum(len(set(e.tolist()) & set(a.tolist())) for e, a in zip(expected, actual))
+    return hits / sum(len(e) for e in expected)
+
+def describe_latencies(latencies: List[float], round_trips: int = 0, round_trip_ms: float = 0.0) -> str:
+    ms = np.asarray(latencies) * 1000 + round_trips * round_trip_ms
+    description = f"p50 {np.percentile(ms, 50):.3f} ms  p95 {np.percentile(ms, 95):.3f} ms"
+    if round_trip_ms:
+        description += f"  (incl. {round_trips} x {round_trip_ms:g} ms round trips)"
+    return description
+
+def describe_memory(nbytes: int) -> str:
+    return f"{nbytes / 1024 / 1024:.1f} MB"
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Matryoshka two-stage retrieval')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--chroma', help='Path to ChromaDB vector store')
+    source.add_argument('--npy', help='Path to a .npy file of embeddings')
+    source.add_argument('--synthetic', type=int, help='Number of synthetic embeddings to generate')
+    parser.add_argument('--collection', help='ChromaDB collection name (default: first collection)')
+    parser.add_argument('--coarse-dims', type=int, nargs='+', default=[256, 512],
+                        help='Coarse dimensions to evaluate (default: 256 512)')
+    parser.add_argument('--k', type=int, default=40, help='Results per query (default: 40)')
+    parser.add_argument('--rescore-factor', type=int, default=3,
+                        help='Coarse candidates per requested result (default: 3)')
+    parser.add_argument('--queries', type=int, default=200, help='Number of queries (default: 200)')
+    parser.add_argument('--noise', type=float, default=0.02, help='Query perturbation (default: 0.02)')
+    parser.add_argument('--round-trip-ms', type=float, default=0.0,
+                        help='Network latency added per index round trip (default: 0, compute only)')
+    args = parser.parse_args()
+
+    if args.chroma:
+        corpus = load_chroma_embeddings(args.chroma, args.collection)
+    elif args.npy:
+        corpus = np.load(args.npy).astype(np.float32)
+    else:
+        corpus = synthetic_embeddings(args.synthetic)
+    corpus = (corpus / np.linalg.norm(corpus, axis=1, keepdims=True)).astype(np.float32)
+    queries = make_queries(corpus, min(args.queries, len(corpus)), args.noise)
+
+    print(f"\nCorpus: {corpus.shape[0]} vectors x {corpus.shape[1]} dims")
+    print(f"Queries: {len(queries)}, k={args.k}")
+
+    expected, exact_latencies = run_exact(corpus, queries, args.k)
+    print(f"\nFull {corpus.shape[1]}-dim exact search")
+    print(f"  Memory:  {describe_memory(corpus.nbytes)} ({corpus.shape[1] * 4} bytes/vector)")
+    print(f"  Latency: {describe_latencies(exact_latencies, 1, args.round_trip_ms)}")
+
+    candidates = args.k * args.rescore_factor
+    for dims in args.coarse_dims:
+        coarse = truncate_embeddings(corpus, dims)
+        actual, latencies = run_two_stage(corpus, coarse, queries, args.k, candidates)
+        print(f"\nTwo-stage {dims} dims -> rescore top {candidates}")
+        # The full index stays alongside the coarse one to serve the rescore fetch
+        combined = corpus.nbytes + coarse.nbytes
+        print(f"  Memory:  {describe_memory(combined)} combined "
+              f"({describe_memory(coarse.nbytes)} coarse + {describe_memory(corpus.nbytes)} full, "
+              f"+{coarse.nbytes / corpus.nbytes:.0%} over full alone)")
+        print(f"  Latency: {describe_latencies(latencies, 2, args.round_trip_ms)}")
+        print(f"  Recall@{args.k}: {recall(expected, actual):.2%}")
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,15 @@
 import sys
 from pathlib import Path
 import json
+import argparse
+import random
+import threading
+import time
 from pinecone import Pinecone, ServerlessSpec
+from datetime import datetime, timezone
 from tqdm import tqdm
 import os
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
 import numpy as np
 from dotenv import load_dotenv
 import chromadb
@@ -23,15 +28,48 @@ print(f"Loading .env from: {env_path}")
 load_dotenv(env_path)
 
 from config.settings import get_settings
+from core.storage.matryoshka import MatryoshkaConfig, truncate_embedding
+from core.storage.metadata_store import MetadataStoreBuilder, build_store_path, canonical_line_id, install_build_store
+from core.storage.dialog_storage import speaker_filter_metadata
+from core.storage.embedding_store import SyncPlan, get_embedding_store
+from core.storage.vector_export import ExportCheckpoint, StreamingExporter, iter_collection_pages
+from core.storage.index_registry import IndexRegistry, versioned_index_name
 
 class PineconeSetup:
     def __init__(self):
         self.settings = get_settings()
         self.verification_file = Path("migration_verification.json")
+        self.checkpoint_file = Path("pinecone_export_checkpoint.json")
         self.vector_store = Path(workspace_root) / "data" / "processed" / "vector_store"
         self.verified_clips: Set[str] = set()
-        self.index_name = os.getenv("PINECONE_INDEX", "chattng-dialogs")
+        self.index_name = os.getenv("PINECONE_INDEX", "chattng-dialogs")  # Alias search reads
+        self.target_index_name = self.index_name  # Physical index this run writes to
+        self.rebuild = False
+        self.index = None
+        self.coarse_index_name = None
+        self.registry = (
+            IndexRegistry(self.settings.pinecone_index_registry)
+            if self.settings.pinecone_index_registry else None
+        )
         self.dimension = 1536  # Using OpenAI's text-embedding-3-small model
+        self.matryoshka = MatryoshkaConfig.from_embedding_config(
+            (self.settings.search_config or {}).get("embeddings", {})
+        )
+        self.coarse_index = None
+        storage_config = (self.settings.search_config or {}).get("storage", {})
+        self.metadata_store_path = storage_config.get("metadata_store_path")
+        self.canonical = bool(storage_config.get("canonical_lines", False))
+        if self.canonical and not self.metadata_store_path:
+            print("Error: storage.canonical_lines needs storage.metadata_store_path to resolve occurrences")
+            sys.exit(1)
+        self.line_vectors: Dict[str, Dict] = {}  # Representative clip id -> canonical line id and metadata
+        self.cluster_speakers: Dict[str, List[str]] = {}  # Near-duplicate representative id -> cluster speakers
+        self.folded_ids: Set[str] = set()  # Near-duplicates served through their representative
+        self.mismatched_dimensions: List[Tuple[str, int]] = []  # (id, dimensions) of vectors not written
+        self.embedding_store = get_embedding_store(
+            storage_config.get("embedding_store_path") or str(self.vector_store / "embedding_store.sqlite")
+        )
+        self.embedding_model = (self.settings.search_config or {}).get("embeddings", {}).get("model", self.settings.openai_model)
         
         # Load verified clips
         if not self.verification_file.exists():
@@ -68,148 +106,385 @@ class PineconeSetup:
         self.collection = collections[0]
         print(f"\nUsing collection: {self.collection.name}")
 
-    def initialize_pinecone(self):
-        """Initialize Pinecone and create index"""
+    def initialize_pinecone(self, rebuild: bool = False, resume: bool = True, dry_run: bool = False):
+        """Connect to the index this run writes to.
+
+        Incremental runs write to the alias's active index (created if missing). A rebuild
+        creates a new versioned index side by side, leaving the live one serving queries
+        until promote() flips the alias. An interrupted rebuild resumes into the same version.
+        A dry run only resolves the index names; nothing is created.
+        """
         try:
             # Initialize Pinecone
             pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+            self.pc = pc
+            self.rebuild = rebuild
+            
+            if rebuild:
+                if self.registry is None:
+                    print("Error: --rebuild needs PINECONE_INDEX_REGISTRY so search can switch to the new build")
+                    sys.exit(1)
+                checkpoint = ExportCheckpoint(str(self.checkpoint_file)).load() if resume else None
+                pending = checkpoint["target"] if checkpoint else ""
+                if pending.startswith(f"{self.index_name}-v") and pending != self._resolve(self.index_name):
+                    self.target_index_name = pending
+                    print(f"\nResuming unfinished build {pending}")
+                else:
+                    self.target_index_name = versioned_index_name(self.index_name, datetime.now(timezone.utc))
+                if self.matryoshka.enabled:
+                    # Coarse builds share the main build's version suffix
+                    suffix = self.target_index_name[len(self.index_name):]
+                    self.coarse_index_name = f"{self.matryoshka.coarse_index}{suffix}"
+            else:
+                self.target_index_name = self._resolve(self.index_name)
+                if self.matryoshka.enabled:
+                    self.coarse_index_name = self._resolve(self.matryoshka.coarse_index)
+            
+            if dry_run:
+                print(f"\nDry run against Pinecone index: {self.target_index_name} (alias {self.index_name})")
+                return
             
-            # Delete existing index if it exists
-            if self.index_name in pc.list_indexes().names():
-                print(f"\nDeleting existing Pinecone index: {self.index_name}")
-                pc.delete_index(self.index_name)
-                print("Waiting for index deletion to complete...")
-                import time
-                time.sleep(10)  # Wait for deletion to complete
+            self.index = self._ensure_index(pc, self.target_index_name, self.dimension)
+            print(f"\nConnected to Pinecone index: {self.target_index_name} (alias {self.index_name})")
             
-            # Create new index
-            print(f"\nCreating fresh Pinecone index: {self.index_name}")
+            if self.matryoshka.enabled:
+                self.coarse_index = self._ensure_index(
+                    pc,
+                    self.coarse_index_name,
+                    self.matryoshka.coarse_dimensions
+                )
+            
+        except Exception as e:
+            print(f"Error initializing Pinecone: {str(e)}")
+            sys.exit(1)
+
+    def _resolve(self, alias: str) -> str:
+        return self.registry.resolve(alias) if self.registry is not None else alias
+
+    def _ensure_index(self, pc: Pinecone, name: str, dimension: int):
+        """Return a handle to an index, creating it if missing"""
+        if name not in pc.list_indexes().names():
+            print(f"\nCreating Pinecone index: {name} ({dimension} dims)")
             pc.create_index(
-                name=self.index_name,
-                dimension=self.dimension,
+                name=name,
+                dimension=dimension,
                 metric="cosine",
                 spec=ServerlessSpec(
                     cloud="aws",
                     region=os.getenv("AWS_DEFAULT_REGION", "us-east-1")
                 )
             )
-            
             print("Waiting for index to be ready...")
-            time.sleep(10)  # Wait for index to be ready
-            
-            # Connect to index
-            self.index = pc.Index(self.index_name)
-            print(f"\nConnected to fresh Pinecone index: {self.index_name}")
-            
-        except Exception as e:
-            print(f"Error initializing Pinecone: {str(e)}")
-            sys.exit(1)
+            while not pc.describe_index(name).status["ready"]:
+                time.sleep(2)
+        return pc.Index(name)
+
+    def validate_build(self, expected_count: int, samples: List[Dict], timeout: float = 300.0) -> bool:
+        """Check a fresh build holds every vector and answers sample queries before it goes live"""
+        indexes = [(self.target_index_name, self.index)]
+        if self.coarse_index is not None:
+            indexes.append((self.coarse_index_name, self.coarse_index))
+        
+        # Serverless indexes are eventually consistent, so wait for the counts to settle
+        deadline = time.monotonic() + timeout
+        for name, index in indexes:
+            count = index.describe_index_stats().total_vector_count
+            while count < expected_count and time.monotonic() < deadline:
+                time.sleep(5)
+                count = index.describe_index_stats().total_vector_count
+            print(f"{name}: {count}/{expected_count} vectors")
+            if count != expected_count:
+                print(f"Validation failed: {name} holds {count} vectors, expected {expected_count}")
+                return False
+        
+        # Each sampled vector must come back as (a duplicate of) its own nearest neighbour
+        failures = 0
+        for vector in samples:
+            results = self.index.query(vector=vector["values"], top_k=1)
+            if not results.matches or results.matches[0].score < 0.99:
+                failures += 1
+        print(f"Sample queries: {len(samples) - failures}/{len(samples)} returned their own vector")
+        if failures:
+            print("Validation failed: sample queries did not return their own vectors")
+            return False
+        return True
+
+    def promote(self, expected_count: int, keep: int = 3):
+        """Flip the alias to the validated build and drop versions beyond the newest `keep`"""
+        builds = [(self.index_name, self.target_index_name)]
+        if self.coarse_index_name:
+            builds.append((self.matryoshka.coarse_index, self.coarse_index_name))
+        for alias, name in builds:
+            self.registry.register(alias, name, expected_count)
+        # Coarse first, so the main alias never points at a build whose coarse index is missing
+        for alias, name in reversed(builds):
+            previous = self.registry.activate(alias, name)
+            print(f"\n{alias} -> {name} (previous: {previous})")
+            for removed in self.registry.prune(alias, keep):
+                print(f"Deleting old index version {removed}")
+                if removed in self.pc.list_indexes().names():
+                    self.pc.delete_index(removed)
+                if self.metadata_store_path:
+                    Path(build_store_path(self.metadata_store_path, removed)).unlink(missing_ok=True)
+        self._install_metadata_store(self.target_index_name)
+
+    def _install_metadata_store(self, build: str):
+        """Swap in the metadata store matching the build search now reads"""
+        if self.metadata_store_path and install_build_store(self.metadata_store_path, build):
+            print(f"Installed metadata store for {build} at {self.metadata_store_path}")
+
+    def _record_states(self, batch: List[Dict], states: Dict[str, str]):
+        """Remember which content each uploaded vector holds"""
+        self.embedding_store.set_states(self.target_index_name, [(vector["id"], states[vector["id"]]) for vector in batch])
 
-    def process_dialogs(self):
-        """Process dialog embeddings from ChromaDB for verified clips"""
+    def _upsert_batch(self, batch: List[Dict]):
+        """Upsert a batch of vectors, mirroring truncated copies into the coarse index"""
+        self.index.upsert(vectors=batch)
+        if self.coarse_index is not None:
+            self.coarse_index.upsert(vectors=[
+                {
+                    "id": vector["id"],
+                    "values": truncate_embedding(vector["values"], self.matryoshka.coarse_dimensions),
+                    "metadata": speaker_filter_metadata(vector["metadata"])
+                }
+                for vector in batch
+            ])
+
+    def _delete_vectors(self, ids: List[str], batch_size: int = 1000):
+        """Remove vectors whose dialogs no longer exist in ChromaDB"""
+        for i in range(0, len(ids), batch_size):
+            batch = ids[i:i + batch_size]
+            self.index.delete(ids=batch)
+            if self.coarse_index is not None:
+                self.coarse_index.delete(ids=batch)
+        self.embedding_store.delete_states(self.target_index_name, ids)
+
+    def _scan_collection(self, save: bool = True) -> Set[str]:
+        """Build the metadata store and collect every vector id in one pass that skips embeddings"""
+        metadata_builder = MetadataStoreBuilder()
+        all_ids: Set[str] = set()
+        for _, page in iter_collection_pages(self.collection, page_size=5000, include=['metadatas', 'documents']):
+            for id, document, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                metadata_builder.add(id, document, metadata)
+                all_ids.add(id)
+        metadata_store = metadata_builder.build()
+        if self.metadata_store_path and save:
+            # Saved beside the build; it replaces the live store only once the build is live
+            build_path = build_store_path(self.metadata_store_path, self.target_index_name)
+            metadata_store.save(build_path)
+            print(f"Saved metadata store for {len(all_ids)} clips to {build_path}")
+        
+        if not self.canonical:
+            return all_ids - self._fold_near_duplicates(metadata_store)
+        
+        # One vector per distinct line, embedded from its first clip and listing every speaker
+        self.line_vectors = {}
+        for line_id, text, speakers in metadata_store.iter_lines():
+            text_index = metadata_store.line_index(line_id)
+            occurrences = metadata_store.occurrences(text_index)
+            self.line_vectors[metadata_store.ids[int(occurrences[0])]] = {
+                "id": line_id,
+                "metadata": {"text": text, "speakers": speakers, "occurrence_count": len(occurrences)}
+            }
+        print(f"Collapsed {len(all_ids)} clips into {len(self.line_vectors)} canonical lines")
+        return {line["id"] for line in self.line_vectors.values()}
+
+    def _fold_near_duplicates(self, metadata_store) -> Set[str]:
+        """Ids marked duplicate_of by remove_chromadb_duplicates, which the metadata store resolves
+        through their representative; without a store every clip keeps its own vector"""
+        self.cluster_speakers, self.folded_ids = {}, set()
+        if not self.metadata_store_path:
+            return self.folded_ids
+        for index, clip_id in enumerate(metadata_store.ids):
+            if metadata_store.duplicate_of(index):
+                self.folded_ids.add(clip_id)
+                continue
+            members = metadata_store.group(index)
+            if len(members) > 1:
+                self.cluster_speakers[clip_id] = sorted(
+                    {metadata_store.speakers[i] for i in metadata_store.speaker_idx[members]}
+                )
+        if self.folded_ids:
+            print(f"Folded {len(self.folded_ids)} near-duplicate clips into {len(self.cluster_speakers)} representatives")
+        return self.folded_ids
+
+    def _vector_entry(self, id: str, document: str, metadata: Dict) -> Optional[Tuple[str, Dict]]:
+        """(vector id, metadata) a ChromaDB row contributes, or None when it folds into a canonical
+        line or a near-duplicate representative"""
+        if self.canonical:
+            # Only each line's representative clip contributes a vector
+            line = self.line_vectors.get(id)
+            return (line["id"], line["metadata"]) if line else None
+        if id in self.folded_ids:
+            return None
+        # Ensure text is included in metadata
+        metadata_with_text = {
+            **metadata,
+            "text": document  # Add the actual dialog text to metadata
+        }
+        if id in self.cluster_speakers:
+            # Character filters match a representative for any speaker in its cluster
+            metadata_with_text["speakers"] = self.cluster_speakers[id]
+        return id, metadata_with_text
+
+    def _page_vectors(self, page: Dict) -> Tuple[List[Dict], SyncPlan]:
+        """Vectors for one ChromaDB page that are new or changed since the last sync"""
+        vectors = []
+        planned = []
+        for embedding, metadata, document, id in zip(page['embeddings'], page['metadatas'], page['documents'], page['ids']):
+            entry = self._vector_entry(id, document, metadata)
+            if entry is None:
+                continue
+            if len(embedding) != self.dimension:
+                # Left unrecorded, so a later run retries it once the collection is re-embedded
+                self.mismatched_dimensions.append((id, len(embedding)))
+                continue
+            id, metadata_with_text = entry
+            vectors.append({
+                "id": id,
+                "values": [float(value) for value in embedding],
+                "metadata": metadata_with_text
+            })
+            planned.append((id, document, metadata_with_text))
+        
+        # Chroma's vectors are not cached in the embedding store: they come from the collection's
+        # own embedding model, not self.embedding_model, and would poison its content keys
+        plan = self.embedding_store.plan(self.target_index_name, planned, self.embedding_model, self.dimension)
+        upsert_ids = set(plan.upsert_ids)
+        return [vector for vector in vectors if vector["id"] in upsert_ids], plan
+
+    def process_dialogs(self, dry_run: bool = False, resume: bool = True) -> Tuple[int, List[Dict]]:
+        """Stream dialog embeddings from ChromaDB page by page, upserting only new or changed vectors.
+
+        Returns the number of vectors the index should hold and a sample of those uploaded.
+        """
         try:
-            # Get all embeddings and documents from ChromaDB
-            print("\nRetrieving data from ChromaDB...")
-            results = self.collection.get(
-                include=['embeddings', 'metadatas', 'documents']  # Explicitly include documents
-            )
+            print("\nScanning ChromaDB...")
+            all_ids = self._scan_collection(save=not dry_run)
+            print(f"\nFound {len(all_ids)} total entries")
+            stale_ids = [id for id in self.embedding_store.states(self.target_index_name) if id not in all_ids]
             
-            embeddings = results['embeddings']
-            metadatas = results['metadatas']
-            documents = results['documents']  # Get the actual text content
-            ids = results['ids']
+            if dry_run:
+                to_upsert = unchanged = 0
+                for _, page in iter_collection_pages(self.collection, include=['metadatas', 'documents']):
+                    planned = []
+                    for id, document, metadata in zip(page['ids'], page['documents'], page['metadatas']):
+                        entry = self._vector_entry(id, document, metadata)
+                        if entry is not None:
+                            planned.append((entry[0], document, entry[1]))
+                    plan = self.embedding_store.plan(self.target_index_name, planned, self.embedding_model, self.dimension)
+                    to_upsert += len(plan.upsert_ids)
+                    unchanged += len(plan.unchanged_ids)
+                print(f"\n{self.target_index_name}: {to_upsert} vectors to upsert, {unchanged} unchanged, {len(stale_ids)} to delete")
+                print("Dry run, no changes written")
+                return len(all_ids), []
             
-            print(f"\nFound {len(embeddings)} total entries")
+            if stale_ids:
+                print(f"\nDeleting {len(stale_ids)} vectors no longer in ChromaDB...")
+                self._delete_vectors(stale_ids)
             
-            # Process vectors in batches
-            batch_size = 100
-            total_vectors = 0
-            batch_vectors = []
+            states: Dict[str, str] = {}
+            samples: List[Dict] = []
+            seen = 0
+            sample_lock = threading.Lock()
             
-            print("\nPreparing vectors for Pinecone...")
-            for i, (embedding, metadata, document, id) in enumerate(zip(embeddings, metadatas, documents, ids)):
-                # Ensure text is included in metadata
-                metadata_with_text = {
-                    **metadata,
-                    "text": document  # Add the actual dialog text to metadata
-                }
-                
-                # Create vector entry
-                vector = {
-                    "id": id,
-                    "values": embedding,
-                    "metadata": metadata_with_text
-                }
-                
-                batch_vectors.append(vector)
-                
-                # Debug first few entries
-                if i < 5:
-                    print(f"\nProcessing entry {i+1}:")
-                    print(f"ID: {id}")
-                    print(f"Text: {document[:100]}...")
-                    print(f"Metadata keys: {list(metadata_with_text.keys())}")
-            
-            print(f"\nPrepared {len(batch_vectors)} vectors for upload")
-            
-            if batch_vectors:
-                print("\nUploading to Pinecone...")
-                try:
-                    # Upload first batch and verify
-                    first_batch = batch_vectors[:batch_size]
-                    print(f"\nUploading first batch ({len(first_batch)} vectors)...")
-                    self.index.upsert(vectors=first_batch)
-                    total_vectors += len(first_batch)
-                    
-                    # Wait a moment for consistency
-                    import time
-                    time.sleep(2)
-                    
-                    # Verify first vector
-                    first_id = first_batch[0]["id"]
-                    print(f"\nVerifying first vector (ID: {first_id})...")
-                    try:
-                        result = self.index.fetch(ids=[first_id])
-                        print(f"Fetch result: {result}")
-                        
-                        if result and hasattr(result, 'vectors') and first_id in result.vectors:
-                            vector = result.vectors[first_id]
-                            if hasattr(vector, 'metadata') and 'text' in vector.metadata:
-                                stored_text = vector.metadata['text']
-                                print(f"Successfully verified text storage: {stored_text[:100]}...")
-                            else:
-                                print("Warning: Vector found but no text in metadata!")
-                                print(f"Available metadata: {vector.metadata if hasattr(vector, 'metadata') else 'None'}")
-                        else:
-                            print("Warning: Could not find vector in fetch result!")
-                            print(f"Full result: {result}")
-                    except Exception as e:
-                        print(f"Error during verification: {str(e)}")
-                        print("Continuing with upload anyway...")
-                    
-                    # Upload remaining batches
-                    remaining_vectors = batch_vectors[batch_size:]
-                    if remaining_vectors:
-                        print("\nUploading remaining vectors...")
-                        for i in tqdm(range(0, len(remaining_vectors), batch_size), desc="Processing batches"):
-                            batch = remaining_vectors[i:i + batch_size]
-                            self.index.upsert(vectors=batch)
-                            total_vectors += len(batch)
-                    
-                except Exception as e:
-                    print(f"Error during batch upload: {str(e)}")
-                    raise
-            
-            print(f"\nSuccessfully processed {total_vectors} dialog vectors")
+            def transform(page: Dict) -> List[Dict]:
+                vectors, plan = self._page_vectors(page)
+                with sample_lock:
+                    states.update({vector["id"]: plan.states[vector["id"]] for vector in vectors})
+                return vectors
+            
+            def upsert(batch: List[Dict]):
+                nonlocal seen
+                self._upsert_batch(batch)
+                with sample_lock:
+                    batch_states = [(vector["id"], states.pop(vector["id"])) for vector in batch]
+                    # Reservoir sample of uploaded vectors for validation
+                    for vector in batch:
+                        seen += 1
+                        if len(samples) < 20:
+                            samples.append(vector)
+                        elif random.randrange(seen) < 20:
+                            samples[random.randrange(20)] = vector
+                self.embedding_store.set_states(self.target_index_name, batch_states)
+            
+            print("\nUploading to Pinecone...")
+            exporter = StreamingExporter(upsert, transform, page_size=500, batch_size=100, max_workers=4)
+            checkpoint = ExportCheckpoint(str(self.checkpoint_file))
+            if not resume:
+                checkpoint.clear()
+            report = exporter.run(self.collection, self.target_index_name, checkpoint)
+            print(f"\n{report.summary()}")
+            checkpoint.clear()
+            if self.mismatched_dimensions:
+                found = sorted({dimensions for _, dimensions in self.mismatched_dimensions})
+                print(
+                    f"Warning: skipped {len(self.mismatched_dimensions)} vectors with {found} dimensions "
+                    f"(index expects {self.dimension}); re-embed them with {self.embedding_model}"
+                )
+            
+            # Spot-check a few uploaded vectors in a single fetch
+            if samples:
+                sample_ids = [vector["id"] for vector in samples]
+                fetched = self.index.fetch(ids=sample_ids).vectors
+                missing = [id for id in sample_ids if id not in fetched or 'text' not in fetched[id].metadata]
+                print(f"Verified {len(sample_ids) - len(missing)}/{len(sample_ids)} sampled vectors")
+            
+            print(f"\nSuccessfully processed {report.vectors} dialog vectors")
+            if not self.rebuild:
+                # Incremental syncs write to the live index, which now matches the new store
+                self._install_metadata_store(self.target_index_name)
+            return len(all_ids), samples
             
         except Exception as e:
             print(f"Error processing vectors: {str(e)}")
             sys.exit(1)
 
+def rollback(alias: str):
+    """Point alias (and its coarse index, if any) back at the previous build"""
+    settings = get_settings()
+    if not settings.pinecone_index_registry:
+        print("Error: rollback needs PINECONE_INDEX_REGISTRY")
+        sys.exit(1)
+    registry = IndexRegistry(settings.pinecone_index_registry)
+    matryoshka = MatryoshkaConfig.from_embedding_config((settings.search_config or {}).get("embeddings", {}))
+    aliases = [alias] + ([matryoshka.coarse_index] if matryoshka.enabled else [])
+    metadata_store_path = (settings.search_config or {}).get("storage", {}).get("metadata_store_path")
+    for name in aliases:
+        try:
+            target = registry.rollback(name)
+        except ValueError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+        print(f"{name} -> {target}")
+        if name == alias and metadata_store_path:
+            if install_build_store(metadata_store_path, target):
+                print(f"Restored metadata store for {target} at {metadata_store_path}")
+            else:
+                print(f"Warning: no metadata store saved for {target}; {metadata_store_path} still matches the newer build")
+
 def main():
+    parser = argparse.ArgumentParser(description="Sync dialog vectors from ChromaDB to Pinecone")
+    parser.add_argument("--rebuild", action="store_true", help="Build a new index version side by side and switch search to it once validated")
+    parser.add_argument("--keep", type=int, default=3, help="Index versions to keep for rollback after a rebuild")
+    parser.add_argument("--rollback", action="store_true", help="Switch search back to the previous index version")
+    parser.add_argument("--dry-run", action="store_true", help="Report what would be uploaded or deleted without writing")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore the export checkpoint and start from the first row")
+    args = parser.parse_args()
+    
+    if args.rollback:
+        rollback(os.getenv("PINECONE_INDEX", "chattng-dialogs"))
+        return
+    
     setup = PineconeSetup()
-    setup.initialize_pinecone()
-    setup.process_dialogs()
+    setup.initialize_pinecone(rebuild=args.rebuild, resume=not args.no_resume, dry_run=args.dry_run)
+    expected_count, samples = setup.process_dialogs(dry_run=args.dry_run, resume=not args.no_resume)
+    
+    if args.rebuild and not args.dry_run:
+        if not setup.validate_build(expected_count, samples):
+            print(f"\nLeaving {setup.index_name} on its current version; {setup.target_index_name} was not promoted")
+            sys.exit(1)
+        setup.promote(expected_count, keep=args.keep)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
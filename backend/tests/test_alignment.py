@@ -0,0 +1,91 @@
+import sys
+import json
+from pathlib import Path
+
+import nltk
+import pysrt
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.alignment import BandedAligner
+from backend.core.extraction.dialog_matcher import DialogMatcher
+from backend.core.extraction.script_parser import ScriptParser
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "alignment"
+
+def load_episode():
+    segments = ScriptParser().parse_script(str(FIXTURE_DIR / "episode.txt"))
+    subtitles = pysrt.open(str(FIXTURE_DIR / "episode.srt"))
+    with open(FIXTURE_DIR / "golden.json") as f:
+        golden = {int(position): span for position, span in json.load(f)["segments"].items()}
+    return segments, subtitles, golden
+
+def span_of(group):
+    """First and last SRT index of a matched subtitle group"""
+    return [group[0].index, group[-1].index] if group else None
+
+def correct_matches(spans, golden):
+    return sum(1 for position, span in enumerate(spans) if span == golden.get(position))
+
+def banded_spans(matcher, segments):
+    aligner = BandedAligner(matcher.cleaned_subtitles, matcher.clean_text)
+    return [
+        span_of(aligner.to_match(segment.text, candidate)['subtitle_group']) if candidate else None
+        for segment, candidate in zip(segments, aligner.align([segment.text for segment in segments]))
+    ]
+
+def test_banded_alignment_matches_golden():
+    segments, subtitles, golden = load_episode()
+    spans = banded_spans(DialogMatcher(segments, subtitles), segments)
+    assert correct_matches(spans, golden) == len(segments)
+
+def test_banded_matches_exhaustive_quality():
+    # Speed against the exhaustive engine is checked by scripts/benchmark_matcher.py
+    segments, subtitles, golden = load_episode()
+    matcher = DialogMatcher(segments, subtitles, engine='exhaustive')
+    exhaustive = [matcher._find_best_match(segment.text, segment.position) for segment in segments]
+    banded = banded_spans(matcher, segments)
+
+    exhaustive_spans = [span_of(match['subtitle_group']) if match else None for match in exhaustive]
+    assert correct_matches(banded, golden) >= correct_matches(exhaustive_spans, golden)
+
+def test_repeated_short_lines_match_distinct_subtitles():
+    segments, subtitles, _ = load_episode()
+    spans = banded_spans(DialogMatcher(segments, subtitles), segments)
+    for line in ("Yes, Captain.", "Understood.", "Yes."):
+        repeated = [spans[i] for i, segment in enumerate(segments) if segment.text == line]
+        assert len(repeated) > 1
+        assert len({tuple(span) for span in repeated}) == len(repeated)
+
+def test_multi_speaker_and_cut_lines_stay_unmatched():
+    segments, subtitles, golden = load_episode()
+    spans = banded_spans(DialogMatcher(segments, subtitles), segments)
+    unmatched = [i for i in range(len(segments)) if i not in golden]
+    assert unmatched
+    assert all(spans[i] is None for i in unmatched)
+
+def test_unknown_engine_is_rejected():
+    segments, subtitles, _ = load_episode()
+    with pytest.raises(ValueError):
+        DialogMatcher(segments, subtitles, engine='greedy')
+
+def test_match_dialog_returns_complete_and_sentence_matches():
+    try:
+        nltk.sent_tokenize("One. Two.")
+    except LookupError:
+        pytest.skip("NLTK punkt data is not installed")
+    segments, subtitles, golden = load_episode()
+    results = DialogMatcher(segments, subtitles).match_dialog()
+    assert sum(1 for result in results if result['complete']) == len(golden)
+    split = [result for result in results if len(result['sentences']) > 1]
+    assert split
+    for result in split:
+        first, last = span_of(result['complete']['subtitle_group'])
+        for sentence in result['sentences']:
+            assert first <= sentence['subtitle_group'][0].index <= last
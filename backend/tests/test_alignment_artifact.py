@@ -0,0 +1,96 @@
+import sys
+import shutil
+from pathlib import Path
+
+import pysrt
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.alignment_artifact import AlignmentStore, read_alignment, write_alignment
+from backend.core.extraction.dialog_matcher import DialogMatcher
+from backend.core.extraction.script_parser import ScriptParser
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "alignment"
+
+@pytest.fixture(scope="module")
+def matched():
+    """Complete matches for the fixture episode, plus the first line of each as a sentence match"""
+    segments = ScriptParser().parse_script(str(FIXTURE_DIR / "episode.txt"))
+    subtitles = pysrt.open(str(FIXTURE_DIR / "episode.srt"))
+    matcher = DialogMatcher(segments, subtitles)
+    results = []
+    for segment in segments:
+        complete = matcher._find_best_match(segment.text, segment.position)
+        sentence = matcher._find_best_match(segment.text.split('.')[0], segment.position)
+        if complete or sentence:
+            results.append({
+                'complete': complete,
+                'sentences': [sentence] if sentence else [],
+                'speaker': matcher.normalize_speaker(segment.speaker),
+                'text': segment.text,
+                'scene_info': segment.scene_info
+            })
+    return subtitles, results
+
+def assert_same_match(restored, original, with_groups=True):
+    if original is None:
+        assert restored is None
+        return
+    for key in ('text', 'subtitle_text', 'start_time', 'end_time', 'match_ratio'):
+        assert restored[key] == original[key]
+    if with_groups:
+        assert restored['subtitle_group'] == original['subtitle_group']
+
+def test_round_trip(tmp_path, matched):
+    subtitles, results = matched
+    path = tmp_path / "S01E01.jsonl"
+    write_alignment(path, results, subtitles, {"episode": "S01E01"})
+    header, restored = read_alignment(path, subtitles)
+    assert header["episode"] == "S01E01" and header["segments"] == len(results)
+    assert len(restored) == len(results)
+    for segment, original in zip(restored, results):
+        assert (segment['speaker'], segment['text'], segment['scene_info']) == \
+            (original['speaker'], original['text'], original['scene_info'])
+        assert_same_match(segment['complete'], original['complete'])
+        assert len(segment['sentences']) == len(original['sentences'])
+        for restored_match, original_match in zip(segment['sentences'], original['sentences']):
+            assert_same_match(restored_match, original_match)
+
+def test_reading_without_subtitles_keeps_times_and_texts(tmp_path, matched):
+    subtitles, results = matched
+    path = tmp_path / "S01E01.jsonl"
+    write_alignment(path, results, subtitles, {})
+    _, restored = read_alignment(path)
+    for segment, original in zip(restored, results):
+        assert_same_match(segment['complete'], original['complete'], with_groups=False)
+        assert segment['complete'] is None or segment['complete']['subtitle_group'] == []
+
+def test_store_is_keyed_by_inputs(tmp_path, matched):
+    subtitles, results = matched
+    script, srt = tmp_path / "S01E01.txt", tmp_path / "S01E01.srt"
+    shutil.copy(FIXTURE_DIR / "episode.txt", script)
+    shutil.copy(FIXTURE_DIR / "episode.srt", srt)
+    store = AlignmentStore(tmp_path / "alignments")
+    key = store.key_for(script, srt, 'banded')
+    assert store.load("S01E01", key) is None
+    store.save("S01E01", key, results, subtitles, engine='banded')
+    assert len(store.load("S01E01", key, subtitles)) == len(results)
+
+    assert store.key_for(script, srt, 'exhaustive') != key
+    script.write_text(script.read_text() + "\nHALE\nOne more line.\n")
+    changed = store.key_for(script, srt, 'banded')
+    assert changed != key and store.load("S01E01", changed) is None
+
+def test_truncated_alignments_are_ignored(tmp_path, matched):
+    subtitles, results = matched
+    store = AlignmentStore(tmp_path)
+    path = store.save("S01E01", "0" * 64, results, subtitles)
+    lines = path.read_text().splitlines(keepends=True)
+    path.write_text(''.join(lines[:-3]))
+    assert store.load("S01E01", "0" * 64) is None
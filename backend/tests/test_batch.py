@@ -0,0 +1,70 @@
+import sys
+import os
+import json
+import time
+from pathlib import Path
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.utils.batch import TaskResult, input_signature, is_fresh, run_batch, write_stamp
+
+def make_files(tmp_path):
+    video, output = tmp_path / "S01E01.mkv", tmp_path / "S01E01.srt"
+    video.write_bytes(b"video")
+    output.write_text("1\n00:00:01,000 --> 00:00:02,000\nEngage.\n")
+    return video, output
+
+def test_stamped_output_is_fresh_until_inputs_change(tmp_path):
+    video, output = make_files(tmp_path)
+    write_stamp(output, input_signature([video], codec='srt'))
+    assert is_fresh(output, input_signature([video], codec='srt'))
+    assert not is_fresh(output, input_signature([video], codec='ass'))
+    video.write_bytes(b"re-encoded video")
+    assert not is_fresh(output, input_signature([video], codec='srt'))
+
+def test_unstamped_output_is_fresh_only_when_newer(tmp_path):
+    video, output = make_files(tmp_path)
+    old = time.time() - 100
+    os.utime(output, (old, old))
+    assert not is_fresh(output, input_signature([video]))
+    os.utime(video, (old - 100, old - 100))
+    assert is_fresh(output, input_signature([video]))
+    # The check stamps the output, so a later touch of the video is noticed
+    assert (tmp_path / ".S01E01.srt.stamp").exists()
+    os.utime(video, None)
+    assert not is_fresh(output, input_signature([video]))
+
+def test_missing_or_empty_output_is_stale(tmp_path):
+    video, output = make_files(tmp_path)
+    signature = input_signature([video])
+    assert not is_fresh(tmp_path / "S01E02.srt", signature)
+    write_stamp(output, signature)
+    output.write_text("")
+    assert not is_fresh(output, signature)
+
+def test_batch_reports_every_episode(tmp_path):
+    def task(code):
+        if code == "S01E02":
+            raise RuntimeError("alass crashed")
+        time.sleep(0.2)
+        return TaskResult(episode=code, status='fresh' if code == "S01E03" else 'done')
+
+    started = time.perf_counter()
+    report = run_batch(["S01E01", "S01E02", "S01E03", "S01E04"], task, workers=4)
+    # Episodes run concurrently
+    assert time.perf_counter() - started < 0.6
+    assert [r.status for r in report.results] == ['done', 'failed', 'fresh', 'done']
+    assert report.failures[0].episode == "S01E02"
+    assert report.failures[0].error == "RuntimeError: alass crashed"
+    assert all(r.seconds > 0 for r in report.results)
+    assert "2 done, 1 up to date, 0 skipped, 1 failed" in report.summary()
+
+    report.write_json(tmp_path / "report.json")
+    data = json.loads((tmp_path / "report.json").read_text())
+    assert data["counts"] == {"done": 2, "fresh": 1, "skipped": 0, "failed": 1}
+    assert data["results"][1]["error"] == "RuntimeError: alass crashed"
@@ -0,0 +1,130 @@
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.storage.dialog_storage import DialogStorage
+from backend.core.storage.matryoshka import MatryoshkaConfig
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, model, input, encoding_format):
+        self.calls.append(list(input))
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text)), 1.0]) for text in input])
+
+class FakeIndex:
+    """In-memory stand-in for a Pinecone index"""
+
+    def __init__(self, fail_ids=()):
+        self.vectors = {}
+        self.upsert_calls = 0
+        self.fetch_calls = 0
+        self.fail_ids = set(fail_ids)
+        self.lock = threading.Lock()
+
+    def upsert(self, vectors):
+        if any(vector["id"] in self.fail_ids for vector in vectors):
+            raise RuntimeError("upsert rejected")
+        with self.lock:
+            self.upsert_calls += 1
+            for vector in vectors:
+                self.vectors[vector["id"]] = SimpleNamespace(
+                    id=vector["id"], values=vector["values"], metadata=vector["metadata"]
+                )
+
+    def fetch(self, ids):
+        self.fetch_calls += 1
+        return SimpleNamespace(vectors={i: self.vectors[i] for i in ids if i in self.vectors})
+
+def make_storage(index):
+    storage = DialogStorage.__new__(DialogStorage)
+    storage.embedding_config = {"model": "test-model"}
+    storage.matryoshka = MatryoshkaConfig()
+    storage.index = index
+    storage.coarse_index = None
+    storage.embedding_store = None
+    storage.metadata_store = None
+    storage.metadata_store_path = None
+    storage.index_name = "test-index"
+    storage.canonical = False
+    storage.embedding_client = SimpleNamespace(embeddings=FakeEmbeddings())
+    return storage
+
+def make_dialogs(count):
+    return [
+        (f"S01E01_clip_{i:04d}", "Engage." if i % 2 else f"Line {i}.", {"speaker": "PICARD", "season": 1})
+        for i in range(count)
+    ]
+
+def test_bulk_ingest_batches_requests():
+    index = FakeIndex()
+    storage = make_storage(index)
+    report = storage.add_dialogs(make_dialogs(450), embed_batch_size=100, upsert_batch_size=200, verify_sample=20)
+
+    assert report.ok
+    assert report.upserted == 450
+    assert len(index.vectors) == 450
+    # 225 distinct lines at 100 per request; 450 vectors at 200 per upsert; one verification fetch
+    assert report.embedding_requests == 3
+    assert index.upsert_calls == 3
+    assert index.fetch_calls == 1
+    assert report.verified == 20
+    assert index.vectors["S01E01_clip_0001"].metadata["text"] == "Engage."
+
+def test_failed_upsert_batches_are_reported():
+    index = FakeIndex(fail_ids={"S01E01_clip_0005"})
+    report = make_storage(index).add_dialogs(make_dialogs(30), upsert_batch_size=10)
+
+    assert not report.ok
+    assert report.upserted == 20
+    assert sorted(report.failed_ids) == [f"S01E01_clip_{i:04d}" for i in range(10)]
+    assert report.verify_missing == []
+
+def test_embedding_store_skips_unchanged_dialogs(tmp_path):
+    from backend.core.storage.embedding_store import EmbeddingStore
+
+    index = FakeIndex()
+    storage = make_storage(index)
+    storage.index_name = "test-index"
+    storage.embedding_store = EmbeddingStore(str(tmp_path / "embeddings.sqlite"))
+    dialogs = make_dialogs(10)
+    storage.add_dialogs(dialogs)
+    embedded = sum(len(call) for call in storage.embedding_client.embeddings.calls)
+
+    dialogs[0] = (dialogs[0][0], "Line zero, revised.", dialogs[0][2])
+    report = storage.add_dialogs(dialogs)
+
+    assert embedded == 6
+    assert storage.embedding_client.embeddings.calls[-1] == ["Line zero, revised."]
+    assert report.upserted == 1
+    assert report.unchanged == 9
+    assert index.vectors["S01E01_clip_0000"].metadata["text"] == "Line zero, revised."
+
+def test_ingested_clips_reach_the_metadata_store(tmp_path):
+    from backend.core.storage.metadata_store import MetadataStore, build_store_path
+
+    index = FakeIndex(fail_ids={"S01E01_clip_0012"})
+    storage = make_storage(index)
+    storage.metadata_store_path = str(tmp_path / "metadata.npz")
+    storage.add_dialogs(make_dialogs(10))
+    assert len(storage.metadata_store) == 10
+    # A later episode is added alongside, and failed upserts are left out
+    later = [(f"S01E01_clip_{i:04d}", f"Later line {i}.", {"speaker": "RIKER", "season": 1}) for i in range(8, 16)]
+    storage.add_dialogs(later, upsert_batch_size=1)
+
+    store = storage.metadata_store
+    assert len(store) == 15 and len(MetadataStore.load(storage.metadata_store_path)) == 15
+    text, record = store.join([("S01E01_clip_0009", 0.8)])[0]
+    assert (text, record["speaker"]) == ("Later line 9.", "RIKER")
+    assert store.join([("S01E01_clip_0012", 0.8)]) == []
+    # The copy for the index the clips went to matches the live store
+    assert Path(build_store_path(storage.metadata_store_path, "test-index")).exists()
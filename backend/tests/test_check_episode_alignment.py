@@ -0,0 +1,77 @@
+import sys
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.utils.check_episode_alignment import (
+    detect_silences, parse_duration, parse_silences, score_episode, score_interval, speech_intervals
+)
+
+SILENCEDETECT_OUTPUT = """
+[silencedetect @ 0x55d5c8] silence_start: 0
+[silencedetect @ 0x55d5c8] silence_end: 1.5 | silence_duration: 1.5
+[silencedetect @ 0x55d5c8] silence_start: 4.25
+[silencedetect @ 0x55d5c8] silence_end: 6.0 | silence_duration: 1.75
+[silencedetect @ 0x55d5c8] silence_start: 9.5
+size=N/A time=00:00:05.00 bitrate=N/A speed= 500x
+size=N/A time=00:00:10.00 bitrate=N/A speed= 512x
+"""
+
+# Lines spoken at 1.5-4.25s and 6.0-9.5s
+SPEECH = [(1.5, 4.25), (6.0, 9.5)]
+
+def test_parse_silencedetect_output():
+    silences = parse_silences(SILENCEDETECT_OUTPUT)
+    assert silences == [(0.0, 1.5), (4.25, 6.0), (9.5, float('inf'))]
+    assert parse_duration(SILENCEDETECT_OUTPUT) == 10.0
+    assert speech_intervals(silences, 10.0) == SPEECH
+
+def test_interval_scores():
+    onsets = [start for start, _ in SPEECH]
+    aligned = score_interval(1.6, 4.0, SPEECH, onsets)
+    assert aligned.overlap == pytest.approx(1.0)
+    assert aligned.offset == pytest.approx(-0.1)
+    late = score_interval(4.5, 6.5, SPEECH, onsets)
+    assert late.overlap == pytest.approx(0.25)
+    assert late.offset == pytest.approx(1.5)
+    assert score_interval(20.0, 21.0, SPEECH, onsets).offset is None
+
+def test_shifted_episodes_are_flagged():
+    # Ten lines, each spoken for two seconds with a second of silence in between
+    speech = [(3.0 * i, 3.0 * i + 2.0) for i in range(10)]
+    aligned = score_episode("S01E01", [(s + 0.1, e - 0.1) for s, e in speech], speech)
+    assert not aligned.flagged
+    assert aligned.median_offset == pytest.approx(-0.1)
+    shifted = score_episode("S01E02", [(s + 1.2, e + 1.2) for s, e in speech], speech)
+    assert shifted.flagged
+    assert shifted.median_overlap == pytest.approx(0.5)
+    assert shifted.median_offset == pytest.approx(-1.2)
+    assert any("offset" in reason for reason in shifted.reasons)
+    assert score_episode("S01E03", [], speech).flagged
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="ffmpeg is not installed")
+def test_detects_speech_in_audio(tmp_path):
+    audio = tmp_path / "episode.mka"
+    # One second of tone, one of silence, one of tone
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=1",
+        "-f", "lavfi", "-i", "anullsrc=r=44100:cl=mono:d=1",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=1",
+        "-filter_complex", "[0][1][2]concat=n=3:v=0:a=1", str(audio)
+    ], check=True)
+    silences, duration = detect_silences(audio)
+    assert duration == pytest.approx(3.0, abs=0.1)
+    speech = speech_intervals(silences, duration)
+    assert len(speech) == 2
+    assert speech[0][1] == pytest.approx(1.0, abs=0.05)
+    assert speech[1][0] == pytest.approx(2.0, abs=0.05)
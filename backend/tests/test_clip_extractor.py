@@ -0,0 +1,113 @@
+import sys
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.clip_extractor import (
+    ClipExtractor, ClipSpec, build_chunk_command, is_web_copyable, plan_chunks, run_with_cpu_time, snap_to_keyframes
+)
+
+KEYFRAMES = [0.0, 2.0, 4.1, 6.0, 8.0]
+
+def make_clips(*ranges):
+    return [
+        ClipSpec(output_path=f"/tmp/clip_{i}.mp4", start=start, end=end, group_id=str(i))
+        for i, (start, end) in enumerate(ranges)
+    ]
+
+def test_snap_marks_clips_just_after_a_keyframe_for_copy():
+    clips = make_clips((4.2, 5.0), (5.0, 6.5), (0.0, 1.0))
+    snap_to_keyframes(clips, KEYFRAMES)
+    assert (clips[0].copy, clips[0].start) == (True, 4.1)
+    assert (clips[1].copy, clips[1].start) == (False, 5.0)
+    assert (clips[2].copy, clips[2].start) == (True, 0.0)
+
+def test_plan_chunks_limits_span_and_outputs():
+    clips = make_clips((8.5, 9.0), (0.5, 1.5), (1.0, 2.5), (2.5, 3.0), (6.5, 7.5))
+    chunks = plan_chunks(clips, KEYFRAMES, max_chunk_seconds=5.0, max_outputs=3)
+    assert [[clip.group_id for clip in chunk.clips] for chunk in chunks] == [["1", "2", "3"], ["4", "0"]]
+    # Chunks start on the keyframe before their first clip and cover their last clip
+    assert [(chunk.start, chunk.end) for chunk in chunks] == [(0.0, 3.0), (6.0, 9.0)]
+
+def test_chunk_command_decodes_once_for_all_outputs():
+    clips = make_clips((4.2, 5.0), (5.5, 7.0))
+    snap_to_keyframes(clips, KEYFRAMES)
+    chunk = plan_chunks(clips, KEYFRAMES)[0]
+    cmd = build_chunk_command("episode.mkv", chunk)
+    assert cmd.count("-i") == 1
+    assert cmd[cmd.index("-i") - 4:cmd.index("-i")] == ["-ss", "4.100", "-t", "2.900"]
+    first, second = cmd.index("/tmp/clip_0.mp4"), cmd.index("/tmp/clip_1.mp4")
+    copied, encoded = cmd[cmd.index("-i") + 2:first], cmd[first + 1:second]
+    assert ["-c:v", "copy"] == copied[copied.index("-c:v"):copied.index("-c:v") + 2]
+    assert copied[copied.index("-ss") + 1] == "0.000"
+    assert "libx264" in encoded
+    assert encoded[encoded.index("-ss") + 1:encoded.index("-ss") + 4] == ["1.400", "-t", "1.500"]
+
+def test_every_output_gets_the_web_profile():
+    clips = make_clips((4.2, 5.0), (5.5, 7.0))
+    snap_to_keyframes(clips, KEYFRAMES)
+    cmd = build_chunk_command("episode.mkv", plan_chunks(clips, KEYFRAMES)[0])
+    first, second = cmd.index("/tmp/clip_0.mp4"), cmd.index("/tmp/clip_1.mp4")
+    for args in (cmd[:first], cmd[first:second]):
+        output_args = args[len(args) - args[::-1].index("-map"):]
+        assert output_args[output_args.index("-c:a") + 1] == "aac"
+        assert output_args[output_args.index("-ar") + 1] == "44100"
+        assert output_args[output_args.index("-ac") + 1] == "2"
+        assert output_args[output_args.index("-af") + 1].startswith("loudnorm")
+        assert output_args[output_args.index("-movflags") + 1] == "+faststart"
+    encoded = cmd[first:second]
+    assert encoded[encoded.index("-pix_fmt") + 1] == "yuv420p"
+
+def test_only_web_ready_h264_is_copied():
+    assert is_web_copyable({"codec_name": "h264", "pix_fmt": "yuv420p", "profile": "High"})
+    assert not is_web_copyable({"codec_name": "hevc", "pix_fmt": "yuv420p"})
+    assert not is_web_copyable({"codec_name": "h264", "pix_fmt": "yuv420p10le"})
+    assert not is_web_copyable({})
+
+def test_cpu_time_counts_only_the_measured_child():
+    from concurrent.futures import ThreadPoolExecutor
+
+    busy = [sys.executable, '-c', 'import time\nend = time.process_time() + 0.5\nwhile time.process_time() < end: pass']
+    idle = [sys.executable, '-c', 'import sys, time; time.sleep(0.3); sys.stderr.write("done"); sys.exit(3)']
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        busy_run = executor.submit(run_with_cpu_time, busy)
+        returncode, stderr, idle_cpu = run_with_cpu_time(idle)
+        _, _, busy_cpu = busy_run.result()
+    assert (returncode, stderr) == (3, "done")
+    assert busy_cpu >= 0.5
+    # The busy child running alongside is not charged to the idle one
+    assert idle_cpu < 0.3
+
+@pytest.mark.skipif(not shutil.which("ffmpeg") or not shutil.which("ffprobe"), reason="ffmpeg is not installed")
+def test_extracts_every_clip_from_one_invocation(tmp_path):
+    video = tmp_path / "episode.mp4"
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "lavfi", "-i", "testsrc=duration=10:size=320x240:rate=25",
+        "-f", "lavfi", "-i", "sine=frequency=440:duration=10",
+        "-c:v", "libx264", "-pix_fmt", "yuv420p", "-g", "25", "-c:a", "aac", "-shortest", str(video)
+    ], check=True)
+    clips = [
+        ClipSpec(output_path=str(tmp_path / f"clip_{i}.mp4"), start=start, end=end, group_id=str(i))
+        for i, (start, end) in enumerate([(1.0, 2.0), (3.3, 4.5), (7.05, 8.0)])
+    ]
+    report = ClipExtractor().extract(str(video), clips)
+    assert report.failed_ids == []
+    assert report.invocations == 1
+    assert report.copied == 2  # Clips starting at most 0.25s after a keyframe
+    assert all(Path(clip.output_path).stat().st_size > 0 for clip in clips)
+    assert all(Path(clip.output_path).with_suffix(".srt").exists() for clip in clips)
+    probe = subprocess.run([
+        "ffprobe", "-v", "error", "-select_streams", "a:0",
+        "-show_entries", "stream=codec_name,channels,sample_rate", "-of", "csv=p=0", clips[1].output_path
+    ], capture_output=True, text=True, check=True)
+    assert probe.stdout.strip() == "aac,44100,2"
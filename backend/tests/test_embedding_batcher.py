@@ -0,0 +1,83 @@
+import sys
+import threading
+from pathlib import Path
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.search.embedding_batcher import EmbeddingBatcher
+
+class FakeEmbeddings:
+    """Stands in for client.embeddings, embedding each text as [len(text)]"""
+
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def create(self, model, input, encoding_format):
+        with self.lock:
+            self.calls.append(list(input))
+        if self.fail:
+            raise RuntimeError("rate limited")
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text))]) for text in input])
+
+def make_batcher(**kwargs):
+    embeddings = FakeEmbeddings(fail=kwargs.pop("fail", False))
+    return EmbeddingBatcher(SimpleNamespace(embeddings=embeddings), "test-model", **kwargs), embeddings
+
+def test_concurrent_requests_share_one_call():
+    batcher, embeddings = make_batcher(max_batch_size=16, max_delay_ms=200)
+    texts = ["Engage.", "Make it so.", "Engage.", "Red alert."]
+    with ThreadPoolExecutor(max_workers=len(texts)) as executor:
+        results = list(executor.map(batcher.embed, texts))
+    batcher.close()
+
+    assert results == [[7.0], [11.0], [7.0], [10.0]]
+    assert len(embeddings.calls) == 1
+    # Duplicate texts are sent once
+    assert sorted(embeddings.calls[0]) == ["Engage.", "Make it so.", "Red alert."]
+    assert batcher.stats()["requests"] == 4
+
+def test_batch_size_cap_splits_calls():
+    batcher, embeddings = make_batcher(max_batch_size=2, max_delay_ms=200)
+    futures = [batcher.submit(f"line {i}") for i in range(5)]
+    assert [future.result() for future in futures] == [[6.0]] * 5
+    batcher.close()
+    assert [len(call) for call in embeddings.calls] == [2, 2, 1]
+
+def test_errors_propagate_to_every_caller():
+    batcher, _ = make_batcher(max_delay_ms=1, fail=True)
+    with pytest.raises(RuntimeError):
+        batcher.embed("Shields up.")
+    batcher.close()
+    assert batcher.stats()["errors"] == 1
+
+def test_short_responses_fail_the_batch_not_the_thread():
+    batcher, embeddings = make_batcher(max_delay_ms=1)
+    create = embeddings.create
+    embeddings.create = lambda model, input, encoding_format: SimpleNamespace(data=[])
+    with pytest.raises(ValueError):
+        batcher.embed("Shields up.")
+    # The batcher thread is still serving requests
+    embeddings.create = create
+    assert batcher.embed("Engage.") == [7.0]
+    batcher.close()
+
+def test_timed_out_requests_are_dropped_from_their_batch():
+    from concurrent.futures import TimeoutError as FutureTimeoutError
+
+    batcher, embeddings = make_batcher(max_delay_ms=300)
+    with pytest.raises(FutureTimeoutError):
+        batcher.embed("Red alert.", timeout=0.01)
+    assert batcher.embed("Engage.") == [7.0]
+    batcher.close()
+    assert embeddings.calls == [["Engage."]]
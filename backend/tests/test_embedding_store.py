@@ -0,0 +1,69 @@
+import sys
+from pathlib import Path
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.storage.embedding_store import EmbeddingStore, content_key
+
+MODEL = "text-embedding-3-small"
+
+DIALOGS = [
+    ("clip_0001", "Make it so.", {"speaker": "PICARD"}),
+    ("clip_0002", "Engage.", {"speaker": "PICARD"}),
+    ("clip_0003", "Engage.", {"speaker": "RIKER"}),
+]
+
+def embed(texts):
+    return [[float(len(text)), 0.5] for text in texts]
+
+def sync(store, dialogs, full_sync=False):
+    """Embed what is missing and record every planned vector as written"""
+    plan = store.plan("index", dialogs, MODEL, 1536, full_sync=full_sync)
+    store.ensure_embeddings(plan.new_texts, embed, MODEL, 1536)
+    store.set_states("index", [(clip_id, plan.states[clip_id]) for clip_id in plan.upsert_ids])
+    store.delete_states("index", plan.delete_ids)
+    return plan
+
+def test_content_key_depends_on_model_and_dimensions():
+    assert content_key(MODEL, 1536, "Engage.") == content_key(MODEL, 1536, "Engage.")
+    assert content_key(MODEL, 1536, "Engage.") != content_key(MODEL, 512, "Engage.")
+    assert content_key(MODEL, 1536, "Engage.") != content_key("other-model", 1536, "Engage.")
+
+def test_rerun_only_touches_changed_dialog(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite"))
+    first = sync(store, DIALOGS)
+    assert sorted(first.new_texts) == ["Engage.", "Make it so."]
+    assert len(first.upsert_ids) == 3
+
+    assert not store.plan("index", DIALOGS, MODEL, 1536).has_changes
+
+    changed = [
+        ("clip_0001", "Make it so, Number One.", {"speaker": "PICARD"}),
+        ("clip_0002", "Engage.", {"speaker": "PICARD", "scene_info": "Bridge"}),
+        DIALOGS[2],
+    ]
+    plan = store.plan("index", changed, MODEL, 1536)
+    # New text needs an embedding; a metadata-only change reuses the stored one
+    assert plan.new_texts == ["Make it so, Number One."]
+    assert sorted(plan.upsert_ids) == ["clip_0001", "clip_0002"]
+    assert plan.unchanged_ids == ["clip_0003"]
+
+def test_full_sync_schedules_removed_vectors_for_deletion(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite"))
+    sync(store, DIALOGS)
+    plan = sync(store, DIALOGS[:2], full_sync=True)
+    assert plan.delete_ids == ["clip_0003"]
+    assert store.states("index").keys() == {"clip_0001", "clip_0002"}
+
+def test_vectors_round_trip(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite")
+    store = EmbeddingStore(path)
+    store.ensure_embeddings(["Engage."], embed, MODEL, 1536)
+    store.close()
+    key = content_key(MODEL, 1536, "Engage.")
+    assert EmbeddingStore(path).get_many([key]) == {key: [7.0, 0.5]}
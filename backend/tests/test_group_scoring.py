@@ -0,0 +1,86 @@
+import sys
+import re
+from pathlib import Path
+
+import numpy as np
+import pysrt
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.dialog_matcher import DialogMatcher
+from backend.core.extraction.group_scoring import best_group, build_subtitle_groups, score_groups
+from backend.core.extraction.script_parser import ScriptParser
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "alignment"
+
+def load_episode():
+    segments = ScriptParser().parse_script(str(FIXTURE_DIR / "episode.txt"))
+    subtitles = pysrt.open(str(FIXTURE_DIR / "episode.srt"))
+    return segments, subtitles
+
+def match_key(match):
+    # 'position' is left out: the exhaustive search only tracks it for single-subtitle groups
+    return (match['subtitle_text'], match['match_ratio'], match['start_time'], match['end_time']) if match else None
+
+def make_subtitles(*items):
+    subtitles = pysrt.SubRipFile()
+    for index, (start_ms, end_ms, text) in enumerate(items, 1):
+        subtitles.append(pysrt.SubRipItem(index, pysrt.SubRipTime.from_ordinal(start_ms), pysrt.SubRipTime.from_ordinal(end_ms), text))
+    return subtitles
+
+def test_groups_respect_gap_size_and_multi_speaker_rules():
+    subtitles = make_subtitles(
+        (0, 1000, "Shields up."),
+        (1500, 2500, "Red alert..."),
+        (3000, 4000, "all hands."),
+        (9000, 10000, "Much later."),
+        (10500, 11500, "- Who?\n- Me."),
+        (12000, 13000, "After."),
+    )
+    matcher = DialogMatcher([], subtitles, engine='vectorized')
+    groups = build_subtitle_groups(matcher.cleaned_subtitles, max_group_size=3)
+    spans = list(zip(groups.starts.tolist(), groups.ends.tolist()))
+    assert spans == [(0, 0), (0, 1), (0, 2), (1, 1), (1, 2), (2, 2), (3, 3), (6, 6)]
+    # Ellipsis continuations are joined without the dots
+    assert groups.texts[4] == "Red alert all hands."
+    assert groups.span(3, 5) == (6, 7)
+
+def test_score_groups_chunks_queries_into_a_score_matrix():
+    segments, subtitles = load_episode()
+    matcher = DialogMatcher(segments, subtitles, engine='vectorized')
+    groups = build_subtitle_groups(matcher.cleaned_subtitles)
+    queries = [matcher.clean_text(segment.text) for segment in segments]
+    blocks = list(score_groups(queries, groups, chunk_size=16))
+    assert [first for first, _ in blocks] == list(range(0, len(queries), 16))
+    assert all(scores.shape[1] == len(groups) for _, scores in blocks)
+    assert sum(len(scores) for _, scores in blocks) == len(queries)
+
+def test_best_group_threshold_and_tie_break():
+    segments, subtitles = load_episode()
+    groups = build_subtitle_groups(DialogMatcher(segments, subtitles).cleaned_subtitles)
+    scores = np.zeros(len(groups))
+    assert best_group(scores, groups) is None
+    first, second = 3, len(groups) - 3
+    scores[[first, second]] = 90.0
+    assert best_group(scores, groups) == first
+    assert best_group(scores, groups, near=int(groups.starts[second])) == second
+
+def test_vectorized_matches_exhaustive():
+    # Speed against the exhaustive engine is checked by scripts/benchmark_matcher.py
+    segments, subtitles = load_episode()
+    exhaustive = DialogMatcher(segments, subtitles, engine='exhaustive')
+    vectorized = DialogMatcher(segments, subtitles, engine='vectorized')
+    texts, positions = [], []
+    for segment in segments:
+        for text in [segment.text] + re.split(r'(?<=[.?!])\s+', segment.text):
+            texts.append(text)
+            positions.append(segment.position)
+
+    expected = [exhaustive._find_best_match(text, position) for text, position in zip(texts, positions)]
+    actual = vectorized.best_matches(texts, positions)
+    assert [match_key(match) for match in actual] == [match_key(match) for match in expected]
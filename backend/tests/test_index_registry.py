@@ -0,0 +1,55 @@
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.storage.index_registry import IndexRegistry, resolve_index_name, versioned_index_name
+
+ALIAS = "chattng-dialogs"
+
+def test_alias_resolves_to_itself_until_a_version_is_active(tmp_path):
+    registry = IndexRegistry(str(tmp_path / "registry.json"))
+    assert registry.resolve(ALIAS) == ALIAS
+    registry.register(ALIAS, f"{ALIAS}-v1", 100)
+    assert registry.resolve(ALIAS) == ALIAS
+    assert resolve_index_name(ALIAS, None) == ALIAS
+
+def test_activate_and_rollback(tmp_path):
+    path = str(tmp_path / "registry.json")
+    registry = IndexRegistry(path)
+    for version in ("v1", "v2"):
+        registry.register(ALIAS, f"{ALIAS}-{version}", 100)
+        registry.activate(ALIAS, f"{ALIAS}-{version}")
+    assert resolve_index_name(ALIAS, path) == f"{ALIAS}-v2"
+
+    assert registry.rollback(ALIAS) == f"{ALIAS}-v1"
+    assert IndexRegistry(path).resolve(ALIAS) == f"{ALIAS}-v1"
+    with pytest.raises(ValueError):
+        registry.rollback(ALIAS)
+
+def test_activate_rejects_unregistered_versions(tmp_path):
+    registry = IndexRegistry(str(tmp_path / "registry.json"))
+    with pytest.raises(ValueError):
+        registry.activate(ALIAS, f"{ALIAS}-v9")
+
+def test_prune_keeps_newest_and_active(tmp_path):
+    registry = IndexRegistry(str(tmp_path / "registry.json"))
+    for version in ("v1", "v2", "v3", "v4"):
+        registry.register(ALIAS, f"{ALIAS}-{version}", 100)
+    registry.activate(ALIAS, f"{ALIAS}-v1")
+    removed = registry.prune(ALIAS, keep=2)
+    assert removed == [f"{ALIAS}-v2"]
+    assert [v["name"] for v in registry.versions(ALIAS)] == [f"{ALIAS}-v1", f"{ALIAS}-v3", f"{ALIAS}-v4"]
+
+def test_versioned_name_is_a_valid_pinecone_name():
+    name = versioned_index_name(ALIAS, datetime(2024, 3, 1, 12, 0, 0, tzinfo=timezone.utc))
+    assert name == f"{ALIAS}-v20240301120000"
+    assert len(name) <= 45 and name == name.lower()
@@ -0,0 +1,97 @@
+import sys
+from pathlib import Path
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.search.lexical_index import LexicalIndex, reciprocal_rank_fusion
+
+DIALOGS = [
+    ("Make it so.", {"speaker": "PICARD", "clip_path": "S01E01/clip_0001.mp4"}),
+    ("Tea, Earl Grey, hot.", {"speaker": "PICARD", "clip_path": "S01E02/clip_0002.mp4"}),
+    ("Engage.", {"speaker": "PICARD", "clip_path": "S01E03/clip_0003.mp4"}),
+    ("Engage.", {"speaker": "RIKER", "clip_path": "S01E04/clip_0004.mp4"}),
+    ("I would like some tea, if it is not too hot.", {"speaker": "DATA", "clip_path": "S01E05/clip_0005.mp4"}),
+    ("Shields up. Red alert.", {"speaker": "RIKER", "clip_path": "S01E06/clip_0006.mp4"}),
+]
+
+def build_index():
+    return LexicalIndex.from_dialogs(DIALOGS)
+
+def test_exact_quote_ignores_case_and_punctuation():
+    matches = build_index().exact_matches("tea earl grey HOT", n_results=5)
+    assert [metadata["clip_path"] for _, metadata in matches] == ["S01E02/clip_0002.mp4"]
+    assert matches[0][1]["match_ratio"] == 1.0
+
+def test_exact_quote_respects_character_filter():
+    matches = build_index().exact_matches("Engage!", character="RIKER", n_results=5)
+    assert [metadata["speaker"] for _, metadata in matches] == ["RIKER"]
+
+def test_phrase_match_ranks_above_bag_of_words():
+    matches = build_index().search("Earl Grey, hot", n_results=2)
+    assert matches[0][0] == "Tea, Earl Grey, hot."
+
+def test_search_without_known_terms_returns_nothing():
+    assert build_index().search("Klingon bird of prey", n_results=3) == []
+
+def test_reciprocal_rank_fusion_prefers_items_in_both_lists():
+    vector = [("a", {"clip_path": "a"}), ("b", {"clip_path": "b"}), ("c", {"clip_path": "c"})]
+    lexical = [("c", {"clip_path": "c"}), ("d", {"clip_path": "d"})]
+    fused = reciprocal_rank_fusion([vector, lexical], n_results=4)
+    assert [text for text, _ in fused][:1] == ["c"]
+    assert {text for text, _ in fused} == {"a", "b", "c", "d"}
+
+def test_fusion_keeps_cosine_similarity_apart_from_lexical_and_fused_scores():
+    vector = [("Engage.", {"clip_path": "S01E03/clip_0003.mp4", "match_ratio": 0.82})]
+    lexical = build_index().search("Engage", n_results=3)
+    assert all("match_ratio" not in metadata for _, metadata in lexical)
+    fused = reciprocal_rank_fusion([vector, lexical], n_results=3)
+    text, metadata = fused[0]
+    assert (text, metadata["match_ratio"], metadata["lexical_score"]) == ("Engage.", 0.82, 1.0)
+    assert metadata["fused_score"] == 2 / 61
+    # Lines only the lexical search found have no cosine similarity
+    assert "match_ratio" not in fused[1][1] and fused[1][1]["fused_score"] == 1 / 62
+    # Inputs are not modified
+    assert "fused_score" not in vector[0][1] and "lexical_score" not in vector[0][1]
+
+def test_shared_index_is_rebuilt_for_a_new_source_version():
+    from backend.core.search.lexical_index import get_lexical_index
+
+    builds = []
+    def build():
+        builds.append(1)
+        return build_index()
+    key = ("test-lexical-version", "")
+    first = get_lexical_index(key, build, version="1:100")
+    assert get_lexical_index(key, build, version="1:100") is first
+    assert get_lexical_index(key, build, version="2:120") is not first
+    assert len(builds) == 2
+
+def test_short_exact_matches_are_topped_up_by_hybrid_search():
+    from types import SimpleNamespace
+    from backend.core.search.dialog_search import DialogSearchSystem
+
+    vector_matches = [
+        ("Tea, Earl Grey, hot.", {"clip_path": "S01E02/clip_0002.mp4", "match_ratio": 0.7}),
+        ("Make it so.", {"clip_path": "S01E01/clip_0001.mp4", "match_ratio": 0.6}),
+    ]
+    calls = []
+    search = DialogSearchSystem.__new__(DialogSearchSystem)
+    search.lexical_index = build_index()
+    search.lexical_config = {}
+    search.embedding_batcher = SimpleNamespace(embed=lambda text: calls.append(text) or [1.0])
+    search.storage = SimpleNamespace(find_similar=lambda query_embedding, n_results, character: vector_matches)
+
+    # Enough exact quotes skip the embedding round trip
+    matches = search.find_similar_dialog("Engage!", n_results=2)
+    assert [metadata["speaker"] for _, metadata in matches] == ["PICARD", "RIKER"] and calls == []
+
+    matches = search.find_similar_dialog("Engage!", n_results=4)
+    assert [metadata["clip_path"] for _, metadata in matches] == [
+        "S01E03/clip_0003.mp4", "S01E04/clip_0004.mp4", "S01E02/clip_0002.mp4", "S01E01/clip_0001.mp4"
+    ]
+    assert calls == ["Engage!"]
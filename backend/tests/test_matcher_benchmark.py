@@ -0,0 +1,84 @@
+import sys
+from pathlib import Path
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.scripts.benchmark_matcher import (
+    BenchmarkResult, check_regressions, load_fixture, parse_script_text, run_benchmark, synthesize_episode,
+    to_baseline
+)
+
+def test_synthetic_episode_scales_fixture_and_golden():
+    script_text, subtitles, golden = load_fixture()
+    segments, _ = parse_script_text(script_text)
+    synthetic_script, synthetic_subtitles, synthetic_golden = synthesize_episode(
+        script_text, subtitles, golden, len(segments), copies=3
+    )
+    synthetic_segments, _ = parse_script_text(synthetic_script)
+    assert len(synthetic_segments) == 3 * len(segments)
+    assert len(synthetic_subtitles) == 3 * len(subtitles)
+    assert len(synthetic_golden) == 3 * len(golden)
+    assert [s.index for s in synthetic_subtitles] == list(range(1, len(synthetic_subtitles) + 1))
+    # Copies keep the speakers but not the words, and run after one another
+    first, third = synthetic_segments[0], synthetic_segments[2 * len(segments)]
+    assert first.text == segments[0].text
+    assert third.speaker == first.speaker and third.text != first.text
+    assert len(third.text) == len(first.text)
+    assert synthetic_subtitles[2 * len(subtitles)].start > synthetic_subtitles[len(subtitles) - 1].end
+    # The same seed gives the same episode
+    assert synthesize_episode(script_text, subtitles, golden, len(segments), copies=3)[0] == synthetic_script
+
+def test_banded_benchmark_matches_golden():
+    result = run_benchmark('banded', copies=2)
+    assert result.segments == 2 * 67
+    assert result.accuracy >= 0.95
+    assert result.false_matches == 0
+    assert result.segments_per_second > 0
+    assert result.peak_mb > 0
+    assert check_regressions([result]) == []
+
+def test_regressions_against_baseline():
+    def result(match_seconds, correct=63, peak_mb=1.0):
+        return BenchmarkResult(
+            engine='banded', copies=1, segments=67, parse_seconds=0.001, setup_seconds=0.0,
+            match_seconds=match_seconds, correct=correct, expected=63, false_matches=0, peak_mb=peak_mb
+        )
+
+    baseline = to_baseline([result(0.1)])
+    assert check_regressions([result(0.11)], baseline) == []
+    slower = check_regressions([result(0.2)], baseline)
+    assert len(slower) == 1 and "seg/s" in slower[0]
+    assert "peak" in check_regressions([result(0.1, peak_mb=2.0)], baseline)[0]
+    worse = check_regressions([result(0.1, correct=55)], baseline)
+    assert any("below 0.95" in problem for problem in worse)
+    assert any("below baseline" in problem for problem in worse)
+
+def test_engines_must_keep_their_speedup_over_exhaustive():
+    def result(engine, match_seconds):
+        return BenchmarkResult(
+            engine=engine, copies=1, segments=67, parse_seconds=0.001, setup_seconds=0.0,
+            match_seconds=match_seconds, correct=63, expected=63, false_matches=0
+        )
+
+    assert check_regressions([result('banded', 0.1), result('exhaustive', 2.0)]) == []
+    slow = check_regressions([result('banded', 0.5), result('exhaustive', 2.0)])
+    assert len(slow) == 1 and "4.0x the exhaustive engine" in slow[0]
+    # Without an exhaustive run there is nothing to compare against
+    assert check_regressions([result('banded', 0.5)]) == []
+
+def test_committed_baseline_covers_the_default_runs():
+    import json
+    from backend.scripts.benchmark_matcher import BASELINE_PATH
+
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    assert set(baseline) == {"banded:1", "banded:4", "banded:16"}
+    assert all(entry["accuracy"] >= 0.95 and entry["segments_per_second"] > 0 for entry in baseline.values())
+    # Accuracy does not depend on the machine, so a fresh run meets the baseline's
+    result = run_benchmark('banded', copies=1, measure_memory=False)
+    assert result.accuracy >= baseline["banded:1"]["accuracy"]
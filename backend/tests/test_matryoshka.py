@@ -0,0 +1,67 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.storage.matryoshka import (
+    MatryoshkaConfig, rescore, truncate_embedding, truncate_embeddings
+)
+
+def embedding_config(**matryoshka):
+    return {"dimensions": 1536, "matryoshka": {"enabled": True, "coarse_index": "chattng-dialogs-coarse", **matryoshka}}
+
+def test_truncation_renormalizes_to_unit_length():
+    vector = [3.0, 4.0, 12.0, 84.0]
+    truncated = truncate_embedding(vector, 2)
+    assert truncated == pytest.approx([0.6, 0.8])
+    assert np.linalg.norm(truncated) == pytest.approx(1.0)
+    # The vectorized form agrees row by row
+    matrix = truncate_embeddings(np.array([vector, [0.0, 0.0, 1.0, 0.0]]), 2)
+    assert matrix[0] == pytest.approx([0.6, 0.8])
+    # An all-zero prefix stays zero rather than dividing by zero
+    assert matrix[1].tolist() == [0.0, 0.0]
+    assert truncate_embedding([0.0, 0.0, 1.0], 2) == [0.0, 0.0]
+
+def test_truncation_beyond_the_vector_keeps_every_value():
+    truncated = truncate_embedding([3.0, 4.0], 256)
+    assert truncated == pytest.approx([0.6, 0.8])
+    assert truncate_embeddings(np.array([[3.0, 4.0]]), 256).shape == (1, 2)
+
+def test_rescore_orders_by_full_cosine_similarity():
+    query = [1.0, 0.0, 0.0]
+    candidates = [
+        ("orthogonal", [0.0, 1.0, 0.0]),
+        ("close", [0.9, 0.1, 0.0]),
+        ("exact", [2.0, 0.0, 0.0]),  # Magnitude does not matter
+        ("opposite", [-1.0, 0.0, 0.0]),
+        ("tie", [0.9, 0.0, 0.1]),
+    ]
+    ranked = rescore(query, candidates, n_results=4)
+    assert [clip_id for clip_id, _ in ranked] == ["exact", "close", "tie", "orthogonal"]
+    assert [score for _, score in ranked] == pytest.approx([1.0, 0.9 / np.hypot(0.9, 0.1), 0.9 / np.hypot(0.9, 0.1), 0.0])
+    assert rescore(query, [], n_results=3) == []
+
+def test_config_validation():
+    config = MatryoshkaConfig.from_embedding_config(embedding_config(coarse_dimensions=512, rescore_factor=4))
+    assert (config.coarse_dimensions, config.rescore_factor) == (512, 4)
+    assert config.candidate_count(5) == 50 and config.candidate_count(20) == 80
+    # Disabled sections are not validated
+    assert not MatryoshkaConfig.from_embedding_config({"dimensions": 256, "matryoshka": {"coarse_dimensions": 256}}).enabled
+
+    with pytest.raises(ValueError, match="smaller than the full"):
+        MatryoshkaConfig.from_embedding_config({**embedding_config(coarse_dimensions=1024), "dimensions": 1024})
+    with pytest.raises(ValueError, match="Unsupported coarse dimensions"):
+        MatryoshkaConfig.from_embedding_config(embedding_config(coarse_dimensions=300))
+    for factor in (0, -2):
+        with pytest.raises(ValueError, match="rescore_factor"):
+            MatryoshkaConfig.from_embedding_config(embedding_config(rescore_factor=factor))
+    with pytest.raises(ValueError, match="coarse_index"):
+        MatryoshkaConfig.from_embedding_config({"dimensions": 1536, "matryoshka": {"enabled": True}})
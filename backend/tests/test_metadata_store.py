@@ -0,0 +1,143 @@
+import sys
+from pathlib import Path
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.storage.metadata_store import MetadataStore, MetadataStoreBuilder
+
+def build_store():
+    builder = MetadataStoreBuilder()
+    for i, speaker in enumerate(["PICARD", "RIKER", "PICARD"]):
+        builder.add(f"S01E01_clip_{i:04d}", "Engage." if i != 1 else "Number One.", {
+            "clip_path": f"data/processed/clips/S01E01/S01E01_clip_{i:04d}.mp4",
+            "start_time": f"00:0{i}:01,250",
+            "end_time": f"00:0{i}:03,005",
+            "season": 1,
+            "episode": 1,
+            "speaker": speaker,
+            "scene_info": "",
+        })
+    return builder.build()
+
+def test_join_resolves_ids_and_scores():
+    store = build_store()
+    matches = store.join([("S01E01_clip_0002", 0.91), ("missing", 0.5), ("S01E01_clip_0001", 0.8)])
+    assert [text for text, _ in matches] == ["Engage.", "Number One."]
+    record = matches[0][1]
+    assert record["speaker"] == "PICARD"
+    assert record["start_time"] == "00:02:01,250"
+    assert record["end_time"] == "00:02:03,005"
+    assert record.get("match_ratio") == 0.91
+    assert dict(record)["clip_path"].endswith("S01E01_clip_0002.mp4")
+
+def test_strings_are_interned():
+    store = build_store()
+    assert store.texts == ["Engage.", "Number One."]
+    assert store.speakers == ["PICARD", "RIKER"]
+
+def test_save_and_load_round_trip(tmp_path):
+    path = tmp_path / "metadata_store.npz"
+    build_store().save(str(path))
+    loaded = MetadataStore.load(str(path))
+    assert loaded.ids == build_store().ids
+    _, record = loaded.join([("S01E01_clip_0001", 0.7)])[0]
+    assert record["speaker"] == "RIKER"
+    assert record["season"] == 1
+
+def test_canonical_lines_resolve_to_an_occurrence():
+    import random
+    from backend.core.storage.metadata_store import canonical_line_id
+
+    store = build_store()
+    lines = list(store.iter_lines())
+    assert [(text, speakers) for _, text, speakers in lines] == [("Engage.", ["PICARD"]), ("Number One.", ["RIKER"])]
+    assert lines[0][0] == canonical_line_id("Engage.")
+
+    rng = random.Random(0)
+    chosen = {
+        store.join_lines([(canonical_line_id("Engage."), 0.9)], rng=rng)[0][1]["clip_path"]
+        for _ in range(20)
+    }
+    assert chosen == {
+        "data/processed/clips/S01E01/S01E01_clip_0000.mp4",
+        "data/processed/clips/S01E01/S01E01_clip_0002.mp4",
+    }
+    assert store.join_lines([(canonical_line_id("Number One."), 0.8)], character="PICARD") == []
+    text, record = store.join_lines([(canonical_line_id("Number One."), 0.8)], character="RIKER")[0]
+    assert text == "Number One." and record["match_ratio"] == 0.8
+
+def test_build_stores_are_installed_and_restored(tmp_path):
+    from backend.core.storage.metadata_store import build_store_path, install_build_store
+
+    live = str(tmp_path / "metadata.npz")
+    build_store().save(build_store_path(live, "dialogs-v1"))
+    builder = MetadataStoreBuilder()
+    builder.add("S01E02_clip_0000", "Make it so.", {"speaker": "PICARD", "season": 1, "episode": 2})
+    builder.build().save(build_store_path(live, "dialogs-v2"))
+
+    assert build_store_path(live, "dialogs-v2") == str(tmp_path / "metadata.dialogs-v2.npz")
+    assert not install_build_store(live, "dialogs-v3")
+    assert install_build_store(live, "dialogs-v2")
+    assert len(MetadataStore.load(live)) == 1
+    # Rolling back reinstalls the earlier build's copy
+    assert install_build_store(live, "dialogs-v1")
+    assert len(MetadataStore.load(live)) == 3
+    assert Path(build_store_path(live, "dialogs-v2")).exists()
+
+def test_concurrent_first_queries_share_one_build():
+    from concurrent.futures import ThreadPoolExecutor
+    from backend.core.storage.metadata_store import canonical_line_id
+
+    for _ in range(20):
+        store = build_store()
+        query = [(canonical_line_id("Engage."), 0.9)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: store.join_lines(query, "PICARD"), range(32)))
+        assert all(len(joined) == 1 and joined[0][1]["speaker"] == "PICARD" for joined in results)
+
+def test_installed_builds_are_reloaded(tmp_path):
+    from backend.core.storage.metadata_store import build_store_path, get_metadata_store, install_build_store
+
+    live = str(tmp_path / "metadata.npz")
+    build_store().save(build_store_path(live, "dialogs-v1"))
+    builder = MetadataStoreBuilder()
+    builder.add("S01E02_clip_0000", "Make it so.", {"speaker": "PICARD", "season": 1, "episode": 2})
+    builder.build().save(build_store_path(live, "dialogs-v2"))
+
+    assert get_metadata_store(live) is None
+    install_build_store(live, "dialogs-v1")
+    first = get_metadata_store(live)
+    assert len(first) == 3 and get_metadata_store(live) is first
+    install_build_store(live, "dialogs-v2")
+    second = get_metadata_store(live)
+    assert len(second) == 1 and second.version != first.version
+    assert second.join([("S01E02_clip_0000", 0.9)])[0][0] == "Make it so."
+
+def test_near_duplicate_clusters_resolve_to_a_member(tmp_path):
+    import random
+
+    builder = MetadataStoreBuilder()
+    for i, (speaker, text, keep) in enumerate([
+        ("DATA", "Engage.", ""),
+        ("PICARD", "PICARD: Engage!", "clip_0"),
+        ("RIKER", "Number One.", ""),
+    ]):
+        builder.add(f"clip_{i}", text, {"speaker": speaker, "duplicate_of": keep})
+    path = tmp_path / "metadata_store.npz"
+    builder.build().save(str(path))
+    store = MetadataStore.load(str(path))
+    assert store.duplicate_of(1) == "clip_0" and store.duplicate_of(0) == ""
+
+    rng = random.Random(0)
+    chosen = {store.join([("clip_0", 0.9)], rng=rng)[0][0] for _ in range(20)}
+    assert chosen == {"Engage.", "PICARD: Engage!"}
+    text, record = store.join([("clip_0", 0.9)], character="PICARD")[0]
+    assert text == "PICARD: Engage!" and record["speaker"] == "PICARD" and record["match_ratio"] == 0.9
+    assert store.join([("clip_0", 0.9)], character="RIKER") == []
+    # Clips outside a cluster were already filtered by the vector query
+    assert store.join([("clip_2", 0.5)], character="RIKER")[0][0] == "Number One."
@@ -0,0 +1,73 @@
+import sys
+from pathlib import Path
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.storage.near_duplicates import MinHasher, find_near_duplicates, normalize_dialog, plan_dedup, shingles
+
+LINES = [
+    "Engage.",
+    "DATA: Engage!",
+    "Make it so.",
+    "Make it so, Number One.",
+    "PICARD: Tea, Earl Grey, hot.",
+    "Tea. Earl Grey. Hot.",
+    "I am detecting a massive energy surge on deck twelve.",
+    "I am detecting a massive energy surge on deck ten.",
+    "Shields up.",
+]
+
+def test_normalization_drops_speaker_labels_and_punctuation():
+    assert normalize_dialog("PICARD: Tea, Earl Grey, hot.") == "tea earl grey hot"
+    assert normalize_dialog("Yes. RIKER: No.") == "yes no"
+
+def test_near_duplicates_cluster_together():
+    assert find_near_duplicates(LINES) == [[0, 1], [4, 5], [6, 7]]
+
+def test_distinct_lines_stay_apart_at_strict_threshold():
+    assert find_near_duplicates(LINES, threshold=0.95) == [[0, 1], [4, 5]]
+
+def test_batched_signatures_match_single_signatures():
+    hasher = MinHasher()
+    sets = [shingles(normalize_dialog(line)) for line in LINES]
+    batched = hasher.signatures(sets, chunk_size=16)
+    for i, hashes in enumerate(sets):
+        assert (batched[i] == hasher.signature(hashes)).all()
+
+def test_plan_keeps_most_common_form():
+    ids = ["a", "b", "c"]
+    texts = ["Red alert!", "WORF: Red alert.", "Red alert!"]
+    assert plan_dedup(ids, texts) == [("a", ["a", "b", "c"])]
+
+def test_dedup_marks_clusters_without_deleting(tmp_path):
+    import chromadb
+    import yaml
+    from backend.core.utils.remove_chromadb_duplicates import remove_duplicate_dialogs
+
+    client = chromadb.PersistentClient(path=str(tmp_path / "chroma"))
+    collection = client.create_collection("dialogs")
+    collection.add(
+        ids=[f"clip_{i}" for i in range(len(LINES))],
+        documents=LINES,
+        embeddings=[[float(i), 1.0] for i in range(len(LINES))],
+        metadatas=[{"speaker": "PICARD"} for _ in LINES],
+    )
+    config_path = tmp_path / "search_config.yaml"
+    config_path.write_text(yaml.safe_dump({"storage": {"chroma_path": str(tmp_path / "chroma"), "collection_name": "dialogs"}}))
+
+    remove_duplicate_dialogs(str(config_path), threshold=0.95)
+    rows = collection.get(include=["metadatas"])
+    assert len(rows["ids"]) == len(LINES)
+    marks = {clip_id: metadata.get("duplicate_of") for clip_id, metadata in zip(rows["ids"], rows["metadatas"])}
+    assert sorted(clip_id for clip_id, keep in marks.items() if keep) == ["clip_1", "clip_5"]
+
+    # A re-run after a line changes clears its stale mark
+    collection.update(ids=["clip_1"], documents=["Red alert."], embeddings=[[1.0, 0.0]])
+    remove_duplicate_dialogs(str(config_path), threshold=0.95)
+    rows = collection.get(ids=["clip_1", "clip_5"], include=["metadatas"])
+    assert [metadata["duplicate_of"] for metadata in rows["metadatas"]] == ["", "clip_4"]
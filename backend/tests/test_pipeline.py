@@ -0,0 +1,191 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.pipeline import Episode, Pipeline, Stage, StageCache, fingerprint
+
+def make_episodes(tmp_path, count=3):
+    episodes = []
+    for i in range(count):
+        script = tmp_path / f"S01E0{i}.txt"
+        script.write_text(f"script {i}\n")
+        episodes.append(Episode(code=f"S01E0{i}", video=script, script=script))
+    return episodes
+
+def make_stages(calls, upper=True, fail=()):
+    """read -> shout -> count: a tiny pipeline that records every stage it runs"""
+    def read(context):
+        calls.append(("read", context.episode.code))
+        if context.episode.code in fail:
+            raise RuntimeError("unreadable")
+        path = context.work_dir / "text.txt"
+        path.write_text(context.episode.script.read_text())
+        return {"text": path}
+
+    def shout(context):
+        calls.append(("shout", context.episode.code))
+        text = Path(context.inputs["read"]["text"]).read_text()
+        # Both settings produce the same text, only the order of operations differs
+        return {"text": text.upper().strip() if context.params["upper"] else text.strip().upper()}
+
+    def count(context):
+        calls.append(("count", context.episode.code))
+        return {"length": len(context.inputs["shout"]["text"])}
+
+    return [
+        Stage(name="count", run=count, deps=("shout",)),
+        Stage(name="read", run=read, inputs=lambda e: [e.script]),
+        Stage(name="shout", run=shout, deps=("read",), params={"upper": upper}),
+    ]
+
+def test_second_run_is_fully_cached(tmp_path):
+    episodes = make_episodes(tmp_path)
+    calls = []
+    pipeline = Pipeline(make_stages(calls), StageCache(tmp_path / "cache"), workers=2)
+    first = pipeline.run(episodes)
+    assert first.ok and first.count('ran') == 9
+    # Dependencies always run before their dependents
+    for episode in episodes:
+        assert [stage for stage, code in calls if code == episode.code] == ["read", "shout", "count"]
+    calls.clear()
+    second = pipeline.run(episodes)
+    assert calls == []
+    assert second.count('cached') == 9
+    assert [r.manifest["outputs"] for r in second.results if r.stage == "count"] == [{"length": 8}] * 3
+
+def test_changed_input_reruns_only_that_episode(tmp_path):
+    episodes = make_episodes(tmp_path)
+    calls = []
+    pipeline = Pipeline(make_stages(calls), StageCache(tmp_path / "cache"))
+    pipeline.run(episodes)
+    calls.clear()
+    episodes[1].script.write_text("a longer script\n")
+    report = pipeline.run(episodes)
+    assert sorted(calls) == [("count", "S01E01"), ("read", "S01E01"), ("shout", "S01E01")]
+    assert report.count('cached') == 6
+
+def test_unchanged_outputs_stop_downstream_reruns(tmp_path):
+    episodes = make_episodes(tmp_path, count=1)
+    calls = []
+    cache = StageCache(tmp_path / "cache")
+    Pipeline(make_stages(calls, upper=True), cache).run(episodes)
+    calls.clear()
+    # A parameter change re-runs its stage; identical output keeps downstream cached
+    report = Pipeline(make_stages(calls, upper=False), cache).run(episodes)
+    assert calls == [("shout", "S01E00")]
+    assert report.count('cached', 'count') == 1
+
+def test_failures_block_only_their_episode_and_resume(tmp_path):
+    episodes = make_episodes(tmp_path)
+    calls = []
+    cache = StageCache(tmp_path / "cache")
+    report = Pipeline(make_stages(calls, fail={"S01E01"}), cache).run(episodes)
+    assert not report.ok
+    assert [(r.stage, r.error) for r in report.failures] == [("read", "RuntimeError: unreadable")]
+    assert report.count('blocked') == 2
+    assert report.count('ran') == 6
+    calls.clear()
+    report = Pipeline(make_stages(calls), cache).run(episodes)
+    assert report.ok
+    assert sorted(code for _, code in calls) == ["S01E01"] * 3
+
+def test_incomplete_entries_are_recomputed(tmp_path):
+    episodes = make_episodes(tmp_path, count=1)
+    calls = []
+    cache = StageCache(tmp_path / "cache")
+    pipeline = Pipeline(make_stages(calls), cache)
+    report = pipeline.run(episodes)
+    # Simulate a crash after the stage wrote its files but before the manifest
+    manifest = next(r.manifest for r in report.results if r.stage == "count")
+    (cache.entry_dir("count", "S01E00", manifest["key"]) / "manifest.json").unlink()
+    calls.clear()
+    pipeline.run(episodes)
+    assert calls == [("count", "S01E00")]
+
+def test_force_reruns_a_stage(tmp_path):
+    episodes = make_episodes(tmp_path, count=2)
+    calls = []
+    pipeline = Pipeline(make_stages(calls), StageCache(tmp_path / "cache"))
+    pipeline.run(episodes)
+    calls.clear()
+    pipeline.run(episodes, force=["shout"])
+    assert sorted(calls) == [("shout", "S01E00"), ("shout", "S01E01")]
+    with pytest.raises(ValueError):
+        pipeline.run(episodes, force=["upload"])
+
+def test_invalid_stage_graphs_are_rejected(tmp_path):
+    cache = StageCache(tmp_path)
+    with pytest.raises(ValueError):
+        Pipeline([Stage(name="a", run=dict, deps=("b",))], cache)
+    with pytest.raises(ValueError):
+        Pipeline([Stage(name="a", run=dict, deps=("b",)), Stage(name="b", run=dict, deps=("a",))], cache)
+
+def test_fingerprint_follows_content(tmp_path):
+    a, b = tmp_path / "a.srt", tmp_path / "b.srt"
+    a.write_text("1\n00:00:01,000 --> 00:00:02,000\nEngage.\n")
+    b.write_text(a.read_text())
+    assert fingerprint(a) == fingerprint(b)
+    b.write_text("1\n00:00:01,000 --> 00:00:02,000\nEngage!\n")
+    assert fingerprint(a) != fingerprint(b)
+
+def test_store_stage_builds_configured_storage(tmp_path, monkeypatch):
+    from types import SimpleNamespace
+    from backend.config import settings as settings_module
+    from backend.core.extraction.pipeline import default_storage, episode_stages
+    from backend.core.extraction.work_queue import stages_from_config
+    from backend.core.storage import dialog_storage
+
+    class FakePinecone:
+        def __init__(self, api_key):
+            assert api_key == "pc-test"
+
+        def Index(self, name):
+            return SimpleNamespace(name=name)
+
+    settings = SimpleNamespace(
+        pinecone_api_key="pc-test",
+        pinecone_environment="gcp-starter",
+        pinecone_index="chattng-dialogs",
+        pinecone_index_registry=None,
+        openai_api_key="sk-test",
+        app_config={},
+        search_config={
+            "storage": {"collection_name": "dialogs"},
+            "embeddings": {"provider": "openai", "model": "text-embedding-3-small", "dimensions": 1536}
+        }
+    )
+    monkeypatch.setattr(dialog_storage, "Pinecone", FakePinecone)
+    # DialogStorage reads its module-level settings; default_storage reads fresh ones
+    monkeypatch.setattr(dialog_storage, "settings", settings)
+    monkeypatch.setattr(settings_module, "get_settings", lambda: settings)
+
+    for stages in (
+        episode_stages(tmp_path, alass=None, storage_factory=default_storage),
+        stages_from_config({"output_dir": str(tmp_path), "alass": None, "store": True})
+    ):
+        store = next(stage for stage in stages if stage.name == "store")
+        storage = store.run.args[0]()
+        assert storage.embedding_config["model"] == "text-embedding-3-small"
+        assert storage.embedding_client.api_key == "sk-test"
+        assert storage.index.name == "chattng-dialogs"
+
+def test_store_runs_are_refused_up_front_for_canonical_indexes(monkeypatch, capsys):
+    from types import SimpleNamespace
+    from backend.config import settings as settings_module
+    from backend.core.extraction import pipeline
+
+    settings = SimpleNamespace(search_config={"storage": {"canonical_lines": True}})
+    monkeypatch.setattr(settings_module, "get_settings", lambda: settings)
+    monkeypatch.setattr(pipeline, "discover_episodes", lambda *args: pytest.fail("episodes were discovered"))
+    monkeypatch.setattr(sys, "argv", ["pipeline", "videos", "scripts", "clips", "--store"])
+    with pytest.raises(SystemExit):
+        pipeline.main()
+    assert "re-run scripts/setup_pinecone.py" in capsys.readouterr().err
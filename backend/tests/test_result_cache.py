@@ -0,0 +1,65 @@
+import sys
+import json
+import time
+from pathlib import Path
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.search.result_cache import (
+    LocalResultCache, make_cache_key, encode_results, decode_results
+)
+
+RESULTS = [
+    ("Make it so.", {
+        "clip_path": "data/processed/clips/S01E01/S01E01_clip_0001.mp4",
+        "start_time": "00:01:02,500",
+        "end_time": "00:01:03,750",
+        "season": 1,
+        "episode": 1,
+        "speaker": "PICARD",
+        "scene_info": "",
+        "match_ratio": 0.87,
+    }),
+]
+
+def test_cache_key_is_fixed_length():
+    short = make_cache_key("dialog_search:v2:", "Engage.", "PICARD", 5)
+    long = make_cache_key("dialog_search:v2:", "Tea, Earl Grey, hot. " * 50, None, 5)
+    assert len(short) == len(long) == len("dialog_search:v2:") + 32
+    assert short != make_cache_key("dialog_search:v2:", "Engage.", "RIKER", 5)
+
+def test_round_trip_is_smaller_than_json():
+    payload = encode_results(RESULTS, soft_expiry=1234.5)
+    soft_expiry, results = decode_results(payload)
+    assert soft_expiry == 1234.5
+    assert results == RESULTS
+    assert len(payload) < len(json.dumps(RESULTS))
+
+def test_decode_rejects_legacy_json():
+    assert decode_results(json.dumps(RESULTS).encode()) is None
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalResultCache(max_entries=2)
+    expiry = time.time() + 60
+    cache.put("a", expiry, expiry, RESULTS)
+    cache.put("b", expiry, expiry, RESULTS)
+    assert cache.get("a") is not None
+    cache.put("c", expiry, expiry, RESULTS)
+    assert cache.get("b") is None
+    assert cache.get("a") == (expiry, RESULTS)
+
+def test_local_cache_drops_expired_entries():
+    cache = LocalResultCache()
+    cache.put("a", time.time() - 10, time.time() - 1, RESULTS)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+def test_round_trip_keeps_metadata_outside_the_common_fields():
+    results = [("Make it so.", {**RESULTS[0][1], "line_id": "line-42", "occurrences": 3, "similarity": 0.91})]
+    _, decoded = decode_results(encode_results(results, soft_expiry=1234.5))
+    assert decoded == results
@@ -0,0 +1,65 @@
+import sys
+import re
+import json
+from pathlib import Path
+
+import pysrt
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.dialog_matcher import DialogMatcher
+from backend.core.extraction.script_parser import ScriptParser
+from backend.core.extraction.subtitle_index import SubtitleNgramIndex, text_features
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "alignment"
+
+def load_episode():
+    segments = ScriptParser().parse_script(str(FIXTURE_DIR / "episode.txt"))
+    subtitles = pysrt.open(str(FIXTURE_DIR / "episode.srt"))
+    with open(FIXTURE_DIR / "golden.json") as f:
+        golden = {int(position): span for position, span in json.load(f)["segments"].items()}
+    return segments, subtitles, golden
+
+def match_key(match):
+    return (match['subtitle_text'], match['match_ratio'], match['start_time']) if match else None
+
+def test_text_features_mix_words_and_trigrams():
+    features = text_features("make it so")
+    assert {"w:make", "w:it", "w:so", "mak", "e i", " so"} <= features
+    assert text_features("no") == {"w:no", "no"}
+
+def test_candidates_are_few_and_contain_the_true_start():
+    segments, subtitles, golden = load_episode()
+    matcher = DialogMatcher(segments, subtitles, engine='indexed')
+    srt_index = [sub.index for sub, _, _ in matcher.cleaned_subtitles]
+    for position, (first, _) in golden.items():
+        candidates = matcher.index.candidates(segments[position].text, near=position)
+        assert len(candidates) <= 24
+        assert srt_index.index(first) in candidates
+
+def test_common_words_still_produce_candidates():
+    index = SubtitleNgramIndex(["Yes.", "Yes.", "Yes.", "No.", "Shields up."], lambda text: text.lower())
+    assert index.candidates("Yes.") == [0, 1, 2]
+    assert index.candidates("Shields!") == [4]
+
+def test_indexed_segments_match_exhaustive():
+    segments, subtitles, _ = load_episode()
+    exhaustive = DialogMatcher(segments, subtitles, engine='exhaustive')
+    indexed = DialogMatcher(segments, subtitles, engine='indexed')
+    for segment in segments:
+        assert match_key(indexed._find_best_match(segment.text, segment.position)) == \
+            match_key(exhaustive._find_best_match(segment.text, segment.position))
+
+def test_indexed_sentences_match_exhaustive():
+    segments, subtitles, _ = load_episode()
+    exhaustive = DialogMatcher(segments, subtitles, engine='exhaustive')
+    indexed = DialogMatcher(segments, subtitles, engine='indexed')
+    for segment in segments:
+        for sentence in re.split(r'(?<=[.?!])\s+', segment.text):
+            assert match_key(indexed._find_best_match(sentence, segment.position)) == \
+                match_key(exhaustive._find_best_match(sentence, segment.position))
@@ -0,0 +1,83 @@
+import sys
+import pickle
+from pathlib import Path
+
+import nltk
+import numpy as np
+import pysrt
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.dialog_matcher import DialogMatcher
+from backend.core.extraction.script_parser import ScriptParser
+from backend.core.extraction.subtitle_store import SubtitleStore
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "alignment"
+
+def load_matcher(engine='exhaustive'):
+    segments = ScriptParser().parse_script(str(FIXTURE_DIR / "episode.txt"))
+    subtitles = pysrt.open(str(FIXTURE_DIR / "episode.srt"))
+    return DialogMatcher(segments, subtitles, engine=engine)
+
+def test_store_mirrors_cleaned_subtitles():
+    matcher = load_matcher()
+    store = matcher.store
+    assert len(store) == len(matcher.cleaned_subtitles)
+    for k, (sub, cleaned, is_multi) in enumerate(matcher.cleaned_subtitles):
+        assert store.start_ms[k] == sub.start.ordinal
+        assert store.end_ms[k] == sub.end.ordinal
+        assert store.is_multi[k] == is_multi
+        assert store.cleaned[k] == cleaned
+        assert matcher.subtitles[store.sub_index[k]] is sub
+    # Both lines of a multi-speaker subtitle point at the same original subtitle
+    multi = np.flatnonzero(store.is_multi)
+    assert len(multi) == 2 and store.sub_index[multi[0]] == store.sub_index[multi[1]]
+
+def test_shared_round_trip():
+    store = load_matcher().store
+    shm, descriptor = store.to_shared()
+    try:
+        # Workers only ever receive the small descriptor
+        assert len(pickle.dumps(descriptor)) < 1024
+        attached, attached_shm = SubtitleStore.attach(descriptor)
+        assert np.array_equal(attached.start_ms, store.start_ms)
+        assert np.array_equal(attached.end_ms, store.end_ms)
+        assert np.array_equal(attached.is_multi, store.is_multi)
+        assert np.array_equal(attached.sub_index, store.sub_index)
+        assert attached.cleaned == store.cleaned
+        assert attached.raw == store.raw
+        del attached
+        attached_shm.close()
+    finally:
+        shm.close()
+        shm.unlink()
+
+def test_store_only_matcher_finds_the_same_groups():
+    matcher = load_matcher()
+    worker = DialogMatcher.from_store(matcher.store)
+    for segment in matcher.script_segments:
+        assert worker._find_best_group(segment.text, segment.position) == \
+            matcher._find_best_group(segment.text, segment.position)
+    match = matcher._find_best_match(matcher.script_segments[0].text, 0)
+    assert [sub.index for sub in match['subtitle_group']] == [1]
+    assert str(match['start_time']) == "00:01:02,000"
+
+def test_pool_matches_in_script_order():
+    try:
+        nltk.sent_tokenize("One. Two.")
+    except LookupError:
+        pytest.skip("NLTK punkt data is not installed")
+    matcher = load_matcher(engine='indexed')
+    results = matcher.match_dialog()
+    expected = [matcher._match_single_segment(segment) for segment in matcher.script_segments]
+    expected = [r for r in expected if r['complete'] or r['sentences']]
+    assert [r['text'] for r in results] == [r['text'] for r in expected]
+    for result, single in zip(results, expected):
+        assert result['complete'] == matcher._materialize(single['complete'])
+        assert isinstance(result['complete']['subtitle_group'][0], pysrt.SubRipItem)
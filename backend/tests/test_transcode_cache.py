@@ -0,0 +1,175 @@
+import sys
+import asyncio
+from pathlib import Path
+
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.api.services.transcode_cache import TranscodeCache
+
+PARAMS = ['ffmpeg', '-c:a', 'aac']
+
+class Transcoder:
+    """Stands in for stream_video: yields chunks, optionally waiting for a release"""
+
+    def __init__(self, chunks, gate: asyncio.Event = None, fail: bool = False):
+        self.chunks = chunks
+        self.gate = gate
+        self.fail = fail
+        self.started = 0
+        self.closed = 0
+
+    async def stream(self):
+        self.started += 1
+        try:
+            for i, chunk in enumerate(self.chunks):
+                if i > 0 and self.gate is not None:
+                    await self.gate.wait()
+                yield chunk
+            if self.fail:
+                raise RuntimeError("FFmpeg exited with code 1")
+        finally:
+            self.closed += 1
+
+async def collect(body):
+    return b''.join([chunk async for chunk in body])
+
+def test_miss_then_hit(tmp_path):
+    cache = TranscodeCache(tmp_path, max_bytes=10_000)
+    transcoder = Transcoder([b'moov', b'frag1', b'frag2'])
+
+    async def run():
+        assert cache.lookup("https://cdn/clip.mp4", PARAMS) is None
+        return await collect(await cache.stream("https://cdn/clip.mp4", PARAMS, transcoder.stream))
+
+    assert asyncio.run(run()) == b'moovfrag1frag2'
+    path = cache.lookup("https://cdn/clip.mp4", PARAMS)
+    assert path.read_bytes() == b'moovfrag1frag2'
+    # Other parameters are another clip
+    assert cache.lookup("https://cdn/clip.mp4", PARAMS + ['-b:a', '96k']) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+    assert not list(tmp_path.glob('*.part'))
+
+def test_a_new_source_version_is_transcoded_again(tmp_path):
+    cache = TranscodeCache(tmp_path, max_bytes=10_000)
+
+    async def run():
+        return await collect(await cache.stream("https://cdn/clip.mp4", PARAMS, Transcoder([b'v1']).stream, '"v1"'))
+
+    asyncio.run(run())
+    assert cache.lookup("https://cdn/clip.mp4", PARAMS, '"v1"').read_bytes() == b'v1'
+    assert cache.lookup("https://cdn/clip.mp4", PARAMS, '"v2"') is None
+
+def test_concurrent_requests_share_one_transcode(tmp_path):
+    cache = TranscodeCache(tmp_path, max_bytes=10_000)
+
+    async def run():
+        gate = asyncio.Event()
+        transcoder = Transcoder([b'moov'] + [b'frag%d' % i for i in range(20)], gate=gate)
+        first = await cache.stream("https://cdn/clip.mp4", PARAMS, transcoder.stream)
+        # Later requests join while the transcode is still running
+        others = [await cache.stream("https://cdn/clip.mp4", PARAMS, transcoder.stream) for _ in range(2)]
+        gate.set()
+        outputs = await asyncio.gather(*(collect(body) for body in [first] + others))
+        return transcoder, outputs
+
+    transcoder, outputs = asyncio.run(run())
+    assert transcoder.started == 1
+    assert outputs[0].startswith(b'moov') and outputs[0].endswith(b'frag19')
+    assert outputs[1] == outputs[0] and outputs[2] == outputs[0]
+    assert cache.stats()["shared"] == 2
+    assert cache.stats()["in_flight"] == 0
+
+def test_lru_eviction_by_bytes(tmp_path):
+    cache = TranscodeCache(tmp_path, max_bytes=250)
+
+    async def add(name):
+        await collect(await cache.stream(name, PARAMS, Transcoder([b'x' * 100]).stream))
+
+    asyncio.run(add("a"))
+    asyncio.run(add("b"))
+    assert cache.lookup("a", PARAMS) is not None  # a is now the most recently used
+    asyncio.run(add("c"))
+    assert cache.lookup("b", PARAMS) is None
+    assert cache.lookup("a", PARAMS) is not None and cache.lookup("c", PARAMS) is not None
+    assert cache.stats()["bytes"] == 200
+    assert len(list(tmp_path.glob('*.mp4'))) == 2
+
+    # A restart indexes what is on disk
+    reopened = TranscodeCache(tmp_path, max_bytes=250)
+    assert reopened.stats()["clips"] == 2 and reopened.stats()["bytes"] == 200
+
+def test_failed_transcode_is_not_cached(tmp_path):
+    cache = TranscodeCache(tmp_path, max_bytes=10_000)
+
+    async def run():
+        with pytest.raises(RuntimeError, match="exited with code 1"):
+            await cache.stream("https://cdn/clip.mp4", PARAMS, Transcoder([], fail=True).stream)
+        # Output already streamed ends with the error
+        body = await cache.stream("https://cdn/clip.mp4", PARAMS, Transcoder([b'moov', b'frag'], fail=True).stream)
+        with pytest.raises(RuntimeError, match="exited with code 1"):
+            await collect(body)
+
+    asyncio.run(run())
+    assert cache.lookup("https://cdn/clip.mp4", PARAMS) is None
+    assert not list(tmp_path.iterdir())
+
+def test_last_reader_leaving_cancels_transcode(tmp_path):
+    cache = TranscodeCache(tmp_path, max_bytes=10_000)
+    transcoder = Transcoder([b'moov', b'frag'], gate=asyncio.Event())
+
+    async def run():
+        first = await cache.stream("https://cdn/clip.mp4", PARAMS, transcoder.stream)
+        second = await cache.stream("https://cdn/clip.mp4", PARAMS, transcoder.stream)
+        assert await first.__anext__() == b'moov'
+        await first.aclose()
+        # Another reader is still watching
+        await asyncio.sleep(0.05)
+        assert transcoder.closed == 0
+        # Closing a reader that never read still counts
+        await second.aclose()
+        await asyncio.sleep(0.05)
+        assert transcoder.closed == 1
+
+    asyncio.run(run())
+    assert cache.stats()["in_flight"] == 0
+    assert cache.lookup("https://cdn/clip.mp4", PARAMS) is None
+    assert not list(tmp_path.iterdir())
+
+def test_transcode_cancelled_before_it_starts_removes_its_part_file(tmp_path):
+    cache = TranscodeCache(tmp_path, max_bytes=10_000)
+    transcoder = Transcoder([b'moov'])
+
+    async def run():
+        transcode = cache._start("clip", transcoder.stream)
+        transcode.readers = 1
+        # The only reader leaves before the transcode task has taken its first step
+        cache._release(transcode)
+        await asyncio.sleep(0.05)
+        return transcode
+
+    transcode = asyncio.run(run())
+    assert transcode.task.cancelled() and transcode.done
+    assert transcoder.started == 0
+    assert not cache.in_flight
+    assert not list(tmp_path.iterdir())
+
+def test_failing_to_open_the_source_cleans_up(tmp_path):
+    cache = TranscodeCache(tmp_path, max_bytes=10_000)
+
+    def open_stream():
+        raise RuntimeError("no ffmpeg")
+
+    async def run():
+        with pytest.raises(RuntimeError, match="no ffmpeg"):
+            await cache.stream("https://cdn/clip.mp4", PARAMS, open_stream)
+
+    asyncio.run(run())
+    assert not cache.in_flight
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,84 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.storage.vector_export import ExportCheckpoint, StreamingExporter
+
+class FakeCollection:
+    """Minimal paginated ChromaDB collection"""
+
+    def __init__(self, size):
+        self.ids = [f"clip_{i:04d}" for i in range(size)]
+        self.max_page = 0
+
+    def get(self, include, limit, offset):
+        ids = self.ids[offset:offset + limit]
+        self.max_page = max(self.max_page, len(ids))
+        return {
+            'ids': ids,
+            'documents': [f"Line {clip_id}" for clip_id in ids],
+            'metadatas': [{"speaker": "DATA"} for _ in ids],
+            'embeddings': [[1.0, 0.0] for _ in ids],
+        }
+
+def to_vectors(page):
+    return [
+        {"id": clip_id, "values": values, "metadata": {**metadata, "text": text}}
+        for clip_id, text, metadata, values in zip(page['ids'], page['documents'], page['metadatas'], page['embeddings'])
+    ]
+
+class FakeIndex:
+    def __init__(self, fail_on=None):
+        self.vectors = {}
+        self.fail_on = fail_on
+        self.lock = threading.Lock()
+
+    def upsert(self, batch):
+        if self.fail_on and any(vector["id"] == self.fail_on for vector in batch):
+            raise RuntimeError("index unavailable")
+        with self.lock:
+            for vector in batch:
+                self.vectors[vector["id"]] = vector
+
+def test_export_pages_through_bounded_batches(tmp_path):
+    collection = FakeCollection(1050)
+    index = FakeIndex()
+    checkpoint = ExportCheckpoint(str(tmp_path / "checkpoint.json"))
+    exporter = StreamingExporter(index.upsert, to_vectors, page_size=200, batch_size=50, max_workers=3, queue_size=2)
+    report = exporter.run(collection, "dialogs-v1", checkpoint)
+
+    assert report.vectors == 1050
+    assert report.pages == 6
+    assert report.batches == 21
+    assert collection.max_page == 200
+    assert set(index.vectors) == set(collection.ids)
+    assert checkpoint.offset_for("dialogs-v1") == 1050
+    assert checkpoint.offset_for("dialogs-v2") == 0
+
+def test_failed_export_resumes_from_checkpoint(tmp_path):
+    collection = FakeCollection(500)
+    checkpoint = ExportCheckpoint(str(tmp_path / "checkpoint.json"))
+    failing = FakeIndex(fail_on="clip_0250")
+    exporter = StreamingExporter(failing.upsert, to_vectors, page_size=100, batch_size=25, max_workers=1, retry_delay=0)
+    with pytest.raises(RuntimeError):
+        exporter.run(collection, "dialogs-v1", checkpoint)
+
+    # Every page before the failing one was fully written
+    resume_at = checkpoint.offset_for("dialogs-v1")
+    assert resume_at == 200
+    assert all(clip_id in failing.vectors for clip_id in collection.ids[:resume_at])
+
+    index = FakeIndex()
+    exporter = StreamingExporter(index.upsert, to_vectors, page_size=100, batch_size=25)
+    report = exporter.run(collection, "dialogs-v1", checkpoint)
+    assert report.start_offset == 200
+    assert set(index.vectors) == set(collection.ids[200:])
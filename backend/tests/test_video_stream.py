@@ -0,0 +1,134 @@
+import sys
+import os
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.api.routes.video import stream_video
+
+# Stands in for ffmpeg: copies stdin to stdout, after writing its pid to argv[1]
+COPY = [
+    sys.executable, '-c',
+    'import os, shutil, sys\n'
+    'open(sys.argv[1], "w").write(str(os.getpid()))\n'
+    'shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer, 65536)',
+]
+FAIL = [sys.executable, '-c', 'import sys; sys.stderr.write("Invalid data found\\n"); sys.exit(1)']
+
+async def serve(routes):
+    app = web.Application()
+    app.add_routes(routes)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}"
+
+async def collect(stream):
+    return b''.join([chunk async for chunk in stream])
+
+def test_streams_fixture_through_transcoder(tmp_path):
+    fixture = tmp_path / "clip.mp4"
+    fixture.write_bytes(os.urandom(32 * 1024 * 1024))
+
+    async def clip(request):
+        return web.FileResponse(fixture)
+
+    async def run():
+        runner, base = await serve([web.get('/clip.mp4', clip)])
+        try:
+            started = time.perf_counter()
+            output = await collect(stream_video(f"{base}/clip.mp4", command=COPY + [str(tmp_path / "pid")]))
+            return output, time.perf_counter() - started
+        finally:
+            await runner.cleanup()
+
+    output, seconds = asyncio.run(run())
+    assert output == fixture.read_bytes()
+    throughput = len(output) / seconds / 1024 / 1024
+    print(f"Streamed {len(output) / 1024 / 1024:.0f} MB at {throughput:.0f} MB/s")
+    # Far above any clip bitrate; a pipeline stalled by buffering would miss it by orders of magnitude
+    assert throughput > 20
+
+def test_source_and_transcoder_errors_are_raised(tmp_path):
+    async def clip(request):
+        return web.Response(body=b'video')
+
+    async def run():
+        runner, base = await serve([web.get('/clip.mp4', clip)])
+        try:
+            with pytest.raises(RuntimeError, match="HTTP 404"):
+                await collect(stream_video(f"{base}/missing.mp4", command=COPY + [str(tmp_path / "pid")]))
+            with pytest.raises(RuntimeError, match="Invalid data found"):
+                await collect(stream_video(f"{base}/clip.mp4", command=FAIL))
+            assert await collect(stream_video(f"{base}/clip.mp4", command=COPY + [str(tmp_path / "pid")])) == b'video'
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+
+def test_slow_client_stalls_source_and_disconnect_kills_transcoder(tmp_path):
+    sent = []
+    source_size = 512 * 1024 * 1024
+
+    async def endless(request):
+        response = web.StreamResponse()
+        response.content_length = source_size
+        await response.prepare(request)
+        chunk = b'\0' * 65536
+        for _ in range(source_size // len(chunk)):
+            await response.write(chunk)
+            sent.append(len(chunk))
+        return response
+
+    async def run():
+        runner, base = await serve([web.get('/clip.mp4', endless)])
+        try:
+            stream = stream_video(f"{base}/clip.mp4", command=COPY + [str(tmp_path / "pid")], queue_chunks=4)
+            await stream.__anext__()
+            # The client stops reading: queue, pipes and socket buffers fill, then the source stalls
+            await asyncio.sleep(1.0)
+            stalled_at = sum(sent)
+            await asyncio.sleep(0.5)
+            assert sum(sent) == stalled_at
+            assert stalled_at < source_size // 8
+            await stream.aclose()
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(run())
+    pid = int((tmp_path / "pid").read_text())
+    with pytest.raises(ProcessLookupError):
+        os.kill(pid, 0)
+
+def test_source_version_comes_from_one_head_request():
+    from backend.api.routes.video import source_version
+
+    async def tagged(request):
+        return web.Response(body=b'clip', headers={"ETag": '"v2"'})
+
+    async def dated(request):
+        return web.Response(body=b'clip', headers={"Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"})
+
+    async def plain(request):
+        return web.Response(body=b'clip')
+
+    async def run():
+        runner, base = await serve([web.get('/tagged', tagged), web.get('/dated', dated), web.get('/plain', plain)])
+        try:
+            return [await source_version(f"{base}/{name}") for name in ("tagged", "dated", "plain", "missing")]
+        finally:
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == ['"v2"', "Wed, 21 Oct 2015 07:28:00 GMT", None, None]
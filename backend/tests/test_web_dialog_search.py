@@ -0,0 +1,90 @@
+import sys
+import time
+import asyncio
+from pathlib import Path
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.search import web_dialog_search
+from backend.core.search.web_dialog_search import WebDialogSearch
+from backend.core.search.result_cache import LocalResultCache
+
+def dialog(i, **extra):
+    return (f"Line {i}.", {"clip_path": f"clips/S01E01_clip_{i:04d}.mp4", "match_ratio": 1 - i / 100, **extra})
+
+class SearchSystem:
+    """Stands in for DialogSearchSystem: ranked lines, counting searches"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.calls = []
+
+    def find_similar_dialog(self, query, character=None, n_results=3):
+        self.calls.append(n_results)
+        return self.lines[:n_results]
+
+def make_search(lines, fetch_results=10):
+    search = WebDialogSearch.__new__(WebDialogSearch)
+    search.redis = None
+    search.search_system = SearchSystem(lines)
+    search.cache_prefix = "dialog_search:test:"
+    search.cache_ttl = 3600
+    search.stale_ttl = 600
+    search.local_cache = LocalResultCache()
+    search.fetch_results = fetch_results
+    search.batch_size = 50
+    return search
+
+def test_used_dialogs_are_filtered_from_one_shared_entry():
+    search = make_search([dialog(i) for i in range(30)])
+
+    async def run():
+        first = await search.find_similar_dialog("Engage.", n_results=3)
+        # The conversation has used the first two lines, by text and by clip path
+        used = [first[0][0], first[1][1]["clip_path"]]
+        second = await search.find_similar_dialog("Engage.", n_results=3, used_dialogs=used)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert [text for text, _ in first] == ["Line 0.", "Line 1.", "Line 2."]
+    assert [text for text, _ in second] == ["Line 2.", "Line 3.", "Line 4."]
+    # Both requests read the same cache entry
+    assert search.search_system.calls == [10]
+    assert len(search.local_cache) == 1
+
+def test_exhausted_over_fetch_searches_deeper():
+    search = make_search([dialog(i) for i in range(30)], fetch_results=5)
+    used = [f"Line {i}." for i in range(4)]
+
+    results = asyncio.run(search.find_similar_dialog("Engage.", n_results=3, used_dialogs=used))
+    assert [text for text, _ in results] == ["Line 4.", "Line 5.", "Line 6."]
+    # The deeper search is not cached over the shared entry
+    assert search.search_system.calls == [5, 7]
+    assert len(search.local_cache.get(search._get_cache_key("Engage.", None, 5))[1]) == 5
+
+def test_stale_entry_is_served_then_refreshed():
+    search = make_search([dialog(i, line_id=f"line-{i}") for i in range(30)])
+    key = search._get_cache_key("Engage.", None, 10)
+    stale = [dialog(100 + i) for i in range(10)]
+    search.local_cache.put(key, time.time() - 1, time.time() + 600, stale)
+
+    async def run():
+        served = await search.find_similar_dialog("Engage.", n_results=3)
+        await asyncio.gather(*web_dialog_search._refresh_tasks)
+        refreshed = await search.find_similar_dialog("Engage.", n_results=3)
+        return served, refreshed
+
+    served, refreshed = asyncio.run(run())
+    assert served == stale[:3]
+    assert [text for text, _ in refreshed] == ["Line 0.", "Line 1.", "Line 2."]
+    assert refreshed[0][1]["line_id"] == "line-0"
+    soft_expiry, _ = search.local_cache.get(key)
+    assert soft_expiry > time.time()
+    # One background search; the fresh entry answered the second request
+    assert search.search_system.calls == [10]
+    assert key not in web_dialog_search._refreshing
@@ -0,0 +1,147 @@
+import sys
+import os
+import time
+import multiprocessing
+from pathlib import Path
+
+import pytest
+import redis
+
+# Add project root and backend directory to Python path
+project_root = str(Path(__file__).resolve().parents[2])
+backend_root = str(Path(__file__).resolve().parents[1])
+for path in (project_root, backend_root):
+    if path not in sys.path:
+        sys.path.append(path)
+
+from backend.core.extraction.pipeline import Episode, Pipeline, Stage, StageCache
+from backend.core.extraction.work_queue import ExtractionWorker, WorkQueue
+
+REDIS_URL = os.getenv("TEST_REDIS_URL", "redis://localhost:6379/15")
+
+def redis_available():
+    try:
+        return redis.Redis.from_url(REDIS_URL, socket_connect_timeout=0.5).ping()
+    except redis.RedisError:
+        return False
+
+pytestmark = pytest.mark.skipif(not redis_available(), reason="local Redis is not running")
+
+def read(context):
+    if context.episode.code in context.params.get("broken", []):
+        raise RuntimeError("unreadable")
+    # Fails once per episode listed in flaky, leaving a marker for the retry
+    marker = context.episode.script.with_suffix(".attempted")
+    if context.episode.code in context.params.get("flaky", []) and not marker.exists():
+        marker.touch()
+        raise RuntimeError("transient")
+    return {"text": context.episode.script.read_text()}
+
+def count(context):
+    time.sleep(0.05)
+    return {"length": len(context.inputs["read"]["text"]), "pid": os.getpid()}
+
+def make_stages(**params):
+    return [
+        Stage(name="read", run=read, inputs=lambda e: [e.script], params=params),
+        Stage(name="count", run=count, deps=("read",)),
+    ]
+
+def make_episodes(tmp_path, count=6):
+    episodes = []
+    for i in range(count):
+        script = tmp_path / f"S01E{i:02d}.txt"
+        script.write_text("x" * (i + 1))
+        episodes.append(Episode(code=f"S01E{i:02d}", video=script, script=script))
+    return episodes
+
+def make_queue(name, **kwargs):
+    return WorkQueue(redis.Redis.from_url(REDIS_URL), name=name, **kwargs)
+
+def run_worker(name, cache_dir, params):
+    queue = make_queue(name)
+    ExtractionWorker(queue, Pipeline(make_stages(**params), StageCache(cache_dir)), poll_seconds=0.05).run()
+
+def test_worker_processes_share_the_queue(tmp_path):
+    episodes = make_episodes(tmp_path)
+    queue = make_queue("test_shared")
+    assert queue.submit(episodes, make_stages()) == 12
+    processes = [
+        multiprocessing.get_context("fork").Process(target=run_worker, args=("test_shared", tmp_path / "cache", {}))
+        for _ in range(3)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+    progress = queue.progress()
+    assert (progress["done"], progress["failed"], progress["ready"], progress["running"]) == (12, 0, 0, 0)
+    assert len(progress["workers"]) == 3
+    results = queue.results()
+    for i, episode in enumerate(episodes):
+        assert results[f"{episode.code}/count"]["manifest"]["outputs"]["length"] == i + 1
+    # Every unit ran exactly once
+    assert all(result["attempt"] == 1 for result in results.values())
+
+def test_transient_failures_are_retried(tmp_path):
+    episodes = make_episodes(tmp_path, count=2)
+    queue = make_queue("test_retry", max_attempts=2)
+    queue.submit(episodes, make_stages(flaky=["S01E00"], broken=["S01E01"]))
+    pipeline = Pipeline(make_stages(flaky=["S01E00"], broken=["S01E01"]), StageCache(tmp_path / "cache"))
+    worker = ExtractionWorker(queue, pipeline, poll_seconds=0.01)
+    worker.run()
+    results = queue.results()
+    assert (results["S01E00/read"]["status"], results["S01E00/read"]["attempt"]) == ("ran", 2)
+    assert results["S01E00/count"]["status"] == "ran"
+    assert (results["S01E01/read"]["status"], results["S01E01/read"]["error"]) == ("failed", "RuntimeError: unreadable")
+    # Units behind a failed dependency never run, and are recorded as skipped
+    assert results["S01E01/count"] == {"status": "skipped", "error": "dependency failed"}
+    progress = queue.progress()
+    assert (progress["done"], progress["failed"], progress["skipped"], progress["waiting"]) == (2, 1, 1, 0)
+    assert queue.finished()
+    # Only the attempt that failed for good counts against the worker
+    assert worker.failed == 1
+
+def test_expired_leases_go_to_another_worker(tmp_path):
+    episodes = make_episodes(tmp_path, count=1)
+    queue = make_queue("test_lease", lease_seconds=0.2)
+    queue.submit(episodes, make_stages())
+    # A worker claims the unit and dies without heartbeats
+    uid, attempt = queue.claim("dead-worker")
+    assert (uid, attempt) == ("S01E00/read", 1)
+    assert queue.claim("other-worker") is None and not queue.finished()
+    time.sleep(0.3)
+    pipeline = Pipeline(make_stages(), StageCache(tmp_path / "cache"))
+    ExtractionWorker(queue, pipeline, worker_id="live-worker", poll_seconds=0.01).run()
+    results = queue.results()
+    assert results["S01E00/read"]["worker"] == "live-worker"
+    assert results["S01E00/read"]["attempt"] == 2
+    # The dead worker's late result is rejected
+    assert not queue.complete(uid, "dead-worker", {"status": "ran", "manifest": {}})
+    assert queue.results()["S01E00/read"]["worker"] == "live-worker"
+
+def test_expired_leases_skip_everything_downstream(tmp_path):
+    episodes = make_episodes(tmp_path, count=1)
+    stages = make_stages() + [Stage(name="report", run=count, deps=("count",))]
+    queue = make_queue("test_lease_skip", lease_seconds=0.1, max_attempts=1)
+    queue.submit(episodes, stages)
+    queue.claim("dead-worker")
+    time.sleep(0.2)
+    assert queue.requeue_expired() == 1
+    results = queue.results()
+    assert (results["S01E00/read"]["status"], results["S01E00/read"]["error"]) == ("failed", "lease expired")
+    for uid in ("S01E00/count", "S01E00/report"):
+        assert results[uid] == {"status": "skipped", "error": "dependency failed"}
+    assert queue.progress()["waiting"] == 0
+    assert queue.finished()
+
+def test_heartbeats_keep_long_units_leased(tmp_path):
+    episodes = make_episodes(tmp_path, count=1)
+    queue = make_queue("test_heartbeat", lease_seconds=0.3)
+    queue.submit(episodes, make_stages())
+    uid, _ = queue.claim("slow-worker")
+    for _ in range(4):
+        time.sleep(0.15)
+        assert queue.heartbeat(uid, "slow-worker")
+        assert queue.requeue_expired() == 0
+    assert not queue.heartbeat(uid, "someone-else")